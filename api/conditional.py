@@ -0,0 +1,150 @@
+"""HTTP conditional requests for the post read endpoints.
+
+`content_versions` holds a change version per post (for the post and its
+comments) and one for the feed under `FEED_VERSION_KEY`. Triggers on
+`posts` and `comments` bump them, so every write path keeps them current,
+including the batch endpoints, the importer and like count reconciliation,
+as the search index triggers do.
+
+A version is the time of the change in microseconds since the epoch, or
+one more than the previous version if that is not later, so it only ever
+grows. It is the ETag, and rounded up to seconds the Last-Modified date.
+Since two changes within one second share that date, Last-Modified is only
+sent once its second has passed, when no later change can have it; until
+then clients revalidate with the ETag. A conditional GET costs one primary
+key lookup, and a match is answered with 304 before the page query runs.
+
+The versions are kept by SQLite triggers; on other databases the read
+endpoints are served without validators.
+"""
+import email.utils
+import time
+from datetime import timezone
+
+import databases
+from fastapi import Request, Response
+from sqlalchemy import Connection, bindparam, select, text
+
+from api.config import config
+from api.database import content_version_table
+from api.statements import Statement
+
+FEED_VERSION_KEY = 0
+
+# julianday('now') has millisecond precision.
+_NOW_US = "CAST((julianday('now') - 2440587.5) * 86400000000 AS INTEGER)"
+_FEED = str(FEED_VERSION_KEY)
+# The columns of `posts` the read endpoints return. The feed shows no comments.
+_POST_COLUMNS = "body, like_count, image_url, thumbnails"
+
+
+def _bump(post_id: str) -> str:
+    return (
+        f"INSERT INTO content_versions (post_id, version) VALUES ({post_id}, {_NOW_US}) "
+        "ON CONFLICT (post_id) DO UPDATE SET version = max(content_versions.version + 1, excluded.version);"
+    )
+
+
+DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS posts_version_insert AFTER INSERT ON posts BEGIN
+        {_bump("new.id")} {_bump(_FEED)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS posts_version_update AFTER UPDATE OF {_POST_COLUMNS} ON posts BEGIN
+        {_bump("new.id")} {_bump(_FEED)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS posts_version_delete AFTER DELETE ON posts BEGIN
+        DELETE FROM content_versions WHERE post_id = old.id; {_bump(_FEED)}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS comments_version_insert AFTER INSERT ON comments BEGIN
+        {_bump("new.post_id")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS comments_version_update AFTER UPDATE OF body ON comments BEGIN
+        {_bump("new.post_id")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS comments_version_delete AFTER DELETE ON comments BEGIN
+        {_bump("old.post_id")}
+    END""",
+]
+
+
+def install(conn: Connection) -> None:
+    """Create the triggers and give the feed and every existing post a version."""
+    for statement in DDL:
+        conn.execute(text(statement))
+    conn.execute(text(
+        f"INSERT OR IGNORE INTO content_versions (post_id, version) SELECT id, {_NOW_US} FROM posts"
+    ))
+    conn.execute(text(
+        f"INSERT OR IGNORE INTO content_versions (post_id, version) VALUES ({_FEED}, {_NOW_US})"
+    ))
+
+
+select_content_version = Statement(
+    "select_content_version",
+    select(content_version_table.c.version).where(content_version_table.c.post_id == bindparam("post_id")),
+)
+
+
+def cache_control(request: Request) -> str:
+    # Authenticated callers may be in their read-your-writes window, so a
+    # shared cache must not answer them with a copy made for someone else.
+    if "authorization" in request.headers:
+        return "private, no-cache"
+    return (
+        f"public, max-age=0, s-maxage={config.HTTP_CACHE_SHARED_MAX_AGE_SECONDS}, "
+        f"stale-while-revalidate={config.HTTP_CACHE_STALE_WHILE_REVALIDATE_SECONDS}"
+    )
+
+
+def etag(version: int) -> str:
+    return f'"{version:x}"'
+
+
+def last_modified(version: int) -> int:
+    """The Last-Modified time of `version` in seconds since the epoch, rounded up."""
+    return -(-version // 1_000_000)
+
+
+def validator_headers(request: Request, version: int) -> dict[str, str]:
+    headers = {"ETag": etag(version)}
+    if last_modified(version) <= time.time():
+        headers["Last-Modified"] = email.utils.formatdate(last_modified(version), usegmt=True)
+    headers["Cache-Control"] = cache_control(request)
+    headers["Vary"] = "Authorization"
+    return headers
+
+
+def is_not_modified(request: Request, version: int) -> bool:
+    """Whether the client's copy is current; If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag(version) in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified(version) <= since.timestamp()
+    return False
+
+
+async def fetch_version(db: databases.Database, post_id: int) -> int | None:
+    """The version of post `post_id`, or of the feed for FEED_VERSION_KEY; None if there is no such post."""
+    return await db.fetch_val(select_content_version(post_id=post_id))
+
+
+def evaluate_preconditions(request: Request, response: Response, version: int | None) -> Response | None:
+    """Set the validators of `version` on `response`, and return a 304 if the client's copy is current."""
+    if version is None:
+        return None
+    headers = validator_headers(request, version)
+    if is_not_modified(request, version):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
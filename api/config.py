@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import Optional
+from typing import Any, Callable, Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -13,14 +13,63 @@ class BaseConfig(BaseSettings):
 
 class GlobalConfig(BaseConfig):
     DATABASE_URL: Optional[str] = None
+    DATABASE_READ_URLS: list[str] = []
+    READ_YOUR_WRITES_SECONDS: float = 5.0
     DB_FORCE_ROLL_BACK: bool = False
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_MAX_LIFETIME_SECONDS: float = 300.0
+    SQLITE_JOURNAL_MODE: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = "WAL"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
     LOGTAIL_API_KEY: Optional[str] = None
+    LOG_QUEUE_SIZE: int = 10000
+    # Directory of the rotating log files; the repository's logs/ when unset.
+    LOG_DIR: Optional[str] = None
     MAILGUN_API_KEY: Optional[str] = None
     MAILGUN_DOMAIN: Optional[str] = None
+    MAILGUN_BASE_URL: str = "https://api.mailgun.net"
     SECRET_KEY: Optional[str] = None
     B2_KEY_ID: Optional[str] = None
     B2_APPLICATION_KEY: Optional[str] = None
     B2_BUCKET_NAME: Optional[str] = None
+    MEDIA_ROOT: str = "media"
+    MEDIA_BASE_URL: str = "/media"
+    MEDIA_MAX_BYTES: int = 100 * 1024 * 1024
+    UPLOAD_WORKERS: int = 4
+    THUMBNAIL_SIZES: list[int] = [160, 480, 1080]
+    THUMBNAIL_WORKERS: int = 2
+    EVENTS_BUFFER_SIZE: int = 100
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    # Budget name -> "<requests>/<second|minute|hour|day>", see api.rate_limit.
+    RATE_LIMITS: dict[str, str] = {
+        "login": "10/minute",
+        "register": "5/minute",
+        "read": "300/minute",
+        "write": "60/minute",
+        "export": "5/hour",
+    }
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    MAX_IN_FLIGHT_REQUESTS: int = 256
+    # How long a CDN may serve a cached read without asking, and then while it revalidates.
+    HTTP_CACHE_SHARED_MAX_AGE_SECONDS: int = 5
+    HTTP_CACHE_STALE_WHILE_REVALIDATE_SECONDS: int = 30
+    OVERLOAD_RETRY_AFTER_SECONDS: int = 1
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    FEED_CACHE_SIZE: int = 1024
+    FEED_CACHE_TTL_SECONDS: float = 30.0
+    TIMELINE_FANOUT_MAX_FOLLOWERS: int = 1000
+    TIMELINE_BACKFILL_POSTS: int = 50
+    MAIL_QUEUE_BATCH_SIZE: int = 100
+    MAIL_QUEUE_CONCURRENCY: int = 4
+    MAIL_QUEUE_MAX_ATTEMPTS: int = 5
+    MAIL_QUEUE_RETRY_BASE_SECONDS: float = 2.0
+    MAIL_QUEUE_POLL_SECONDS: float = 5.0
+    # How long a worker may hold claimed emails before others may send them.
+    MAIL_QUEUE_LEASE_SECONDS: float = 300.0
 
 
 class DevConfig(GlobalConfig):
@@ -46,4 +95,33 @@ def get_config(env_state: Optional[str] = None):
     return configs.get(env_state, GlobalConfig)()
 
 
-config = get_config(BaseConfig().ENV_STATE)
\ No newline at end of file
+@lru_cache()
+def current_config() -> GlobalConfig:
+    """Config for this process's ENV_STATE, read on first use rather than at import."""
+    return get_config(BaseConfig().ENV_STATE)
+
+
+class Lazy:
+    """Stand-in for the object returned by `factory`, which is called on every use.
+
+    Module-level objects built from the settings are exported as
+    `Lazy(get_...)` over a cached accessor, so `from api.config import config`
+    or `from api.database import database` reads no settings at import."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+
+    def __getattr__(self, name: str):
+        return getattr(self._factory(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self._factory(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._factory(), name)
+
+    def __repr__(self) -> str:
+        return f"Lazy({self._factory.__name__})"
+
+
+config = Lazy(current_config)
@@ -1,6 +1,10 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, MetaData, String, Table, create_engine
-import databases
-from api.config import config
+from functools import lru_cache
+
+from sqlalchemy import Boolean, Column, Engine, Float, ForeignKey, Index, Integer, MetaData, String, Table, create_engine, event
+from api.config import Lazy, config
+from api.metrics import timed_query
+from api.replicas import DatabaseRouter
+from api.sqlite_pool import Database
 
 metadata = MetaData()
 
@@ -9,7 +13,22 @@ post_table = Table(
     metadata,
     Column("id", Integer, primary_key=True),
     Column("body", String, nullable=False),
-    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False, index=True),
+    # Maintained by the like/unlike endpoints, see api.like_counts for reconciliation.
+    Column("like_count", Integer, nullable=False, server_default="0"),
+    # Set by the media upload endpoint, see api.storage.
+    Column("image_url", String),
+    # JSON list of {size, width, height, url}, see api.thumbnails.
+    Column("thumbnails", String),
+    Index("ix_posts_like_count_id", "like_count", "id"),
+)
+
+# Change versions of each post and of the feed, kept by triggers; see api.conditional.
+content_version_table = Table(
+    "content_versions",
+    metadata,
+    Column("post_id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
 )
 
 comment_table = Table(
@@ -17,8 +36,8 @@ comment_table = Table(
     metadata,
     Column("id", Integer, primary_key=True),
     Column("body", String, nullable=False),
-    Column("post_id", Integer, ForeignKey("posts.id"), nullable=False),
-    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("post_id", Integer, ForeignKey("posts.id"), nullable=False, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False, index=True),
 )
 
 like_table = Table(
@@ -26,7 +45,9 @@ like_table = Table(
     metadata,
     Column("id", Integer, primary_key=True),
     Column("post_id", Integer, ForeignKey("posts.id"), nullable=False),
-    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False, index=True),
+    # Also serves lookups by post_id, so that column needs no index of its own.
+    Index("uq_likes_post_id_user_id", "post_id", "user_id", unique=True),
 )
 
 user_table = Table(
@@ -36,10 +57,151 @@ user_table = Table(
     Column("email", String, unique=True, nullable=False),
     Column("password", String, nullable=False),
     Column("confirmed", Boolean, nullable=False, default=False),
+    # Maintained by the follow/unfollow endpoints; decides between fan-out on write and on read.
+    Column("follower_count", Integer, nullable=False, server_default="0"),
+    Index("ix_users_follower_count", "follower_count"),
+)
+
+follow_table = Table(
+    "follows",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("follower_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("followee_id", Integer, ForeignKey("users.id"), nullable=False),
+    # Whom a user follows; the reverse index finds the followers to fan a post out to.
+    Index("uq_follows_follower_id_followee_id", "follower_id", "followee_id", unique=True),
+    Index("ix_follows_followee_id_follower_id", "followee_id", "follower_id"),
+)
+
+# Per-user inbox of the posts of followed users, filled on write by api.timeline.
+timeline_table = Table(
+    "timeline_entries",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("post_id", Integer, ForeignKey("posts.id"), nullable=False),
+    Column("author_id", Integer, ForeignKey("users.id"), nullable=False),
+    # A timeline page is one range scan of this index.
+    Index("uq_timeline_entries_user_id_post_id", "user_id", "post_id", unique=True),
+)
+
+# Durable queue of emails to send, drained by api.mail_queue.
+outbound_email_table = Table(
+    "outbound_emails",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("recipient", String, nullable=False),
+    Column("subject", String, nullable=False),
+    Column("body", String, nullable=False),
+    Column("status", String, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("next_attempt_at", Float, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("last_error", String),
+    # The lease of the worker sending it, while `status` is "sending".
+    Column("claimed_by", String),
+    Column("claimed_at", Float),
+    Index("ix_outbound_emails_status_next_attempt_at", "status", "next_attempt_at"),
 )
 
-engine = create_engine(config.DATABASE_URL, connect_args={"check_same_thread": False})
 
-metadata.create_all(engine)
+def sqlite_pragmas() -> dict:
+    """Pragmas run on every new SQLite connection, sync and async alike."""
+    return {
+        "journal_mode": config.SQLITE_JOURNAL_MODE,
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+    }
+
+
+def pool_options(url: str) -> dict:
+    """Pool settings in the keyword arguments each `databases` backend expects."""
+    lifetime = config.DB_POOL_MAX_LIFETIME_SECONDS
+    if url.startswith("sqlite"):
+        return {
+            "min_size": config.DB_POOL_MIN_SIZE,
+            "max_size": config.DB_POOL_MAX_SIZE,
+            "max_lifetime": lifetime,
+            "pragmas": sqlite_pragmas(),
+        }
+    if url.startswith("mysql"):
+        return {"minsize": config.DB_POOL_MIN_SIZE, "maxsize": config.DB_POOL_MAX_SIZE, "pool_recycle": int(lifetime)}
+    if url.startswith("postgresql+aiopg"):
+        return {"minsize": config.DB_POOL_MIN_SIZE, "maxsize": config.DB_POOL_MAX_SIZE, "pool_recycle": lifetime}
+    return {
+        "min_size": config.DB_POOL_MIN_SIZE,
+        "max_size": config.DB_POOL_MAX_SIZE,
+        "max_inactive_connection_lifetime": lifetime,
+    }
+
+
+@lru_cache()
+def get_engine() -> Engine:
+    """Synchronous engine for migrations and CLI tools, created on first use."""
+    engine = create_engine(
+        config.DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        pool_size=config.DB_POOL_MAX_SIZE,
+        pool_recycle=config.DB_POOL_MAX_LIFETIME_SECONDS,
+    )
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+class TimedDatabase(Database):
+    """Records every query in `db_query_duration_seconds`, labeled by `api.metrics.query_name`."""
+
+    async def fetch_all(self, query, values=None):
+        with timed_query(query):
+            return await super().fetch_all(query, values)
+
+    async def fetch_one(self, query, values=None):
+        with timed_query(query):
+            return await super().fetch_one(query, values)
+
+    async def fetch_val(self, query, values=None, column=0):
+        with timed_query(query):
+            return await super().fetch_val(query, values, column)
+
+    async def execute(self, query, values=None):
+        with timed_query(query):
+            return await super().execute(query, values)
+
+    async def execute_many(self, query, values):
+        with timed_query(query):
+            return await super().execute_many(query, values)
+
+
+# Rows per multi-row INSERT, well below SQLite's bound parameter limit.
+ROWS_PER_STATEMENT = 200
+
+
+async def insert_rows(table: Table, rows: list[dict]) -> None:
+    """Insert `rows`, which all have the same keys, with one statement per ROWS_PER_STATEMENT rows."""
+    for start in range(0, len(rows), ROWS_PER_STATEMENT):
+        await database.execute(table.insert().values(rows[start:start + ROWS_PER_STATEMENT]))
+
+
+@lru_cache()
+def get_database() -> TimedDatabase:
+    """The primary database, set up from the settings on first use."""
+    return TimedDatabase(config.DATABASE_URL, force_rollback=config.DB_FORCE_ROLL_BACK, **pool_options(config.DATABASE_URL))
+
+
+@lru_cache()
+def get_db_router() -> DatabaseRouter:
+    read_databases = [TimedDatabase(url, **pool_options(url)) for url in config.DATABASE_READ_URLS]
+    return DatabaseRouter(get_database(), read_databases, config.READ_YOUR_WRITES_SECONDS)
+
+
+database = Lazy(get_database)
 
-database = databases.Database(config.DATABASE_URL, force_rollback=config.DB_FORCE_ROLL_BACK)
\ No newline at end of file
+db_router = Lazy(get_db_router)
@@ -0,0 +1,159 @@
+"""In-process pub/sub for real-time updates: new posts, comments and like counts.
+
+Endpoints that change content publish to `event_hub` after their writes
+commit; the streaming endpoints in api.routers.events subscribe. Each event
+is encoded once when it is published, however many subscribers get it.
+
+Every subscription has a bounded buffer. Like count updates are coalesced:
+while one for a post is still buffered, a newer one replaces its count
+instead of taking another slot, so a burst of likes costs a reader one
+message. A subscriber whose buffer fills up anyway is too slow to keep up;
+it is closed and dropped from the hub on the spot, so it holds no more than
+its buffer and costs publishers nothing further.
+
+The hub lives in one worker process: with several workers, each only sees
+the writes it served.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from functools import lru_cache
+from typing import Any, Hashable
+
+from api.config import Lazy, config
+
+logger = logging.getLogger(__name__)
+
+DISCONNECTED = "disconnected"
+SLOW_CONSUMER = "slow consumer"
+
+
+class Event:
+    __slots__ = ("type", "key", "message", "sse")
+
+    def __init__(self, type: str, data: dict[str, Any], key: Hashable | None = None):
+        self.type = type
+        # Buffered events with the same key are coalesced, the newest one wins.
+        self.key = key
+        self.message = json.dumps({"type": type, "data": data}, separators=(",", ":"))
+        self.sse = f"data: {self.message}\n\n".encode()
+
+
+class SubscriptionClosed(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Subscription:
+    def __init__(self, hub: "EventHub", maxsize: int):
+        self.hub = hub
+        self.maxsize = maxsize
+        self.closed_reason: str | None = None
+        self._queue: deque[Event] = deque()
+        # The newest event for each key that is in the queue.
+        self._latest: dict[Hashable, Event] = {}
+        self._ready = asyncio.Event()
+
+    def put(self, event: Event) -> None:
+        if self.closed_reason:
+            return
+        if event.key is not None and event.key in self._latest:
+            self._latest[event.key] = event
+            self.hub.coalesced += 1
+            return
+        if len(self._queue) >= self.maxsize:
+            self.close(SLOW_CONSUMER)
+            return
+        self._queue.append(event)
+        if event.key is not None:
+            self._latest[event.key] = event
+        self._ready.set()
+
+    async def next(self, timeout: float | None = None) -> Event | None:
+        """The next event, or None if there was none for `timeout` seconds.
+
+        Raises SubscriptionClosed once the subscription is closed."""
+        if not self._queue and not self.closed_reason:
+            self._ready.clear()
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._ready.wait()
+            except TimeoutError:
+                return None
+        if self.closed_reason:
+            raise SubscriptionClosed(self.closed_reason)
+        event = self._queue.popleft()
+        if event.key is not None:
+            event = self._latest.pop(event.key)
+        return event
+
+    def close(self, reason: str = DISCONNECTED) -> None:
+        if self.closed_reason:
+            return
+        self.closed_reason = reason
+        self._queue.clear()
+        self._latest.clear()
+        self._ready.set()
+        self.hub.unsubscribe(self)
+        if reason == SLOW_CONSUMER:
+            self.hub.slow_consumers += 1
+            logger.warning(f"Disconnecting a subscriber that fell {self.maxsize} events behind")
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class EventHub:
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self.subscribers: set[Subscription] = set()
+        self.published = 0
+        self.coalesced = 0
+        self.slow_consumers = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self.buffer_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    def publish(self, type: str, data: dict[str, Any], key: Hashable | None = None) -> None:
+        self.published += 1
+        if not self.subscribers:
+            return
+        event = Event(type, data, key)
+        # A copy, since a subscriber that overflows unsubscribes during the loop.
+        for subscription in list(self.subscribers):
+            subscription.put(event)
+
+    def publish_post(self, post: dict[str, Any]) -> None:
+        self.publish("post", post)
+
+    def publish_comment(self, comment: dict[str, Any]) -> None:
+        self.publish("comment", comment)
+
+    def publish_likes(self, post_id: int, likes: int) -> None:
+        self.publish("likes", {"post_id": post_id, "likes": likes}, key=("likes", post_id))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "slow_consumers": self.slow_consumers,
+        }
+
+
+@lru_cache()
+def get_event_hub() -> EventHub:
+    return EventHub(config.EVENTS_BUFFER_SIZE)
+
+
+event_hub = Lazy(get_event_hub)
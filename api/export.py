@@ -0,0 +1,84 @@
+"""Streaming NDJSON export of posts, comments and likes.
+
+Each line is one row: `{"table": "posts", "data": {...}}`. Rows are read with
+`database.iterate` and serialized one at a time, so memory use does not grow
+with the size of the tables.
+
+    python -m api.export --output dump.ndjson.gz --gzip
+"""
+import argparse
+import asyncio
+import json
+import sys
+import zlib
+from enum import Enum
+from typing import AsyncIterator, Iterable
+
+from api.database import comment_table, database, like_table, post_table
+
+
+class ExportTable(str, Enum):
+    posts = "posts"
+    comments = "comments"
+    likes = "likes"
+
+
+EXPORT_TABLES = {
+    ExportTable.posts: post_table,
+    ExportTable.comments: comment_table,
+    ExportTable.likes: like_table,
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def iterate_ndjson(tables: Iterable[ExportTable]) -> AsyncIterator[bytes]:
+    """Yield NDJSON in chunks of roughly CHUNK_SIZE bytes."""
+    buffer = bytearray()
+    for name in tables:
+        table = EXPORT_TABLES[name]
+        async for row in database.iterate(table.select().order_by(table.c.id)):
+            buffer += json.dumps({"table": name.value, "data": dict(row._mapping)}).encode()
+            buffer += b"\n"
+            if len(buffer) >= CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(tables: Iterable[ExportTable], gzip: bool = False) -> AsyncIterator[bytes]:
+    chunks = iterate_ndjson(tables)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+async def main(output: str, tables: list[ExportTable], gzip: bool) -> None:
+    await database.connect()
+    try:
+        out = sys.stdout.buffer if output == "-" else open(output, "wb")
+        try:
+            async for chunk in export_stream(tables, gzip):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export posts, comments and likes as NDJSON.")
+    parser.add_argument("--output", default="-", help="file to write, - for stdout")
+    parser.add_argument("--tables", nargs="+", type=ExportTable, default=list(ExportTable))
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.output, args.tables, args.gzip))
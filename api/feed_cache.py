@@ -0,0 +1,164 @@
+"""Read-through cache for feed pages.
+
+Entries are keyed on a generation number plus the page parameters. Writes
+that change the feed bump the generation instead of deleting keys, so every
+previously cached page becomes unreachable at once and simply ages out.
+
+Two backends are provided: `MemoryFeedCacheBackend` for a single process and
+`KeyValueFeedCacheBackend`, which works with any client offering async
+`get`, `set(key, value, ex=seconds)` and `incr` (the redis.asyncio API), so
+several workers can share one cache. A dict-backed fake of that API is
+enough to run it locally.
+"""
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Awaitable, Callable
+
+from api.cache import TTLCache
+from api.config import Lazy, config
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "feed:generation"
+
+
+class FeedCacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> str | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def generation(self) -> int: ...
+
+    @abstractmethod
+    async def bump_generation(self) -> int: ...
+
+    async def clear(self) -> None:
+        await self.bump_generation()
+
+
+class MemoryFeedCacheBackend(FeedCacheBackend):
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize, ttl)
+        self._generation = 0
+
+    async def get(self, key: str) -> str | None:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries.set(key, value, ttl=ttl)
+
+    async def generation(self) -> int:
+        return self._generation
+
+    async def bump_generation(self) -> int:
+        self._generation += 1
+        return self._generation
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        await self.bump_generation()
+
+
+class KeyValueFeedCacheBackend(FeedCacheBackend):
+    def __init__(self, client: Any, prefix: str = ""):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> str | None:
+        value = await self.client.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def generation(self) -> int:
+        return int(await self.client.get(self.prefix + GENERATION_KEY) or 0)
+
+    async def bump_generation(self) -> int:
+        return await self.client.incr(self.prefix + GENERATION_KEY)
+
+
+class FeedCache:
+    """Cache in front of a page loader with per-key request coalescing.
+
+    Concurrent misses for the same key in this process share one call to the
+    loader instead of all running the feed query (cache stampede)."""
+
+    def __init__(self, backend: FeedCacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get_or_load(self, parts: tuple, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await loader()
+        generation = await self.backend.generation()
+        key = "feed:" + ":".join(str(part) for part in (generation, *parts))
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            return json.loads(cached)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            future.set_result(value)
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting on it.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        # A write that raced with the loader bumped the generation, so this
+        # page lands under a key that is already unreachable.
+        await self.backend.set(key, json.dumps(value), self.ttl)
+        return value
+
+    async def invalidate(self) -> None:
+        self.invalidations += 1
+        await self.backend.bump_generation()
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+        self.hits = self.misses = self.coalesced = self.invalidations = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+
+@lru_cache()
+def get_feed_cache() -> FeedCache:
+    return FeedCache(
+        MemoryFeedCacheBackend(config.FEED_CACHE_SIZE, config.FEED_CACHE_TTL_SECONDS),
+        config.FEED_CACHE_TTL_SECONDS,
+    )
+
+
+feed_cache = Lazy(get_feed_cache)
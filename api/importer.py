@@ -0,0 +1,167 @@
+"""Bulk import of NDJSON content dumps, as written by `api.export`.
+
+The file is read line by line, so it can be larger than memory. Records are
+validated with the API input models and inserted in batches, one
+transaction per batch. After every committed batch the byte offset of the
+next unread line is written to the checkpoint file, and a rerun with the
+same checkpoint resumes from there.
+
+Imported posts are not fanned out into timelines (see api.timeline). They
+show up there only for authors past TIMELINE_FANOUT_MAX_FOLLOWERS, whose
+posts are read on demand, and for followers who follow the author after the
+import, whose inbox is backfilled with the author's recent posts.
+
+    python -m api.importer dump.ndjson.gz --batch-size 1000 --checkpoint dump.checkpoint
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import BinaryIO
+
+from pydantic import BaseModel, ValidationError
+
+from api.database import comment_table, database, insert_rows, like_table, post_table
+from api.like_counts import reconcile_like_counts
+from api.models.post import CommentInput, PostLikeIn, UserPostInput
+
+logger = logging.getLogger(__name__)
+
+class PostRecord(UserPostInput):
+    id: int | None = None
+    user_id: int
+    like_count: int = 0
+    image_url: str | None = None
+    # As stored: the JSON list written by api.thumbnails.
+    thumbnails: str | None = None
+
+
+class CommentRecord(CommentInput):
+    id: int | None = None
+    user_id: int
+
+
+class LikeRecord(PostLikeIn):
+    id: int | None = None
+    user_id: int
+
+
+# Insertion order within a batch, so comments and likes follow their posts.
+RECORD_TYPES: dict[str, tuple[type[BaseModel], object]] = {
+    "posts": (PostRecord, post_table),
+    "comments": (CommentRecord, comment_table),
+    "likes": (LikeRecord, like_table),
+}
+
+
+class ImportStats(BaseModel):
+    offset: int = 0
+    imported: int = 0
+    skipped: int = 0
+    likes: int = 0
+
+
+def open_dump(path: Path) -> BinaryIO:
+    with open(path, "rb") as f:
+        is_gzip = f.read(2) == b"\x1f\x8b"
+    return gzip.open(path, "rb") if is_gzip else open(path, "rb")
+
+
+def read_checkpoint(checkpoint: Path | None) -> ImportStats:
+    if checkpoint is None or not checkpoint.exists():
+        return ImportStats()
+    return ImportStats.model_validate_json(checkpoint.read_text())
+
+
+def write_checkpoint(checkpoint: Path | None, stats: ImportStats) -> None:
+    if checkpoint is None:
+        return
+    tmp = checkpoint.with_name(checkpoint.name + ".tmp")
+    tmp.write_text(stats.model_dump_json())
+    os.replace(tmp, checkpoint)
+
+
+def parse_record(line: bytes) -> tuple[str, dict]:
+    record = json.loads(line)
+    model, _ = RECORD_TYPES[record["table"]]
+    return record["table"], model.model_validate(record["data"]).model_dump(exclude_none=True)
+
+
+async def insert_batch(batch: dict[str, list[dict]]) -> None:
+    async with database.transaction():
+        for name, (_, table) in RECORD_TYPES.items():
+            rows = batch[name]
+            # A multi-row INSERT needs the same columns in every row.
+            by_columns: dict[tuple, list[dict]] = {}
+            for row in rows:
+                by_columns.setdefault(tuple(sorted(row)), []).append(row)
+            for group in by_columns.values():
+                await insert_rows(table, group)
+
+
+async def import_file(path: Path, batch_size: int = 1000, checkpoint: Path | None = None) -> ImportStats:
+    """Import `path`, resuming from `checkpoint` if it exists."""
+    stats = read_checkpoint(checkpoint)
+    started, started_rows = time.perf_counter(), stats.imported
+    batch: dict[str, list[dict]] = {name: [] for name in RECORD_TYPES}
+    pending = 0
+    offset = stats.offset
+
+    async def flush() -> None:
+        nonlocal pending
+        await insert_batch(batch)
+        stats.imported += pending
+        stats.likes += len(batch["likes"])
+        stats.offset = offset
+        write_checkpoint(checkpoint, stats)
+        for rows in batch.values():
+            rows.clear()
+        pending = 0
+        rate = (stats.imported - started_rows) / max(time.perf_counter() - started, 1e-9)
+        logger.info(f"Imported {stats.imported} rows ({rate:.0f} rows/s), skipped {stats.skipped}, offset {offset}")
+
+    with open_dump(path) as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                name, row = parse_record(line)
+            except (ValueError, KeyError, TypeError, ValidationError) as e:
+                stats.skipped += 1
+                logger.warning(f"Skipping invalid record at offset {offset - len(line)}: {e}")
+                continue
+            batch[name].append(row)
+            pending += 1
+            if pending >= batch_size:
+                await flush()
+    await flush()
+    return stats
+
+
+async def main(path: Path, batch_size: int, checkpoint: Path | None) -> None:
+    await database.connect()
+    try:
+        stats = await import_file(path, batch_size, checkpoint)
+        if stats.likes:
+            # Imported likes are not reflected in the counters of their posts.
+            await reconcile_like_counts()
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    from api.logging_conf import configure_logging
+
+    parser = argparse.ArgumentParser(description="Import an NDJSON content dump.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", type=Path, help="file recording progress; reruns resume from it")
+    args = parser.parse_args()
+    configure_logging()
+    asyncio.run(main(args.path, args.batch_size, args.checkpoint))
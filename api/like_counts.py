@@ -0,0 +1,74 @@
+"""Recompute `posts.like_count` from the `likes` table.
+
+The counter is maintained by the like/unlike endpoints; this is the one-off
+backfill for existing databases and a reconciliation tool for drift:
+
+    python -m api.like_counts --batch-size 1000
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import func, select
+
+from api.database import database, like_table, post_table
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_like_counts(batch_size: int = 1000) -> int:
+    """Fix every post whose `like_count` differs from its number of likes.
+
+    Posts are processed in id ranges of `batch_size`, each in its own
+    transaction, so a large table is never locked as a whole. Returns the
+    number of posts that were corrected."""
+    bounds = await database.fetch_one(select(func.min(post_table.c.id), func.max(post_table.c.id)))
+    first_id, last_id = bounds[0], bounds[1]
+    if first_id is None:
+        return 0
+
+    corrected = 0
+    for low in range(first_id, last_id + 1, batch_size):
+        high = low + batch_size
+        counts = (
+            select(like_table.c.post_id, func.count(like_table.c.id).label("likes"))
+            .where(like_table.c.post_id >= low, like_table.c.post_id < high)
+            .group_by(like_table.c.post_id)
+            .subquery()
+        )
+        actual = func.coalesce(counts.c.likes, 0)
+        query = (
+            select(post_table.c.id, actual.label("likes"))
+            .select_from(post_table.outerjoin(counts, counts.c.post_id == post_table.c.id))
+            .where(post_table.c.id >= low, post_table.c.id < high, post_table.c.like_count != actual)
+        )
+        async with database.transaction():
+            drifted = await database.fetch_all(query)
+            if drifted:
+                await database.execute_many(
+                    "UPDATE posts SET like_count = :likes WHERE id = :id",
+                    [{"id": row["id"], "likes": row["likes"]} for row in drifted],
+                )
+        corrected += len(drifted)
+        logger.debug(f"Reconciled posts {low}-{high - 1}, corrected {len(drifted)}")
+
+    logger.info(f"Reconciled like counts, corrected {corrected} posts")
+    return corrected
+
+
+async def main(batch_size: int) -> None:
+    await database.connect()
+    try:
+        await reconcile_like_counts(batch_size)
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    from api.logging_conf import configure_logging
+
+    parser = argparse.ArgumentParser(description="Recompute posts.like_count from the likes table.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    configure_logging()
+    asyncio.run(main(args.batch_size))
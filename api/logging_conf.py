@@ -1,8 +1,14 @@
+import atexit
+import copy
 import logging
+import queue
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
-from api.config import config as app_config, DevConfig
+from asgi_correlation_id import CorrelationIdFilter
+
+from api.config import DevConfig, current_config
 
 def obfuscated(value: str, length: int) -> str:
     if "@" not in value:
@@ -25,24 +31,107 @@ class EmailObfuscationFilter(logging.Filter):
             record.email = obfuscated(record.email, self.obfuscated_length)
         return True
 
-handlers = ["default", "rotating_file"] if isinstance(app_config, DevConfig) else ["default", "rotating_file", "logtail"]
+class DroppingQueueHandler(QueueHandler):
+    """Queues records for a `QueueListener` and drops them when the queue is full.
+
+    Logging must never block the event loop, so a full queue (the listener
+    cannot keep up, e.g. a slow log shipper) loses records instead; `dropped`
+    counts them."""
+
+    def __init__(self, queue: queue.Queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, they may change before the listener formats the record.
+        # Unlike the base class, keep exc_info: the queue stays in this process.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    def handle(self, record: logging.LogRecord) -> None:
+        # Each handler gets its own copy, so one handler's filters (e.g. email
+        # obfuscation on the console) do not change what the others write.
+        record = self.prepare(record)
+        for handler in self.handlers:
+            if not self.respect_handler_level or record.levelno >= handler.level:
+                handler.handle(copy.copy(record))
+
+    def enqueue_sentinel(self) -> None:
+        # The base class uses put_nowait, which raises when the queue is full;
+        # wait for the listener to make room instead (unless it has died).
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(self._sentinel)
+
+
+_listeners: list[QueueListener] = []
+queue_handlers: list[DroppingQueueHandler] = []
+
+
+def attach_queue(logger_names: list[str], maxsize: int, filters: list[logging.Filter] = ()) -> None:
+    """Move the handlers of the given loggers onto background threads.
+
+    Each distinct set of handlers gets its own bounded queue, drained by a
+    `QueueListener` thread, and the loggers get a `DroppingQueueHandler` in
+    its place. `filters` run on the calling thread, for every handler, so
+    filters that read context variables (like the correlation id) still see
+    the request's context. The handlers keep their own filters, which run on
+    the listener thread.
+    """
+    by_handlers: dict[tuple[logging.Handler, ...], DroppingQueueHandler] = {}
+    for name in logger_names:
+        logger = logging.getLogger(name)
+        handlers = tuple(logger.handlers)
+        if not handlers:
+            continue
+        if handlers not in by_handlers:
+            records = queue.Queue(maxsize)
+            handler = DroppingQueueHandler(records)
+            for log_filter in filters:
+                handler.addFilter(log_filter)
+            listener = DrainingQueueListener(records, *handlers, respect_handler_level=True)
+            listener.start()
+            _listeners.append(listener)
+            queue_handlers.append(handler)
+            by_handlers[handlers] = handler
+        logger.handlers = [by_handlers[handlers]]
+
+
+@atexit.register
+def stop_logging() -> None:
+    """Write out the queued records and stop the listener threads."""
+    while _listeners:
+        _listeners.pop().stop()
+    queue_handlers.clear()
+
+
+def dropped_records() -> int:
+    return sum(handler.dropped for handler in queue_handlers)
+
 
 def configure_logging():
-    logs_dir = Path(__file__).resolve().parent.parent / "logs"
+    stop_logging()
+    app_config = current_config()
+    logs_dir = Path(app_config.LOG_DIR or Path(__file__).resolve().parent.parent / "logs")
     logs_dir.mkdir(parents=True, exist_ok=True)
 
     is_dev = isinstance(app_config, DevConfig)
+    handlers = ["default", "rotating_file"] if is_dev else ["default", "rotating_file", "logtail"]
 
     dictConfig(
         {
             "version": 1,
             "disable_existing_loggers": False,
             "filters": {
-                "correlation_id": {
-                    "()": "asgi_correlation_id.CorrelationIdFilter",
-                    "uuid_length": 8 if is_dev else 32,
-                    "default_value": "-",
-                },
                 "email": {
                     "()": EmailObfuscationFilter,
                     "name": "email",
@@ -66,7 +155,7 @@ def configure_logging():
                     "class": "logging.StreamHandler",
                     "level": "DEBUG" if is_dev else "INFO",
                     "formatter": "console",
-                    "filters": ["correlation_id", "email"],
+                    "filters": ["email"],
                 },
                 "rotating_file": {
                     "class": "logging.handlers.RotatingFileHandler",
@@ -76,13 +165,12 @@ def configure_logging():
                     "maxBytes": 5 * 1024 * 1024,
                     "backupCount": 5,
                     "encoding": "utf-8",
-                    "filters": ["correlation_id"],
                 },
                 "logtail": {
                     "class": "logtail.LogtailHandler",
                     "level": "DEBUG" if is_dev else "INFO",
                     "formatter": "console",
-                    "filters": ["correlation_id", "email"],
+                    "filters": ["email"],
                     "source_token": app_config.LOGTAIL_API_KEY,
                     "host": "https://s1486720.eu-nbg-2.betterstackdata.com",
                 },
@@ -115,4 +203,13 @@ def configure_logging():
                 },
             },
         }
-    )
\ No newline at end of file
+    )
+
+    # Handlers do formatting and file/network I/O; run them on listener threads
+    # instead of on the event loop. The correlation id is read before queueing,
+    # in the request's context; the email filter stays on the handlers it was on.
+    attach_queue(
+        ["", "api", "uvicorn", "databases", "aiosqlite", "urllib3"],
+        app_config.LOG_QUEUE_SIZE,
+        filters=[CorrelationIdFilter(uuid_length=8 if is_dev else 32, default_value="-")],
+    )
@@ -0,0 +1,174 @@
+"""Worker that drains the durable `outbound_emails` queue.
+
+Emails are enqueued with `api.tasks.enqueue_email`. The worker claims due
+emails in batches, groups those with identical subject and body into one
+Mailgun batch send, and sends the groups concurrently (at most
+MAIL_QUEUE_CONCURRENCY at a time) over the shared HTTP client. Failed sends
+are retried with exponential backoff until MAIL_QUEUE_MAX_ATTEMPTS, after
+which the email is marked `failed`.
+
+Several workers may drain the same queue. A claim marks emails `sending`
+under a lease (`claimed_by`, `claimed_at`) in one transaction, and only
+takes emails that are still `pending`, so no email is claimed twice. The
+emails of a worker that died mid-send are claimed again once their lease of
+MAIL_QUEUE_LEASE_SECONDS has expired.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from functools import lru_cache
+
+from sqlalchemy import or_, select
+
+from api import tasks
+from api.config import Lazy, config
+from api.database import database, outbound_email_table
+
+logger = logging.getLogger(__name__)
+
+# Mailgun accepts at most 1000 recipients per batch send.
+MAX_RECIPIENTS = 1000
+
+
+class MailQueueWorker:
+    def __init__(self):
+        self.batch_size = config.MAIL_QUEUE_BATCH_SIZE
+        self.concurrency = config.MAIL_QUEUE_CONCURRENCY
+        self.max_attempts = config.MAIL_QUEUE_MAX_ATTEMPTS
+        self.retry_base_seconds = config.MAIL_QUEUE_RETRY_BASE_SECONDS
+        self.poll_seconds = config.MAIL_QUEUE_POLL_SECONDS
+        self.lease_seconds = config.MAIL_QUEUE_LEASE_SECONDS
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def wake(self) -> None:
+        """Process the queue now instead of at the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        await self.recover_expired_leases()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.process_once()
+            except Exception:
+                logger.exception("Mail queue iteration failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def recover_expired_leases(self) -> None:
+        """Put emails back in the queue whose worker died mid-send; leases still held are left alone."""
+        await database.execute(
+            outbound_email_table.update()
+            .where(
+                outbound_email_table.c.status == "sending",
+                or_(
+                    outbound_email_table.c.claimed_at.is_(None),
+                    outbound_email_table.c.claimed_at < time.time() - self.lease_seconds,
+                ),
+            )
+            .values(status="pending", claimed_by=None, claimed_at=None)
+        )
+
+    async def claim(self) -> list:
+        """Lease up to `batch_size` due emails to this worker and return them."""
+        now = time.time()
+        claim = uuid.uuid4().hex
+        async with database.transaction():
+            due = await database.fetch_all(
+                select(outbound_email_table.c.id)
+                .where(outbound_email_table.c.status == "pending", outbound_email_table.c.next_attempt_at <= now)
+                .order_by(outbound_email_table.c.next_attempt_at)
+                .limit(self.batch_size)
+            )
+            if not due:
+                return []
+            # Another worker may have claimed some of them since they were read.
+            await database.execute(
+                outbound_email_table.update()
+                .where(outbound_email_table.c.id.in_([row["id"] for row in due]), outbound_email_table.c.status == "pending")
+                .values(status="sending", claimed_by=claim, claimed_at=now)
+            )
+            emails = await database.fetch_all(
+                select(outbound_email_table).where(outbound_email_table.c.claimed_by == claim)
+            )
+        if len(emails) < len(due):
+            logger.debug(f"{len(due) - len(emails)} emails were claimed by another worker")
+        return emails
+
+    async def process_once(self) -> int:
+        """Send one batch of due emails; return how many were claimed."""
+        await self.recover_expired_leases()
+        emails = await self.claim()
+        if not emails:
+            return 0
+
+        groups: dict[tuple[str, str], list] = {}
+        for email in emails:
+            groups.setdefault((email["subject"], email["body"]), []).append(email)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        sends = []
+        for (subject, body), group in groups.items():
+            for start in range(0, len(group), MAX_RECIPIENTS):
+                sends.append(self._send_group(semaphore, subject, body, group[start:start + MAX_RECIPIENTS]))
+        await asyncio.gather(*sends)
+        return len(emails)
+
+    async def _send_group(self, semaphore: asyncio.Semaphore, subject: str, body: str, emails: list) -> None:
+        async with semaphore:
+            try:
+                await tasks.send_batch([email["recipient"] for email in emails], subject, body)
+            except Exception as e:
+                logger.warning(f"Sending {len(emails)} emails failed: {e}")
+                await self._reschedule(emails, str(e))
+                return
+        await database.execute(
+            outbound_email_table.update()
+            .where(
+                outbound_email_table.c.id.in_([email["id"] for email in emails]),
+                outbound_email_table.c.claimed_by == emails[0]["claimed_by"],
+            )
+            .values(status="sent", attempts=outbound_email_table.c.attempts + 1, last_error=None)
+        )
+
+    async def _reschedule(self, emails: list, error: str) -> None:
+        for email in emails:
+            attempts = email["attempts"] + 1
+            if attempts >= self.max_attempts:
+                values = {"status": "failed"}
+            else:
+                values = {"status": "pending", "next_attempt_at": time.time() + self.retry_base_seconds * 2 ** (attempts - 1)}
+            # Unless the lease expired and another worker has claimed it since.
+            await database.execute(
+                outbound_email_table.update()
+                .where(outbound_email_table.c.id == email["id"], outbound_email_table.c.claimed_by == email["claimed_by"])
+                .values(attempts=attempts, last_error=error[:500], **values)
+            )
+
+
+@lru_cache()
+def get_mail_worker() -> MailQueueWorker:
+    return MailQueueWorker()
+
+
+mail_worker = Lazy(get_mail_worker)
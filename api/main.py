@@ -4,9 +4,22 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from asgi_correlation_id import CorrelationIdMiddleware
 from fastapi.exceptions import HTTPException
-from api.database import database
-from api.logging_conf import configure_logging
+from api import tasks
+from api.database import database, db_router
+from api.logging_conf import configure_logging, stop_logging
+from api.mail_queue import mail_worker
+from api.migrations import upgrade
+from api.security import password_executor
+from api.storage import get_storage, mount_local_media, upload_executor
+from api.thumbnails import thumbnail_executor
+from api.metrics import MetricsMiddleware
+from api.rate_limit import ConcurrencyLimitMiddleware
+from api.routers.events import router as events_router
+from api.routers.export import router as export_router
+from api.routers.metrics import router as metrics_router
 from api.routers.post import router as post_router
+from api.routers.search import router as search_router
+from api.routers.timeline import router as timeline_router
 from api.routers.user import router as user_router
 
 logger = logging.getLogger(__name__)
@@ -14,16 +27,35 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     configure_logging()
+    upgrade()
+    mount_local_media(app, get_storage())
     await database.connect()
+    await db_router.connect()
+    await mail_worker.start()
     yield
+    await mail_worker.stop()
+    await tasks.close_http_client()
+    await db_router.disconnect()
     await database.disconnect()
+    password_executor.shutdown()
+    upload_executor.shutdown()
+    thumbnail_executor.shutdown()
+    stop_logging()
 
 app = FastAPI(lifespan=lifespan)
 
+# Innermost, so shed requests still get a correlation id and show up in the metrics.
+app.add_middleware(ConcurrencyLimitMiddleware, exempt_paths=("/events", "/metrics"))
 app.add_middleware(CorrelationIdMiddleware,)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(post_router)
 app.include_router(user_router)
+app.include_router(export_router)
+app.include_router(search_router)
+app.include_router(timeline_router)
+app.include_router(events_router)
+app.include_router(metrics_router)
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
@@ -0,0 +1,235 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+A deliberately small subset of what `prometheus_client` offers: counters,
+gauges and histograms with labels, plus collectors that report the stats of
+the caches and executors at scrape time. Recording a sample is a dict
+lookup and, for histograms, a bisect, so it is cheap enough to leave on.
+Values are per process; with several workers, scrape each one.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+from sqlalchemy import Table
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from api.statements import BoundStatement
+
+# Request and query latencies, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values, strict=True)) + "}"
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{format_labels(self.labelnames, labels)} {value}" for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labelvalues, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues, value: float) -> None:
+        self._values[labelvalues] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (not cumulative, the last one is +Inf), then the sum.
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        counts = self._values.get(labelvalues)
+        if counts is None:
+            counts = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def count(self, *labelvalues) -> int:
+        counts = self._values.get(labelvalues)
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self) -> list[str]:
+        lines = []
+        bucket_names = (*self.labelnames, "le")
+        for labels, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts[:-1], strict=True):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(bucket_names, (*labels, bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {counts[-1]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+# A collector returns (metric name, help, [(labels, value), ...]) tuples, rendered as gauges.
+Collector = Callable[[], Iterable[tuple[str, str, list[tuple[dict, float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+        self.collectors: list[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector) -> Collector:
+        self.collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, help, samples in collector():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(tuple(labels), tuple(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+))
+db_query_duration_seconds = registry.register(Histogram(
+    "db_query_duration_seconds", "Database query latency by query name.", ("query",)
+))
+db_query_errors_total = registry.register(Counter(
+    "db_query_errors_total", "Database queries that raised, by query name.", ("query",)
+))
+
+
+def query_name(query) -> str:
+    """A low-cardinality name for a query: the statement name, or its verb and main table, e.g. `select posts`."""
+    if isinstance(query, BoundStatement):
+        return query.name
+    if isinstance(query, str):
+        words = query.split(None, 1)
+        return words[0].lower() if words else "empty"
+    verb = getattr(query, "__visit_name__", type(query).__name__.lower())
+    table = getattr(query, "table", None)
+    if table is None and hasattr(query, "selected_columns"):
+        # The table of the first column; much cheaper than resolving the FROM clause.
+        columns = query.selected_columns
+        table = getattr(columns[0], "table", None) if len(columns) else None
+    # Only real tables; subqueries get generated names that would add a series per statement.
+    if isinstance(table, Table):
+        return f"{verb} {table.name}"
+    return verb
+
+
+@contextmanager
+def timed_query(query) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        db_query_errors_total.inc(query_name(query))
+        raise
+    finally:
+        db_query_duration_seconds.observe(time.perf_counter() - started, query_name(query))
+
+
+def route_template(scope: Scope) -> str:
+    """The path template of the route that handled the request, e.g. `/post/{post_id}`."""
+    path = getattr(scope.get("route"), "path", None)
+    # Unmatched paths are not used as labels, so a scanner cannot explode the series count.
+    return path if path is not None else "<unmatched>"
+
+
+# Scopes of the requests being handled, by id. The router records the matched
+# route in the scope, so the in-progress gauge is grouped by route at scrape time.
+in_flight: dict[int, Scope] = {}
+
+
+@registry.register_collector
+def requests_in_progress():
+    counts: dict[tuple[str, str], int] = {}
+    for scope in list(in_flight.values()):
+        key = (scope["method"], route_template(scope) if "route" in scope else "<routing>")
+        counts[key] = counts.get(key, 0) + 1
+    yield "http_requests_in_progress", "HTTP requests being handled, by route template.", [
+        ({"method": method, "route": route}, count) for (method, route), count in counts.items()
+    ]
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so it adds no per-request task or body buffering."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        key = id(scope)
+        in_flight[key] = scope
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            del in_flight[key]
+            method, route = scope["method"], route_template(scope)
+            http_request_duration_seconds.observe(duration, method, route)
+            http_requests_total.inc(method, route, status)
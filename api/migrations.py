@@ -0,0 +1,149 @@
+"""Versioned schema migrations.
+
+`metadata.create_all` only creates tables that are missing, so new columns,
+indexes and constraints never reach an existing database. `upgrade` creates
+missing tables and then applies, in order, every migration that is not yet
+recorded in the `schema_migrations` table. Migrations must be idempotent: on
+a fresh database the tables are created with the current schema first.
+
+    python -m api.migrations
+"""
+import logging
+from typing import Callable
+
+from sqlalchemy import Column, Connection, Engine, Integer, String, Table, inspect, select, text
+
+from api.database import metadata
+
+logger = logging.getLogger(__name__)
+
+schema_migrations_table = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+)
+
+MIGRATIONS: list[tuple[int, Callable[[Connection], None]]] = []
+
+
+def migration(version: int):
+    def register(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((version, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return register
+
+
+def create_missing_indexes(conn: Connection) -> None:
+    inspector = inspect(conn)
+    for table in metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            # Indexes on columns a later migration adds are left to that migration.
+            if {column.name for column in index.columns} <= columns:
+                index.create(conn, checkfirst=True)
+
+
+@migration(1)
+def add_post_like_count(conn: Connection) -> None:
+    columns = {column["name"] for column in inspect(conn).get_columns("posts")}
+    if "like_count" in columns:
+        return
+    conn.execute(text("ALTER TABLE posts ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text("UPDATE posts SET like_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id)"))
+
+
+@migration(2)
+def add_lookup_indexes_and_unique_likes(conn: Connection) -> None:
+    duplicates = conn.execute(text(
+        "DELETE FROM likes WHERE id NOT IN (SELECT min(id) FROM likes GROUP BY post_id, user_id)"
+    )).rowcount
+    if duplicates:
+        logger.warning(f"Removed {duplicates} duplicate likes")
+        conn.execute(text("UPDATE posts SET like_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id)"))
+    # Superseded by the unique (post_id, user_id) index.
+    conn.execute(text("DROP INDEX IF EXISTS ix_likes_post_id"))
+    create_missing_indexes(conn)
+
+
+@migration(3)
+def add_search_index(conn: Connection) -> None:
+    from api.search import search_backend_for
+
+    # FTS5 on SQLite; other databases search the tables and need no index.
+    backend = search_backend_for(conn.dialect.name)
+    backend.install(conn)
+    backend.rebuild(conn)
+
+
+@migration(4)
+def add_user_follower_count(conn: Connection) -> None:
+    columns = {column["name"] for column in inspect(conn).get_columns("users")}
+    if "follower_count" in columns:
+        return create_missing_indexes(conn)
+    conn.execute(text("ALTER TABLE users ADD COLUMN follower_count INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text(
+        "UPDATE users SET follower_count = (SELECT count(*) FROM follows WHERE follows.followee_id = users.id)"
+    ))
+    create_missing_indexes(conn)
+
+
+@migration(5)
+def add_post_image_url(conn: Connection) -> None:
+    columns = {column["name"] for column in inspect(conn).get_columns("posts")}
+    if "image_url" not in columns:
+        conn.execute(text("ALTER TABLE posts ADD COLUMN image_url VARCHAR"))
+
+
+@migration(6)
+def add_post_thumbnails(conn: Connection) -> None:
+    columns = {column["name"] for column in inspect(conn).get_columns("posts")}
+    if "thumbnails" not in columns:
+        conn.execute(text("ALTER TABLE posts ADD COLUMN thumbnails VARCHAR"))
+
+
+@migration(7)
+def add_content_versions(conn: Connection) -> None:
+    from api import conditional
+
+    # The triggers are SQLite's; elsewhere the read endpoints send no validators.
+    if conn.dialect.name != "sqlite":
+        return
+    conditional.install(conn)
+
+
+@migration(8)
+def add_outbound_email_leases(conn: Connection) -> None:
+    columns = {column["name"] for column in inspect(conn).get_columns("outbound_emails")}
+    if "claimed_by" not in columns:
+        conn.execute(text("ALTER TABLE outbound_emails ADD COLUMN claimed_by VARCHAR"))
+    if "claimed_at" not in columns:
+        conn.execute(text("ALTER TABLE outbound_emails ADD COLUMN claimed_at FLOAT"))
+
+
+def upgrade(engine: Engine | None = None) -> list[int]:
+    """Bring the database schema up to date and return the versions applied."""
+    if engine is None:
+        from api.database import get_engine
+
+        engine = get_engine()
+    applied_now = []
+    with engine.begin() as conn:
+        metadata.create_all(conn)
+        applied = set(conn.execute(select(schema_migrations_table.c.version)).scalars())
+        for version, fn in MIGRATIONS:
+            if version in applied:
+                continue
+            logger.info(f"Applying migration {version}: {fn.__name__}")
+            fn(conn)
+            conn.execute(schema_migrations_table.insert().values(version=version, name=fn.__name__))
+            applied_now.append(version)
+    return applied_now
+
+
+if __name__ == "__main__":
+    from api.logging_conf import configure_logging
+
+    configure_logging()
+    upgrade()
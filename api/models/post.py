@@ -1,13 +1,26 @@
-from pydantic import BaseModel, ConfigDict
+from typing import Annotated
+
+from pydantic import BaseModel, ConfigDict, Field, Json
+
+MAX_BATCH_SIZE = 500
 
 class UserPostInput(BaseModel):
     body: str
 
+class Thumbnail(BaseModel):
+    size: int
+    width: int
+    height: int
+    url: str
+
 class UserPost(UserPostInput):
     model_config = ConfigDict(from_attributes=True)
     id: int
     user_id: int
     likes: int = 0
+    image_url: str | None = None
+    # Stored as JSON text, see api.thumbnails.
+    thumbnails: Json[list[Thumbnail]] | None = None
     
 class UserPostWithLikes(UserPost):
     likes: int
@@ -33,4 +46,19 @@ class PostLikeIn(BaseModel):
 
 class PostLike(PostLikeIn):
     id: int
-    user_id: int
\ No newline at end of file
+    user_id: int
+
+class PostMedia(BaseModel):
+    post_id: int
+    image_url: str
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: int
+    # The id of the created post or comment.
+    id: int | None = None
+    detail: str | None = None
+
+UserPostBatchInput = Annotated[list[UserPostInput], Field(min_length=1, max_length=MAX_BATCH_SIZE)]
+CommentBatchInput = Annotated[list[CommentInput], Field(min_length=1, max_length=MAX_BATCH_SIZE)]
+PostLikeBatchInput = Annotated[list[PostLikeIn], Field(min_length=1, max_length=MAX_BATCH_SIZE)]
@@ -0,0 +1,15 @@
+from enum import Enum
+
+from pydantic import BaseModel
+
+
+class SearchKind(str, Enum):
+    post = "post"
+    comment = "comment"
+
+
+class SearchResult(BaseModel):
+    kind: SearchKind
+    id: int
+    post_id: int
+    body: str
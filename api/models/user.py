@@ -6,3 +6,11 @@ class User(BaseModel):
     
 class UserIn(User):
     password: str
+
+class FollowIn(BaseModel):
+    user_id: int
+
+class Follow(BaseModel):
+    id: int
+    follower_id: int
+    followee_id: int
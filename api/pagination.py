@@ -0,0 +1,33 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(kind: str, *keys) -> str:
+    """Encode the sort key of the last row of a page into an opaque cursor."""
+    raw = json.dumps({"k": kind, "v": list(keys)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str, size: int) -> list:
+    """Decode a cursor produced by `encode_cursor` for the same `kind`.
+
+    Raises a 400 if the cursor is malformed or was issued for another kind of
+    listing (e.g. a `new` cursor passed to a `most_likes` listing)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = data["v"]
+        valid = data["k"] == kind and len(values) == size and all(isinstance(v, int) for v in values)
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -0,0 +1,253 @@
+"""Protection against bursts: per-route request budgets and a cap on requests in flight.
+
+Budgets are token buckets. A route opts in with a `RateLimit` dependency
+naming its budget in `config.RATE_LIMITS`, e.g. `"login": "10/minute"`: a
+bucket holds up to 10 tokens, refills at 10 per minute, and each request
+takes one. Buckets are per caller: the user of a valid access token, else
+the client address. A request that finds its bucket empty gets a 429 with
+`Retry-After`, before the endpoint (and its bcrypt or feed query) runs.
+
+Two backends are provided, like for the feed cache: `MemoryRateLimitBackend`
+for a single process and `KeyValueRateLimitBackend`, which keeps buckets in
+a shared store offering async `eval(script, numkeys, *keys_and_args)` (the
+redis.asyncio API) so the budget holds across workers. The bucket update
+runs as one script there, so concurrent requests cannot both take the last
+token.
+
+`ConcurrencyLimitMiddleware` caps how many requests one process handles at
+once; past the cap it answers 503 with `Retry-After` straight away, instead
+of queueing requests until their clients time out.
+"""
+import logging
+import math
+import re
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Annotated, Any, Callable
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from api.cache import TTLCache
+from api.config import Lazy, config
+from api.security import get_access_token_subject, optional_oauth2_scheme
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Budget:
+    requests: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second."""
+        return self.requests / self.seconds
+
+    @classmethod
+    def parse(cls, value: str) -> "Budget":
+        """A budget written as `<requests>/<second|minute|hour|day>`, e.g. `10/minute`."""
+        match = re.fullmatch(r"\s*(\d+)\s*/\s*(second|minute|hour|day)s?\s*", value)
+        if match is None:
+            raise ValueError(f"Invalid rate limit {value!r}, expected e.g. '10/minute'")
+        return cls(int(match[1]), PERIODS[match[2]])
+
+
+def refill(tokens: float, elapsed: float, budget: Budget) -> float:
+    return min(budget.requests, tokens + max(0.0, elapsed) * budget.rate)
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def take(self, key: str, budget: Budget) -> float:
+        """Take a token from bucket `key`: 0 if there was one, else the seconds until there will be."""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Forget every bucket this backend holds for this process."""
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, maxsize: int, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        # (tokens, updated at) per key. An entry expires once its bucket would
+        # be full again, which is what a missing entry means, so idle callers
+        # cost nothing. When more callers than `maxsize` are active, the least
+        # recently seen lose their bucket and start over with a full one.
+        self._buckets = TTLCache(maxsize, math.inf, clock=clock)
+
+    async def take(self, key: str, budget: Budget) -> float:
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        tokens = budget.requests if bucket is None else refill(bucket[0], now - bucket[1], budget)
+        if tokens < 1:
+            return (1 - tokens) / budget.rate
+        tokens -= 1
+        self._buckets.set(key, (tokens, now), ttl=(budget.requests - tokens) / budget.rate)
+        return 0.0
+
+    async def clear(self) -> None:
+        self._buckets.clear()
+
+
+# The token bucket of MemoryRateLimitBackend.take, on the store's clock.
+# Replies are strings since Lua numbers come back truncated to integers.
+TAKE_TOKEN_SCRIPT = """
+local requests = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = requests
+if bucket[1] then
+    tokens = math.min(requests, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate)
+end
+if tokens < 1 then
+    return tostring((1 - tokens) / rate)
+end
+tokens = tokens - 1
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("PEXPIRE", KEYS[1], math.ceil((requests - tokens) / rate * 1000))
+return "0"
+"""
+
+
+class KeyValueRateLimitBackend(RateLimitBackend):
+    def __init__(self, client: Any, prefix: str = "rate:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, budget: Budget) -> float:
+        retry_after = await self.client.eval(TAKE_TOKEN_SCRIPT, 1, self.prefix + key, budget.requests, repr(budget.rate))
+        return float(retry_after.decode() if isinstance(retry_after, bytes) else retry_after)
+
+    async def clear(self) -> None:
+        # The buckets are shared with the other workers; they expire in the store once full again.
+        pass
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend, budgets: dict[str, str]):
+        self.backend = backend
+        self.budgets = {name: Budget.parse(value) for name, value in budgets.items()}
+        self.allowed: dict[str, int] = {}
+        self.limited: dict[str, int] = {}
+
+    async def take(self, budget_name: str, caller: str) -> float:
+        """Charge one request by `caller` to `budget_name`; 0 if allowed, else seconds to wait.
+
+        A budget that is not configured is unlimited."""
+        budget = self.budgets.get(budget_name)
+        if budget is None:
+            return 0.0
+        retry_after = await self.backend.take(f"{budget_name}:{caller}", budget)
+        counts = self.limited if retry_after else self.allowed
+        counts[budget_name] = counts.get(budget_name, 0) + 1
+        return retry_after
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+        self.allowed.clear()
+        self.limited.clear()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            name: {"allowed": self.allowed.get(name, 0), "limited": self.limited.get(name, 0)}
+            for name in self.budgets
+        }
+
+
+@lru_cache()
+def get_rate_limiter() -> RateLimiter:
+    return RateLimiter(MemoryRateLimitBackend(config.RATE_LIMIT_MAX_KEYS), config.RATE_LIMITS)
+
+
+rate_limiter = Lazy(get_rate_limiter)
+
+
+def caller_key(request: Request, token: str | None) -> str:
+    """`user:<email>` for a valid access token, else `ip:<client address>`."""
+    if token:
+        try:
+            # The subject `get_current_user` loads, verified and cached without a database read.
+            return f"user:{get_access_token_subject(token)}"
+        except HTTPException:
+            # The route's own authentication rejects it; until then it counts against the address.
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class RateLimit:
+    """Route dependency that charges each request to the budget `name`.
+
+    Put it in the route decorator's `dependencies`, which FastAPI resolves
+    before the endpoint's own dependencies such as `get_current_user`."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def __call__(self, request: Request, token: Annotated[str | None, Depends(optional_oauth2_scheme)]) -> None:
+        retry_after = await rate_limiter.take(self.name, caller_key(request, token))
+        if retry_after:
+            logger.debug(f"Rate limited {self.name} request")
+            raise HTTPException(
+                status_code=429, detail="Too many requests", headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+
+class InFlightLimit:
+    def __init__(self, max_in_flight: int, retry_after: int):
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.shed = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight, "shed": self.shed}
+
+
+@lru_cache()
+def get_in_flight_limit() -> InFlightLimit:
+    return InFlightLimit(config.MAX_IN_FLIGHT_REQUESTS, config.OVERLOAD_RETRY_AFTER_SECONDS)
+
+
+in_flight_limit = Lazy(get_in_flight_limit)
+
+
+class ConcurrencyLimitMiddleware:
+    """Pure ASGI middleware answering 503 once `limit.max_in_flight` HTTP requests are being handled.
+
+    `exempt_paths` are neither counted nor refused: long-lived streams would
+    otherwise hold a slot each, and metrics must stay readable under load.
+    A `max_in_flight` of 0 disables the limit."""
+
+    def __init__(self, app: ASGIApp, limit: InFlightLimit = in_flight_limit, exempt_paths: tuple[str, ...] = ()):
+        self.app = app
+        self.limit = limit
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limit
+        if scope["type"] != "http" or not limit.max_in_flight or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        if limit.in_flight >= limit.max_in_flight:
+            limit.shed += 1
+            response = JSONResponse(
+                {"detail": "Server is busy, try again later"},
+                status_code=503,
+                headers={"Retry-After": str(limit.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        limit.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.in_flight -= 1
@@ -0,0 +1,54 @@
+"""Routing of read-only queries to read replicas.
+
+Read-only handlers ask `DatabaseRouter.reader` for a database; everything
+else keeps using the primary. Replicas lag behind the primary, so a caller
+that wrote recently (see `record_write`) is sent to the primary for the
+read-your-writes window, and sees its own writes immediately.
+"""
+import itertools
+import time
+from typing import Callable, Hashable
+
+import databases
+
+from api.cache import TTLCache
+
+
+class DatabaseRouter:
+    def __init__(
+        self,
+        primary: databases.Database,
+        replicas: list[databases.Database],
+        read_your_writes_seconds: float,
+        maxsize: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        # Callers past `maxsize` are evicted early and may read a lagging replica.
+        self._recent_writers = TTLCache(maxsize, read_your_writes_seconds, clock)
+        self._next_replica = itertools.cycle(self.replicas)
+        self.reads = {"primary": 0, "replica": 0}
+
+    def record_write(self, key: Hashable) -> None:
+        """Send reads by `key` (the user's email) to the primary for the read-your-writes window."""
+        if self.replicas:
+            self._recent_writers.set(key, True)
+
+    def reader(self, key: Hashable | None = None) -> databases.Database:
+        if not self.replicas or (key is not None and self._recent_writers.get(key)):
+            self.reads["primary"] += 1
+            return self.primary
+        self.reads["replica"] += 1
+        return next(self._next_replica)
+
+    async def connect(self) -> None:
+        for replica in self.replicas:
+            await replica.connect()
+
+    async def disconnect(self) -> None:
+        for replica in self.replicas:
+            await replica.disconnect()
+
+    def stats(self) -> dict[str, int]:
+        return {"replicas": len(self.replicas), **self.reads}
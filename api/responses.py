@@ -0,0 +1,40 @@
+"""A faster JSON response path for endpoints that return lists of rows.
+
+For a route with `response_model=list[Model]`, FastAPI builds a `Model`
+instance per row to validate it and then serializes those instances; for
+large lists that is most of the request's CPU time. `RowsAdapter` checks and
+serializes plain row dicts against a `TypedDict` with the model's fields in
+one `TypeAdapter` call, without creating model instances.
+
+A route opts in by returning a `RowsJSONResponse`. FastAPI sends returned
+responses as they are, so the route's `response_model` then only documents
+the schema; headers set on an injected `Response` must be passed on with
+`RowsJSONResponse(..., headers=response.headers)`.
+"""
+from typing import Any, Iterable, Mapping
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict
+
+
+class RowsAdapter:
+    def __init__(self, model: type[BaseModel]):
+        fields = {name: field.annotation for name, field in model.model_fields.items()}
+        self.row_type = TypedDict(f"{model.__name__}Row", fields)
+        self._adapter = TypeAdapter(list[self.row_type])
+
+    def dump_json(self, rows: Iterable[Mapping[str, Any]]) -> bytes:
+        """Validate `rows` and serialize them as a JSON array; extra keys are left out."""
+        return self._adapter.dump_json(self._adapter.validate_python(rows))
+
+
+class RowsJSONResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, content: bytes, status_code: int = 200, headers: Mapping[str, str] | None = None):
+        super().__init__(content, status_code=status_code, headers=headers)
+
+    @classmethod
+    def from_rows(cls, adapter: RowsAdapter, rows: Iterable[Mapping[str, Any]], **kwargs) -> "RowsJSONResponse":
+        return cls(adapter.dump_json(rows), **kwargs)
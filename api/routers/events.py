@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from api.config import config
+from api.events import SLOW_CONSUMER, EventHub, Subscription, SubscriptionClosed, event_hub
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# WebSocket close code 1013, "try again later".
+TRY_AGAIN_LATER = 1013
+
+
+async def event_stream(hub: EventHub, heartbeat: float) -> AsyncIterator[bytes]:
+    """Server-sent events: one `data:` frame per event, and a comment line when idle to keep proxies from timing out."""
+    # Subscribing here rather than in the endpoint, so a stream that is never started never subscribes.
+    with hub.subscribe() as subscription:
+        # Clients wait this long (ms) before reconnecting after the stream ends.
+        yield b"retry: 1000\n\n"
+        while True:
+            try:
+                event = await subscription.next(heartbeat)
+            except SubscriptionClosed:
+                return
+            yield event.sse if event else b": keepalive\n\n"
+
+
+@router.get("/events")
+async def stream_events():
+    """New posts, comments and like counts as server-sent events, as an alternative to polling /posts."""
+    logger.info("Opening event stream")
+    return StreamingResponse(
+        event_stream(event_hub, config.EVENTS_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws/events")
+async def websocket_events(websocket: WebSocket):
+    """The events of /events over a WebSocket, one JSON text message per event."""
+    await websocket.accept()
+    with event_hub.subscribe() as subscription:
+        # The client sends nothing; receiving is only how a disconnect is noticed.
+        receiver = asyncio.create_task(wait_for_disconnect(websocket, subscription))
+        try:
+            while True:
+                event = await subscription.next()
+                await websocket.send_text(event.message)
+        except SubscriptionClosed as e:
+            if e.reason == SLOW_CONSUMER:
+                await websocket.close(code=TRY_AGAIN_LATER, reason="Too slow to keep up")
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+
+
+async def wait_for_disconnect(websocket: WebSocket, subscription: Subscription) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+    subscription.close()
@@ -0,0 +1,30 @@
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+
+from api.export import ExportTable, export_stream
+from api.models.user import User
+from api.rate_limit import RateLimit
+from api.security import get_current_user
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/export", dependencies=[Depends(RateLimit("export"))])
+async def export(
+    current_user: Annotated[User, Depends(get_current_user)],
+    tables: Annotated[list[ExportTable] | None, Query()] = None,
+    gzip: bool = False,
+):
+    # Every table unless some are asked for.
+    tables = tables or list(ExportTable)
+    logger.info(f"Exporting tables: {[table.value for table in tables]}, gzip: {gzip}")
+    filename = "export.ndjson.gz" if gzip else "export.ndjson"
+    return StreamingResponse(
+        export_stream(tables, gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
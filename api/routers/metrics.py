@@ -0,0 +1,52 @@
+import logging
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from api.database import database, db_router
+from api.events import event_hub
+from api.feed_cache import feed_cache
+from api.logging_conf import dropped_records
+from api.metrics import registry
+from api.rate_limit import in_flight_limit, rate_limiter
+from api.security import cache_stats, password_executor
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@registry.register_collector
+def component_stats():
+    """The `stats()` of caches, executors and pools, read at scrape time."""
+    caches = {**cache_stats(), "feed": feed_cache.stats()}
+    yield "app_cache", "Cache counters and sizes.", [
+        ({"cache": cache, "stat": stat}, value) for cache, stats in caches.items() for stat, value in stats.items()
+    ]
+    yield "app_executor", "Worker pool state.", [
+        ({"executor": "password", "stat": stat}, value) for stat, value in password_executor.stats().items()
+    ]
+    yield "app_db_reads", "Reads routed to the primary and to replicas.", [
+        ({"target": target}, value) for target, value in db_router.stats().items()
+    ]
+    yield "app_events", "Real-time event hub counters and subscriber count.", [
+        ({"stat": stat}, value) for stat, value in event_hub.stats().items()
+    ]
+    yield "app_rate_limit", "Requests allowed and refused by rate limit budget.", [
+        ({"budget": budget, "outcome": outcome}, value)
+        for budget, stats in rate_limiter.stats().items()
+        for outcome, value in stats.items()
+    ]
+    yield "app_in_flight", "Requests being handled against the in-flight limit, and requests shed with 503.", [
+        ({"stat": stat}, value) for stat, value in in_flight_limit.stats().items()
+    ]
+    yield "app_log_records_dropped", "Log records dropped because the logging queue was full.", [
+        ({}, dropped_records())
+    ]
+    yield "app_db_pool", "Connections of the primary's pool.", [
+        ({"stat": stat}, value) for stat, value in database.pool_stats().items()
+    ]
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,34 +1,226 @@
 from enum import Enum
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
 import logging
+from uuid import uuid4
 
-from sqlalchemy import asc, desc, func, select
-from api.models.post import Comment, CommentInput, PostLike, PostLikeIn, UserPost, UserPostInput, UserPostWithComments, UserPostWithLikes
-from api.database import like_table, post_table, comment_table, database
+from sqlalchemy import Integer, and_, asc, bindparam, desc, func, select, union_all
+from api.models.post import BatchItemResult, Comment, CommentBatchInput, CommentInput, PostLike, PostLikeBatchInput, PostLikeIn, PostMedia, UserPost, UserPostBatchInput, UserPostInput, UserPostWithComments, UserPostWithLikes
+import databases
+
+from api.conditional import FEED_VERSION_KEY, evaluate_preconditions, fetch_version
+from api.config import config
+from api.database import like_table, post_table, comment_table, database, db_router, insert_rows
+from api.events import event_hub
+from api.feed_cache import feed_cache
 from api.models.user import User
-from api.security import get_current_user
+from api.responses import RowsAdapter, RowsJSONResponse
+from api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from api.rate_limit import RateLimit
+from api.security import get_current_user, get_read_database
+from api.statements import BoundStatement, Statement
+from api.storage import Storage, get_storage, upload_executor
+from api.thumbnails import create_thumbnails
+from api.timeline import fan_out_posts
+from api.uploads import received_file
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# The list endpoints serialize their rows through these instead of response_model, see api.responses.
+post_rows = RowsAdapter(UserPostWithLikes)
+comment_rows = RowsAdapter(Comment)
+
+MEDIA_CONTENT_TYPES = ("image/",)
+
 class PostSorting(str, Enum):
     new = "new"
     old = "old"
     most_likes = "most_likes"
 
 select_post_with_likes = select(
-        post_table, 
-        func.count(like_table.c.id).label("likes")
-    ).select_from(post_table.outerjoin(like_table)).group_by(post_table.c.id)
+        post_table.c.id,
+        post_table.c.body,
+        post_table.c.user_id,
+        post_table.c.like_count.label("likes"),
+        post_table.c.image_url,
+        post_table.c.thumbnails,
+    )
+
+def posts_page_query(sorting: PostSorting, after_cursor: bool):
+    """One page of the feed, of `:limit` rows, after the cursor position in `:post_id` (and `:likes`).
+
+    Every sorting is ordered by its sort key plus `id` as a tiebreaker, so a
+    cursor is the position of the last row of the previous page and the next
+    page is a range seek instead of an OFFSET over the rows already seen."""
+    limit = bindparam("limit", type_=Integer)
+    query = select_post_with_likes
+    match sorting:
+        case PostSorting.most_likes:
+            if after_cursor:
+                return most_likes_after(limit)
+            query = query.order_by(desc(post_table.c.like_count), desc(post_table.c.id))
+        case PostSorting.new:
+            if after_cursor:
+                query = query.where(post_table.c.id < bindparam("post_id"))
+            query = query.order_by(desc(post_table.c.id))
+        case PostSorting.old:
+            if after_cursor:
+                query = query.where(post_table.c.id > bindparam("post_id"))
+            query = query.order_by(asc(post_table.c.id))
+    return query.limit(limit)
+
+def most_likes_after(limit):
+    """Page of posts ordered after (`:likes`, `:post_id`) in `most_likes` order.
+
+    `(like_count, id) < (likes, post_id)` written as one condition only lets
+    SQLite seek the index on `like_count` and then filter every remaining
+    post with the same count. Splitting it into the rest of the current
+    like count and the posts with fewer likes makes both halves index seeks
+    of at most `limit` rows."""
+    same_likes = (
+        select_post_with_likes
+        .where(post_table.c.like_count == bindparam("likes"), post_table.c.id < bindparam("post_id"))
+        .order_by(desc(post_table.c.id))
+        .limit(limit)
+        .subquery()
+    )
+    fewer_likes = (
+        select_post_with_likes
+        .where(post_table.c.like_count < bindparam("likes"))
+        .order_by(desc(post_table.c.like_count), desc(post_table.c.id))
+        .limit(limit)
+        .subquery()
+    )
+    page = union_all(select(same_likes), select(fewer_likes)).subquery()
+    return select(page).order_by(desc(page.c.likes), desc(page.c.id)).limit(limit)
+
+posts_page_statements = {
+    (sorting, after_cursor): Statement(
+        f"select_posts_{sorting.value}{'_after_cursor' if after_cursor else ''}", posts_page_query(sorting, after_cursor)
+    )
+    for sorting in PostSorting
+    for after_cursor in (False, True)
+}
+
+def build_posts_query(sorting: PostSorting, limit: int, cursor: str | None = None) -> BoundStatement:
+    """One page of the feed, continuing after `cursor` if given."""
+    params = {"limit": limit}
+    if cursor and sorting == PostSorting.most_likes:
+        params["likes"], params["post_id"] = decode_cursor(cursor, sorting.value, 2)
+    elif cursor:
+        (params["post_id"],) = decode_cursor(cursor, sorting.value, 1)
+    return posts_page_statements[sorting, bool(cursor)](**params)
+
+def post_with_comments_query(after_cursor: bool):
+    """The post `:post_id`, its like count and `:limit` of its comments (after `:comment_id`) in a single query.
+
+    Comments are outer joined so a post without (further) comments still
+    returns one row, which doubles as the existence check."""
+    join_on = comment_table.c.post_id == post_table.c.id
+    if after_cursor:
+        join_on = and_(join_on, comment_table.c.id > bindparam("comment_id"))
+    return (
+        select_post_with_likes.add_columns(
+            comment_table.c.id.label("comment_id"),
+            comment_table.c.body.label("comment_body"),
+            comment_table.c.user_id.label("comment_user_id"),
+        )
+        .select_from(post_table.outerjoin(comment_table, join_on))
+        .where(post_table.c.id == bindparam("post_id"))
+        .order_by(asc(comment_table.c.id))
+        .limit(bindparam("limit", type_=Integer))
+    )
+
+post_with_comments_statements = {
+    after_cursor: Statement(
+        f"select_post_with_comments{'_after_cursor' if after_cursor else ''}", post_with_comments_query(after_cursor)
+    )
+    for after_cursor in (False, True)
+}
+
+def build_post_with_comments_query(post_id: int, limit: int, cursor: str | None = None) -> BoundStatement:
+    params = {"post_id": post_id, "limit": limit}
+    if cursor:
+        (params["comment_id"],) = decode_cursor(cursor, "comments", 1)
+    return post_with_comments_statements[bool(cursor)](**params)
+
+select_last_post_id = Statement(
+    "select_last_post_id", select(func.max(post_table.c.id)).where(post_table.c.user_id == bindparam("author"))
+)
+# Rows of a batch just inserted by `author`, to publish them.
+select_posts_after = Statement(
+    "select_posts_after",
+    select(post_table.c.body, post_table.c.user_id, post_table.c.id)
+    .where(post_table.c.user_id == bindparam("author"), post_table.c.id > bindparam("after"))
+    .order_by(post_table.c.id),
+)
+select_last_comment_id = Statement(
+    "select_last_comment_id", select(func.max(comment_table.c.id)).where(comment_table.c.user_id == bindparam("author"))
+)
+select_comments_after = Statement(
+    "select_comments_after",
+    select(comment_table.c.body, comment_table.c.post_id, comment_table.c.user_id, comment_table.c.id)
+    .where(comment_table.c.user_id == bindparam("author"), comment_table.c.id > bindparam("after"))
+    .order_by(comment_table.c.id),
+)
+select_post_by_id = Statement("select_post_by_id", post_table.select().where(post_table.c.id == bindparam("post_id")))
+insert_post = Statement("insert_post", post_table.insert().values(body=bindparam("body"), user_id=bindparam("user_id")))
+set_post_image_url = Statement(
+    "set_post_image_url",
+    post_table.update()
+    .where(post_table.c.id == bindparam("post_id"))
+    .values(image_url=bindparam("url"), thumbnails=None),
+)
+insert_comment = Statement(
+    "insert_comment",
+    comment_table.insert().values(body=bindparam("body"), post_id=bindparam("post_id"), user_id=bindparam("user_id")),
+)
+liked_by_user = (like_table.c.post_id == bindparam("post_id")) & (like_table.c.user_id == bindparam("user_id"))
+select_like_ids = Statement("select_like_ids", select(like_table.c.id).where(liked_by_user))
+insert_like = Statement("insert_like", like_table.insert().values(post_id=bindparam("post_id"), user_id=bindparam("user_id")))
+delete_likes = Statement("delete_likes", like_table.delete().where(liked_by_user))
+select_like_count = Statement(
+    "select_like_count", select(post_table.c.like_count).where(post_table.c.id == bindparam("post_id"))
+)
+add_to_like_count = Statement(
+    "add_to_like_count",
+    post_table.update()
+    .where(post_table.c.id == bindparam("post_id"))
+    .values(like_count=post_table.c.like_count + bindparam("amount", type_=Integer)),
+)
+
+async def fetch_post_with_comments(db: databases.Database, post_id: int, limit: int, cursor: str | None, response: Response):
+    """Return the post and one page of comments, setting the next cursor on `response`."""
+    # One extra row tells us whether there is a next page without a COUNT.
+    query = build_post_with_comments_query(post_id, limit + 1, cursor)
+    logger.debug(query)
+    rows = await db.fetch_all(query)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Post not found")
+    post = {key: rows[0][key] for key in ("id", "body", "user_id", "likes", "image_url", "thumbnails")}
+    comments = [
+        {"id": row["comment_id"], "body": row["comment_body"], "post_id": post_id, "user_id": row["comment_user_id"]}
+        for row in rows
+        if row["comment_id"] is not None
+    ]
+    if len(comments) > limit:
+        comments = comments[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor("comments", comments[-1]["id"])
+    return post, comments
+
+def next_posts_cursor(sorting: PostSorting, post) -> str:
+    if sorting == PostSorting.most_likes:
+        return encode_cursor(sorting.value, post["likes"], post["id"])
+    return encode_cursor(sorting.value, post["id"])
 
 async def find_post(post_id: int) -> UserPost | None:
     logger.info(f"Finding post with id: {post_id}")
-    query = post_table.select().where(post_table.c.id == post_id)
-    logger.info(query)
+    query = select_post_by_id(post_id=post_id)
+    logger.debug(query)
     return await database.fetch_one(query)
 
-@router.post("/comment", response_model=Comment, status_code=201)
+@router.post("/comment", response_model=Comment, status_code=201, dependencies=[Depends(RateLimit("write"))])
 async def create_comment(comment: CommentInput, current_user: Annotated[User, Depends(get_current_user)]):
     logger.info(f"Creating comment for post_id: {comment.post_id}")
     post_id = comment.post_id
@@ -37,63 +229,249 @@ async def create_comment(comment: CommentInput, current_user: Annotated[User, De
         raise HTTPException(status_code=404, detail="Post not found")
     
     data = { **comment.model_dump(), "user_id": current_user.id }
-    query = comment_table.insert().values(data)
+    query = insert_comment(**data)
     logger.debug(query)
     comment_id = await database.execute(query)
-    return {**data, "id": comment_id}
+    db_router.record_write(current_user.email)
+    comment = {**data, "id": comment_id}
+    event_hub.publish_comment(comment)
+    return comment
 
-@router.get("/post/{post_id}/comments", response_model=list[Comment])
-async def get_comments(post_id: int):
+@router.get("/post/{post_id}/comments", response_model=list[Comment], dependencies=[Depends(RateLimit("read"))])
+async def get_comments(
+    post_id: int,
+    request: Request,
+    response: Response,
+    db: Annotated[databases.Database, Depends(get_read_database)],
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+):
     logger.info(f"Getting comments for post_id: {post_id}")
-    post = await find_post(post_id)
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    query = comment_table.select().where(comment_table.c.post_id == post_id)
-    logger.debug(query)
-    return await database.fetch_all(query)
+    not_modified = evaluate_preconditions(request, response, await fetch_version(db, post_id))
+    if not_modified is not None:
+        return not_modified
+    _, comments = await fetch_post_with_comments(db, post_id, limit, cursor, response)
+    return RowsJSONResponse.from_rows(comment_rows, comments, headers=response.headers)
 
-@router.post("/post", response_model=UserPost, status_code=201)
+@router.post("/post", response_model=UserPost, status_code=201, dependencies=[Depends(RateLimit("write"))])
 async def create_post(post: UserPostInput, current_user: Annotated[User, Depends(get_current_user)]):
     logger.info(f"Creating post: {post}")
     data = { **post.model_dump(), "user_id": current_user.id }
-    query = post_table.insert().values(data)
+    query = insert_post(**data)
     logger.debug(query)
-    post_id = await database.execute(query)
-    return {**data, "id": post_id, "likes": 0}
+    async with database.transaction():
+        post_id = await database.execute(query)
+        await database.execute(
+            fan_out_posts(author=current_user.id, after=post_id - 1, max_followers=config.TIMELINE_FANOUT_MAX_FOLLOWERS)
+        )
+    await feed_cache.invalidate()
+    db_router.record_write(current_user.email)
+    created = {**data, "id": post_id, "likes": 0, "image_url": None, "thumbnails": None}
+    event_hub.publish_post(created)
+    return created
 
-@router.get("/post/{post_id}", response_model=UserPostWithComments)
-async def get_post_with_comments(post_id: int):
+@router.get("/post/{post_id}", response_model=UserPostWithComments, dependencies=[Depends(RateLimit("read"))])
+async def get_post_with_comments(
+    post_id: int,
+    request: Request,
+    response: Response,
+    db: Annotated[databases.Database, Depends(get_read_database)],
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+):
     logger.info(f"Getting post with comments for post_id: {post_id}")
-    query = select_post_with_likes.where(post_table.c.id == post_id)
-    logger.debug(query)
-    post = await database.fetch_one(query)
+    not_modified = evaluate_preconditions(request, response, await fetch_version(db, post_id))
+    if not_modified is not None:
+        return not_modified
+    post, comments = await fetch_post_with_comments(db, post_id, limit, cursor, response)
+    return UserPostWithComments(post=post, comments=comments)
+
+@router.post("/post/{post_id}/media", response_model=PostMedia, status_code=201, dependencies=[Depends(RateLimit("write"))])
+async def upload_post_media(
+    post_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[User, Depends(get_current_user)],
+    storage: Annotated[Storage, Depends(get_storage)],
+):
+    """Attach an image to a post: a multipart body with the image in the `file` field.
+
+    Thumbnails are made after the response is sent; until then the post has
+    the image and no thumbnails."""
+    logger.info(f"Uploading media for post_id: {post_id}")
+    post = await find_post(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    comments = await get_comments(post_id)
-    return UserPostWithComments(post=post, comments=comments)
+    if post["user_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Not allowed to change this post")
+    async with received_file(request, "file", config.MEDIA_MAX_BYTES, MEDIA_CONTENT_TYPES) as upload:
+        name = f"posts/{post_id}/{uuid4().hex}{upload.suffix}"
+        image_url = await upload_executor.run(storage.upload, upload.path, name, upload.content_type)
+        await database.execute(set_post_image_url(post_id=post_id, url=image_url))
+        source = await upload.keep()
+    background_tasks.add_task(create_thumbnails, post_id, source, name, image_url, storage)
+    await feed_cache.invalidate()
+    db_router.record_write(current_user.email)
+    return {"post_id": post_id, "image_url": image_url}
 
-@router.get("/posts", response_model=list[UserPostWithLikes])
-async def get_posts(sorting: PostSorting = PostSorting.new):
-    logger.info(f"Getting all posts with sorting: {sorting}")
-    match sorting:
-        case PostSorting.most_likes:
-            order_by = desc("likes")
-        case PostSorting.new:
-            order_by = desc(post_table.c.id)
-        case PostSorting.old:
-            order_by = asc(post_table.c.id)
-    query = select_post_with_likes.order_by(order_by)
-    logger.debug(query)
-    return await database.fetch_all(query)
+@router.get("/posts", response_model=list[UserPostWithLikes], dependencies=[Depends(RateLimit("read"))])
+async def get_posts(
+    request: Request,
+    response: Response,
+    db: Annotated[databases.Database, Depends(get_read_database)],
+    sorting: PostSorting = PostSorting.new,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+):
+    logger.info(f"Getting posts with sorting: {sorting}, limit: {limit}")
+    # Checked before the feed cache, so a current client costs one primary key lookup.
+    version = await fetch_version(db, FEED_VERSION_KEY)
+    not_modified = evaluate_preconditions(request, response, version)
+    if not_modified is not None:
+        return not_modified
+
+    async def load_page() -> dict:
+        # One extra row tells us whether there is a next page without a COUNT.
+        query = build_posts_query(sorting, limit + 1, cursor)
+        logger.debug(query)
+        posts = [dict(post._mapping) for post in await db.fetch_all(query)]
+        next_cursor = None
+        if len(posts) > limit:
+            posts = posts[:limit]
+            next_cursor = next_posts_cursor(sorting, posts[-1])
+        # Cached serialized, so a cache hit returns the body without touching the rows.
+        return {"body": post_rows.dump_json(posts).decode(), "next_cursor": next_cursor}
 
-@router.post("/like", response_model=PostLike, status_code=201)
+    # Pages read from the primary are cached apart from replica pages, so
+    # callers in their read-your-writes window never get a lagging page.
+    # Keyed on the feed version too, so a page cached before a write (or an
+    # import, which does not invalidate the cache) is never sent with a newer ETag.
+    source = "primary" if db is db_router.primary else "replica"
+    page = await feed_cache.get_or_load((version, sorting.value, limit, cursor, source), load_page)
+    if page["next_cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+    return RowsJSONResponse(page["body"].encode(), headers=response.headers)
+
+@router.post("/like", response_model=PostLike, status_code=201, dependencies=[Depends(RateLimit("write"))])
 async def like_post(like: PostLikeIn, current_user: Annotated[User, Depends(get_current_user)]):
     logger.info(f"Liking post with id: {like.post_id}")
     post = await find_post(like.post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     data = { **like.model_dump(), "user_id": current_user.id }
-    query = like_table.insert().values(data)
+    query = insert_like(**data)
     logger.debug(query)
-    like_id = await database.execute(query)
-    return {**data, "id": like_id}
\ No newline at end of file
+    async with database.transaction():
+        existing = await database.fetch_one(select_like_ids(**data))
+        if existing:
+            raise HTTPException(status_code=409, detail="Post already liked")
+        like_id = await database.execute(query)
+        await database.execute(add_to_like_count(post_id=like.post_id, amount=1))
+        likes = await database.fetch_val(select_like_count(post_id=like.post_id))
+    await feed_cache.invalidate()
+    db_router.record_write(current_user.email)
+    event_hub.publish_likes(like.post_id, likes)
+    return {**data, "id": like_id}
+
+@router.delete("/like/{post_id}", status_code=204, dependencies=[Depends(RateLimit("write"))])
+async def unlike_post(post_id: int, current_user: Annotated[User, Depends(get_current_user)]):
+    logger.info(f"Unliking post with id: {post_id}")
+    params = {"post_id": post_id, "user_id": current_user.id}
+    async with database.transaction():
+        likes = await database.fetch_all(select_like_ids(**params))
+        if not likes:
+            raise HTTPException(status_code=404, detail="Like not found")
+        await database.execute(delete_likes(**params))
+        await database.execute(add_to_like_count(post_id=post_id, amount=-len(likes)))
+        like_count = await database.fetch_val(select_like_count(post_id=post_id))
+    await feed_cache.invalidate()
+    db_router.record_write(current_user.email)
+    event_hub.publish_likes(post_id, like_count)
+
+async def find_post_ids(post_ids: set[int]) -> set[int]:
+    """The subset of `post_ids` that exist, in one query."""
+    query = select(post_table.c.id).where(post_table.c.id.in_(post_ids))
+    logger.debug(query)
+    return {row["id"] for row in await database.fetch_all(query)}
+
+# Batch endpoints insert all accepted rows with multi-row INSERTs in one
+# transaction and report a result per input item, in input order.
+
+@router.post("/post/batch", response_model=list[BatchItemResult], dependencies=[Depends(RateLimit("write"))])
+async def create_posts_batch(posts: UserPostBatchInput, current_user: Annotated[User, Depends(get_current_user)]):
+    logger.info(f"Creating {len(posts)} posts")
+    rows = [{**post.model_dump(), "user_id": current_user.id} for post in posts]
+    async with database.transaction():
+        last_post_id = await database.fetch_val(select_last_post_id(author=current_user.id))
+        await insert_rows(post_table, rows)
+        await database.execute(fan_out_posts(
+            author=current_user.id, after=last_post_id or 0, max_followers=config.TIMELINE_FANOUT_MAX_FOLLOWERS
+        ))
+        created = await database.fetch_all(select_posts_after(author=current_user.id, after=last_post_id or 0))
+    await feed_cache.invalidate()
+    db_router.record_write(current_user.email)
+    for post in created:
+        event_hub.publish_post({**post._mapping, "likes": 0, "image_url": None, "thumbnails": None})
+    return [BatchItemResult(index=index, status=201, id=post["id"]) for index, post in enumerate(created)]
+
+@router.post("/comment/batch", response_model=list[BatchItemResult], dependencies=[Depends(RateLimit("write"))])
+async def create_comments_batch(comments: CommentBatchInput, current_user: Annotated[User, Depends(get_current_user)]):
+    logger.info(f"Creating {len(comments)} comments")
+    results, rows, created = [], [], []
+    async with database.transaction():
+        found = await find_post_ids({comment.post_id for comment in comments})
+        for index, comment in enumerate(comments):
+            if comment.post_id not in found:
+                results.append(BatchItemResult(index=index, status=404, detail="Post not found"))
+                continue
+            rows.append({**comment.model_dump(), "user_id": current_user.id})
+            results.append(BatchItemResult(index=index, status=201))
+        if rows:
+            last_comment_id = await database.fetch_val(select_last_comment_id(author=current_user.id))
+            await insert_rows(comment_table, rows)
+            created = await database.fetch_all(select_comments_after(author=current_user.id, after=last_comment_id or 0))
+    # Ids are assigned in insertion order, which is the order of the accepted items.
+    accepted = [result for result in results if result.status == 201]
+    for result, comment in zip(accepted, created, strict=True):
+        result.id = comment["id"]
+    if rows:
+        db_router.record_write(current_user.email)
+        for comment in created:
+            event_hub.publish_comment(dict(comment._mapping))
+    return results
+
+@router.post("/like/batch", response_model=list[BatchItemResult], dependencies=[Depends(RateLimit("write"))])
+async def like_posts_batch(likes: PostLikeBatchInput, current_user: Annotated[User, Depends(get_current_user)]):
+    logger.info(f"Liking {len(likes)} posts")
+    post_ids = {like.post_id for like in likes}
+    results, liked = [], set()
+    async with database.transaction():
+        found = await find_post_ids(post_ids)
+        query = select(like_table.c.post_id).where(
+            like_table.c.user_id == current_user.id, like_table.c.post_id.in_(post_ids)
+        )
+        already_liked = {row["post_id"] for row in await database.fetch_all(query)}
+        for index, like in enumerate(likes):
+            if like.post_id not in found:
+                results.append(BatchItemResult(index=index, status=404, detail="Post not found"))
+            elif like.post_id in already_liked or like.post_id in liked:
+                results.append(BatchItemResult(index=index, status=409, detail="Post already liked"))
+            else:
+                liked.add(like.post_id)
+                results.append(BatchItemResult(index=index, status=201))
+        if liked:
+            await insert_rows(like_table, [{"post_id": post_id, "user_id": current_user.id} for post_id in liked])
+            await database.execute(
+                post_table.update()
+                .where(post_table.c.id.in_(liked))
+                .values(like_count=post_table.c.like_count + 1)
+            )
+            like_counts = await database.fetch_all(
+                select(post_table.c.id, post_table.c.like_count).where(post_table.c.id.in_(liked))
+            )
+    if liked:
+        await feed_cache.invalidate()
+        db_router.record_write(current_user.email)
+        for row in like_counts:
+            event_hub.publish_likes(row["id"], row["like_count"])
+    return results
@@ -0,0 +1,28 @@
+import logging
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query, Response
+
+from api.models.search import SearchKind, SearchResult
+from api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from api.rate_limit import RateLimit
+from api.search import get_search_backend
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/search", response_model=list[SearchResult], dependencies=[Depends(RateLimit("read"))])
+async def search(
+    response: Response,
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    kind: SearchKind | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+):
+    logger.info(f"Searching for {q[:20]}..., kind: {kind}, limit: {limit}")
+    hits = await get_search_backend().search(q, limit + 1, cursor, kind)
+    if len(hits) > limit:
+        hits = hits[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = hits[-1]["cursor"]
+    return hits
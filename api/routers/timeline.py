@@ -0,0 +1,107 @@
+import logging
+from typing import Annotated
+
+import databases
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import Integer, bindparam, select
+
+from api.config import config
+from api.database import database, db_router, follow_table, user_table
+from api.models.post import UserPostWithLikes
+from api.models.user import Follow, FollowIn, User
+from api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, encode_cursor
+from api.rate_limit import RateLimit
+from api.responses import RowsAdapter, RowsJSONResponse
+from api.security import get_current_user, get_read_database, invalidate_user
+from api.statements import Statement
+from api.timeline import (
+    backfill_followers,
+    backfill_timeline,
+    build_timeline_query,
+    remove_from_timeline,
+    select_fan_out_on_read_followees,
+)
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+post_rows = RowsAdapter(UserPostWithLikes)
+
+select_user_by_id = Statement("select_user_by_id", select(user_table).where(user_table.c.id == bindparam("user")))
+follows_user = (follow_table.c.follower_id == bindparam("follower")) & (follow_table.c.followee_id == bindparam("followee"))
+select_follow = Statement("select_follow", select(follow_table.c.id).where(follows_user))
+insert_follow = Statement(
+    "insert_follow",
+    follow_table.insert().values(follower_id=bindparam("follower_id"), followee_id=bindparam("followee_id")),
+)
+delete_follow = Statement("delete_follow", follow_table.delete().where(follows_user))
+add_to_follower_count = Statement(
+    "add_to_follower_count",
+    user_table.update()
+    .where(user_table.c.id == bindparam("user"))
+    .values(follower_count=user_table.c.follower_count + bindparam("amount", type_=Integer)),
+)
+
+@router.post("/follow", response_model=Follow, status_code=201, dependencies=[Depends(RateLimit("write"))])
+async def follow_user(follow: FollowIn, current_user: Annotated[User, Depends(get_current_user)]):
+    logger.info(f"Following user with id: {follow.user_id}")
+    if follow.user_id == current_user.id:
+        raise HTTPException(status_code=400, detail="Users cannot follow themselves")
+    params = {"follower": current_user.id, "followee": follow.user_id}
+    async with database.transaction():
+        followee = await database.fetch_one(select_user_by_id(user=follow.user_id))
+        if not followee:
+            raise HTTPException(status_code=404, detail="User not found")
+        if await database.fetch_one(select_follow(**params)):
+            raise HTTPException(status_code=409, detail="Already following this user")
+        follow_id = await database.execute(insert_follow(follower_id=current_user.id, followee_id=follow.user_id))
+        await database.execute(add_to_follower_count(user=follow.user_id, amount=1))
+        # Recent posts, so the timeline is not empty until the followee posts again.
+        await database.execute(backfill_timeline(
+            follower=current_user.id,
+            author=follow.user_id,
+            limit=config.TIMELINE_BACKFILL_POSTS,
+            max_followers=config.TIMELINE_FANOUT_MAX_FOLLOWERS,
+        ))
+    invalidate_user(followee["email"])
+    db_router.record_write(current_user.email)
+    return {"id": follow_id, "follower_id": current_user.id, "followee_id": follow.user_id}
+
+@router.delete("/follow/{user_id}", status_code=204, dependencies=[Depends(RateLimit("write"))])
+async def unfollow_user(user_id: int, current_user: Annotated[User, Depends(get_current_user)]):
+    logger.info(f"Unfollowing user with id: {user_id}")
+    params = {"follower": current_user.id, "followee": user_id}
+    async with database.transaction():
+        if not await database.fetch_one(select_follow(**params)):
+            raise HTTPException(status_code=404, detail="Not following this user")
+        followee = await database.fetch_one(select_user_by_id(user=user_id))
+        await database.execute(delete_follow(**params))
+        await database.execute(add_to_follower_count(user=user_id, amount=-1))
+        await database.execute(remove_from_timeline(**params))
+        if followee["follower_count"] - 1 == config.TIMELINE_FANOUT_MAX_FOLLOWERS:
+            # Back under the fan-out limit: its followers stop reading its posts from `posts`.
+            await database.execute(backfill_followers(author=user_id, limit=config.TIMELINE_BACKFILL_POSTS))
+    invalidate_user(followee["email"])
+    db_router.record_write(current_user.email)
+
+@router.get("/timeline", response_model=list[UserPostWithLikes], dependencies=[Depends(RateLimit("read"))])
+async def get_timeline(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[databases.Database, Depends(get_read_database)],
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+):
+    logger.info(f"Getting timeline with limit: {limit}")
+    max_followers = config.TIMELINE_FANOUT_MAX_FOLLOWERS
+    pull_from = [
+        row["id"] for row in await db.fetch_all(select_fan_out_on_read_followees(user=current_user.id, max_followers=max_followers))
+    ]
+    # One extra row tells us whether there is a next page without a COUNT.
+    query = build_timeline_query(current_user.id, limit + 1, cursor, pull_from)
+    logger.debug(query)
+    posts = [dict(post._mapping) for post in await db.fetch_all(query)]
+    headers = {}
+    if len(posts) > limit:
+        posts = posts[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor("timeline", posts[-1]["id"])
+    return RowsJSONResponse.from_rows(post_rows, posts, headers=headers)
@@ -1,27 +1,44 @@
 import logging
 from typing import Annotated
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import bindparam
 
 from api import tasks
-from api.database import database, user_table
+from api.database import database, db_router, user_table
 from api.models.user import UserIn
-from api.security import authenticate_user, create_access_token, create_confirmation_token, get_subject_for_token_type, get_user, hash_password
+from api.rate_limit import RateLimit
+from api.statements import Statement
+from api.security import authenticate_user, create_access_token, create_confirmation_token, get_subject_for_token_type, get_user, hash_password_async, invalidate_user
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post("/register", status_code=status.HTTP_201_CREATED)
-async def register(user: UserIn, background_tasks: BackgroundTasks, request: Request):
+insert_user = Statement(
+    "insert_user",
+    user_table.insert().values(email=bindparam("email"), password=bindparam("password"), confirmed=bindparam("confirmed")),
+)
+# Bind parameters in an UPDATE cannot be named after a column of the table.
+confirm_user = Statement(
+    "confirm_user", user_table.update().where(user_table.c.email == bindparam("user_email")).values(confirmed=True)
+)
+
+@router.post("/register", status_code=status.HTTP_201_CREATED, dependencies=[Depends(RateLimit("register"))])
+async def register(user: UserIn, request: Request):
     if await get_user(user.email):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-    query = user_table.insert().values(email=user.email, password=hash_password(user.password), confirmed=False)
+    hashed_password = await hash_password_async(user.password)
+    query = insert_user(email=user.email, password=hashed_password, confirmed=False)
     logger.debug(query)
     await database.execute(query)
-    background_tasks.add_task(tasks.send_confirmation_email, user.email, request.url_for("confirm_email", token=create_confirmation_token(user.email)))
+    db_router.record_write(user.email)
+    # Queued in the database, so the email survives a crash and is retried on failure.
+    await tasks.send_confirmation_email(
+        user.email, confirmation_url=str(request.url_for("confirm_email", token=create_confirmation_token(user.email)))
+    )
     return {"detail": "Please check your email for a confirmation link"}
 
-@router.post("/token")
+@router.post("/token", dependencies=[Depends(RateLimit("login"))])
 async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
     user = await authenticate_user(form_data.username, form_data.password)
     return {"access_token": create_access_token(user.email), "token_type": "bearer"}
@@ -34,7 +51,9 @@ async def confirm_email(token: str):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     if user.confirmed:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already confirmed")
-    query = user_table.update().where(user_table.c.email == email).values(confirmed=True)
+    query = confirm_user(user_email=email)
     logger.debug(query)
     await database.execute(query)
+    db_router.record_write(email)
+    invalidate_user(email)
     return {"detail": "User confirmed successfully"}
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""Full-text search over post and comment bodies.
+
+`SearchBackend` is the interface the `/search` endpoint uses. On SQLite it
+is FTS5: posts and comments share one FTS5 table whose rowid encodes both
+the kind and the id (`id * 2` for posts, `id * 2 + 1` for comments), so
+ranks are comparable across kinds and every index update is a rowid lookup.
+Triggers on `posts` and `comments` keep the index in sync with every write
+path, including the batch endpoints and the importer. Other databases get
+`LikeSearchBackend`, an unranked ILIKE scan of the tables that needs no index.
+
+    python -m api.search --rebuild
+"""
+import argparse
+import logging
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from sqlalchemy import Connection, and_, select, text, union_all
+
+from api.database import comment_table, database, post_table
+from api.models.search import SearchKind
+from api.pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+_KIND_PARITY = {SearchKind.post: 0, SearchKind.comment: 1}
+_TERM = re.compile(r"\w+\*?")
+# bm25 scores are floats; cursors carry them scaled and rounded to an integer,
+# and pages are ordered by that same value, so ties are exact comparisons.
+_RANK = "CAST(round(bm25(search_index) * 1000000) AS INTEGER)"
+
+
+def to_match_expression(query: str) -> str:
+    """Turn user input into an FTS5 query of AND-ed terms.
+
+    Every term is quoted so FTS5 operators in the input are matched as plain
+    text; a trailing `*` makes the term a prefix query (`prog*`)."""
+    terms = []
+    for term in _TERM.findall(query):
+        prefix = term.endswith("*")
+        terms.append(f'"{term.rstrip("*")}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class SearchBackend(ABC):
+    @abstractmethod
+    def install(self, conn: Connection) -> None:
+        """Create the index and whatever keeps it in sync with the tables."""
+
+    @abstractmethod
+    def rebuild(self, conn: Connection) -> None:
+        """Repopulate the index from the `posts` and `comments` tables."""
+
+    @abstractmethod
+    async def search(self, query: str, limit: int, cursor: str | None = None, kind: SearchKind | None = None) -> list[dict]:
+        """Best matches first, continuing after `cursor`; each hit has a `cursor` of its own."""
+
+
+class SQLiteFTS5SearchBackend(SearchBackend):
+    DDL = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(body, post_id UNINDEXED, prefix='2 3')",
+        """CREATE TRIGGER IF NOT EXISTS posts_search_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO search_index (rowid, body, post_id) VALUES (new.id * 2, new.body, new.id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS posts_search_update AFTER UPDATE OF body ON posts BEGIN
+            UPDATE search_index SET body = new.body WHERE rowid = new.id * 2;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS posts_search_delete AFTER DELETE ON posts BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS comments_search_insert AFTER INSERT ON comments BEGIN
+            INSERT INTO search_index (rowid, body, post_id) VALUES (new.id * 2 + 1, new.body, new.post_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS comments_search_update AFTER UPDATE OF body ON comments BEGIN
+            UPDATE search_index SET body = new.body WHERE rowid = new.id * 2 + 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS comments_search_delete AFTER DELETE ON comments BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        END""",
+    ]
+
+    def install(self, conn: Connection) -> None:
+        for statement in self.DDL:
+            conn.execute(text(statement))
+
+    def rebuild(self, conn: Connection) -> None:
+        conn.execute(text("DELETE FROM search_index"))
+        conn.execute(text("INSERT INTO search_index (rowid, body, post_id) SELECT id * 2, body, id FROM posts"))
+        conn.execute(text("INSERT INTO search_index (rowid, body, post_id) SELECT id * 2 + 1, body, post_id FROM comments"))
+        conn.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+
+    @staticmethod
+    def build_query(match: str, limit: int, cursor: str | None = None, kind: SearchKind | None = None) -> tuple[str, dict]:
+        """Rank by bm25 (lower is better) with rowid as the tiebreaker, so a
+        cursor is the (rank, rowid) of the last hit of the previous page."""
+        sql = (
+            f"SELECT rowid AS row_id, body, post_id, {_RANK} AS rank "
+            "FROM search_index WHERE search_index MATCH :match"
+        )
+        values = {"match": match, "limit": limit}
+        if kind is not None:
+            sql += " AND (rowid & 1) = :parity"
+            values["parity"] = _KIND_PARITY[kind]
+        if cursor:
+            rank, row_id = decode_cursor(cursor, "search", 2)
+            sql += f" AND ({_RANK} > :rank OR ({_RANK} = :rank AND rowid > :row_id))"
+            values.update(rank=rank, row_id=row_id)
+        sql += " ORDER BY rank, row_id LIMIT :limit"
+        return sql, values
+
+    async def search(self, query: str, limit: int, cursor: str | None = None, kind: SearchKind | None = None) -> list[dict]:
+        match = to_match_expression(query)
+        if not match:
+            return []
+        sql, values = self.build_query(match, limit, cursor, kind)
+        logger.debug(sql)
+        rows = await database.fetch_all(sql, values)
+        return [
+            {
+                "kind": SearchKind.comment if row["row_id"] % 2 else SearchKind.post,
+                "id": row["row_id"] // 2,
+                "post_id": row["post_id"],
+                "body": row["body"],
+                "cursor": encode_cursor("search", row["rank"], row["row_id"]),
+            }
+            for row in rows
+        ]
+
+
+class LikeSearchBackend(SearchBackend):
+    """Case-insensitive substring match of every term, newest first.
+
+    Works on any database but scans the tables, and has no notion of
+    relevance; a trailing `*` changes nothing since every term is matched
+    anywhere in a word."""
+
+    def install(self, conn: Connection) -> None:
+        pass
+
+    def rebuild(self, conn: Connection) -> None:
+        pass
+
+    @staticmethod
+    def build_query(terms: list[str], limit: int, cursor: str | None = None, kind: SearchKind | None = None):
+        """Posts and comments keyed by the same row_id as the FTS5 index, so a
+        cursor is the row_id of the last hit of the previous page."""
+        selects = []
+        if kind in (None, SearchKind.post):
+            selects.append(
+                select((post_table.c.id * 2).label("row_id"), post_table.c.body, post_table.c.id.label("post_id"))
+                .where(and_(*(post_table.c.body.icontains(term, autoescape=True) for term in terms)))
+            )
+        if kind in (None, SearchKind.comment):
+            selects.append(
+                select((comment_table.c.id * 2 + 1).label("row_id"), comment_table.c.body, comment_table.c.post_id)
+                .where(and_(*(comment_table.c.body.icontains(term, autoescape=True) for term in terms)))
+            )
+        hits = union_all(*selects).subquery()
+        query = select(hits).order_by(hits.c.row_id.desc()).limit(limit)
+        if cursor:
+            (row_id,) = decode_cursor(cursor, "search", 1)
+            query = query.where(hits.c.row_id < row_id)
+        return query
+
+    async def search(self, query: str, limit: int, cursor: str | None = None, kind: SearchKind | None = None) -> list[dict]:
+        terms = [term.rstrip("*") for term in _TERM.findall(query)]
+        if not terms:
+            return []
+        rows = await database.fetch_all(self.build_query(terms, limit, cursor, kind))
+        return [
+            {
+                "kind": SearchKind.comment if row["row_id"] % 2 else SearchKind.post,
+                "id": row["row_id"] // 2,
+                "post_id": row["post_id"],
+                "body": row["body"],
+                "cursor": encode_cursor("search", row["row_id"]),
+            }
+            for row in rows
+        ]
+
+
+def search_backend_for(dialect: str) -> SearchBackend:
+    if dialect == "sqlite":
+        return SQLiteFTS5SearchBackend()
+    return LikeSearchBackend()
+
+
+@lru_cache()
+def get_search_backend() -> SearchBackend:
+    """The backend for the configured database, chosen on first use."""
+    return search_backend_for(database.url.dialect)
+
+
+if __name__ == "__main__":
+    from api.database import get_engine
+
+    parser = argparse.ArgumentParser(description="Manage the full-text search index.")
+    parser.add_argument("--rebuild", action="store_true", help="repopulate the index from posts and comments")
+    args = parser.parse_args()
+    if args.rebuild:
+        with get_engine().begin() as conn:
+            search_backend_for(conn.dialect.name).rebuild(conn)
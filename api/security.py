@@ -1,25 +1,58 @@
 from datetime import datetime, timedelta
+import hashlib
 import logging
+import time
+from functools import lru_cache
 from typing import Annotated, Literal
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 from passlib.context import CryptContext
 from jose import ExpiredSignatureError, JWTError, jwt
+import databases
 
-from api.database import database, user_table
-from api.config import get_config
+from api.cache import TTLCache
+from api.database import db_router, user_table
+from api.config import Lazy, config, get_config
 from api.models.user import User
+from api.statements import Statement
+from api.workers import BoundedExecutor
 
 logger = logging.getLogger(__name__)
 
 ALGORITHM = "HS256"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# For public endpoints that only use the caller's identity when there is one.
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 pwd_context = CryptContext(schemes=["bcrypt"])
 
+# bcrypt is deliberately slow; running it inline would stall the event loop.
+@lru_cache()
+def get_password_executor() -> BoundedExecutor:
+    return BoundedExecutor(config.PASSWORD_HASH_EXECUTOR, config.PASSWORD_HASH_WORKERS, name="password")
+
+
+# Subjects of verified access tokens, keyed by token hash and never kept past the token's `exp`.
+@lru_cache()
+def get_token_cache() -> TTLCache:
+    return TTLCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL_SECONDS)
+
+
+# User rows for authenticated requests, keyed by email (the token subject).
+@lru_cache()
+def get_user_cache() -> TTLCache:
+    return TTLCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL_SECONDS)
+
+
+password_executor = Lazy(get_password_executor)
+token_cache = Lazy(get_token_cache)
+user_cache = Lazy(get_user_cache)
+
+select_user_by_email = Statement("select_user_by_email", select(user_table).where(user_table.c.email == bindparam("email")))
+
 def access_token_expires_minutes() -> int:
     return 30
 
@@ -49,7 +82,7 @@ def create_confirmation_token(email: str) -> str:
     encoded_jwt = jwt.encode(jwt_data, key=get_config().SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_subject_for_token_type(token: str, token_type: Literal["access", "confirm"]) -> str:
+def decode_token(token: str, token_type: Literal["access", "confirm"]) -> dict:
     try:
         payload = jwt.decode(token, key=get_config().SECRET_KEY, algorithms=[ALGORITHM])
     except ExpiredSignatureError as e:
@@ -62,6 +95,19 @@ def get_subject_for_token_type(token: str, token_type: Literal["access", "confir
         raise HTTPException(status_code=401, detail=f"Invalid token type, expected {token_type}", headers={"WWW-Authenticate": "Bearer"})
     if email is None:
         raise HTTPException(status_code=401, detail="Token subject is missing", headers={"WWW-Authenticate": "Bearer"})
+    return payload
+
+def get_subject_for_token_type(token: str, token_type: Literal["access", "confirm"]) -> str:
+    return decode_token(token, token_type)["sub"]
+
+def get_access_token_subject(token: str) -> str:
+    """Like `get_subject_for_token_type(token, "access")`, but cached until the token expires."""
+    key = hashlib.sha256(token.encode()).hexdigest()
+    email = token_cache.get(key)
+    if email is None:
+        payload = decode_token(token, "access")
+        email = payload["sub"]
+        token_cache.set(key, email, ttl=payload["exp"] - time.time())
     return email
 
 def hash_password(password: str) -> str:
@@ -70,12 +116,18 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed_password: str) -> bool:
     return pwd_context.verify(password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    return await password_executor.run(hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    return await password_executor.run(verify_password, password, hashed_password)
+
 async def authenticate_user(email: str, password: str) -> User:
     logger.debug("Authenticating user", extra={"email": email})
     user = await get_user(email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials", headers={"WWW-Authenticate": "Bearer"})
-    if not verify_password(password, user.password):
+    if not await verify_password_async(password, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials", headers={"WWW-Authenticate": "Bearer"})
     if not user.confirmed:
         raise HTTPException(status_code=401, detail="User not confirmed", headers={"WWW-Authenticate": "Bearer"})
@@ -83,15 +135,35 @@ async def authenticate_user(email: str, password: str) -> User:
 
 async def get_user(email: str):
     logger.debug("Getting user from database", extra={"email": email})
-    query = select(user_table).where(user_table.c.email == email)
+    query = select_user_by_email(email=email)
     logger.debug(query)
-    result = await database.fetch_one(query)
+    result = await db_router.reader(email).fetch_one(query)
     if result:
         return result
     
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
-    email = get_subject_for_token_type(token, "access")
-    user = await get_user(email)
+    email = get_access_token_subject(token)
+    user = user_cache.get(email)
     if user is None:
-        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+        user = await get_user(email)
+        if user is None:
+            raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+        user_cache.set(email, user)
     return user
+
+async def get_read_database(token: Annotated[str | None, Depends(optional_oauth2_scheme)]) -> databases.Database:
+    """Database for read-only handlers: a replica, unless the caller wrote within the read-your-writes window."""
+    email = None
+    if token:
+        try:
+            email = get_access_token_subject(token)
+        except HTTPException:
+            pass
+    return db_router.reader(email)
+
+def invalidate_user(email: str) -> None:
+    """Drop the cached row of a user; call after every change to the `users` row."""
+    user_cache.pop(email)
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {"user": user_cache.stats(), "token": token_cache.stats()}
@@ -0,0 +1,210 @@
+"""A pooled SQLite backend for `databases`.
+
+The stock SQLite backend opens a new aiosqlite connection (and with it a new
+thread) for every query and applies no pragmas, so every connection runs in
+rollback-journal mode where a writer blocks all readers. This backend keeps
+up to `max_size` connections open, recycles them after `max_lifetime`
+seconds, and runs the configured pragmas (WAL, synchronous, busy_timeout)
+once per connection when it is opened.
+
+Root transactions start with BEGIN IMMEDIATE. A deferred transaction that
+reads and then writes (like `like_post`) fails with "database is locked"
+straight away when another writer got there first, because SQLite cannot
+wait for the lock without risking a deadlock; taking the write lock up front
+lets it wait up to busy_timeout instead.
+
+Statements from `api.statements` are executed from their cached compilation
+instead of being compiled again for every execution.
+"""
+import asyncio
+import logging
+import time
+import typing
+
+import aiosqlite
+import databases
+from databases.backends.common.records import Record
+from databases.backends.sqlite import CompilationContext, SQLiteBackend, SQLiteConnection, SQLitePool, SQLiteTransaction
+from databases.core import LOG_EXTRA, DatabaseURL
+from sqlalchemy.sql import ClauseElement
+
+from api.statements import BoundStatement
+
+logger = logging.getLogger("databases")
+
+
+class PooledSQLitePool(SQLitePool):
+    def __init__(
+        self,
+        url: DatabaseURL,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_lifetime: float | None = None,
+        pragmas: dict[str, typing.Any] | None = None,
+        **options: typing.Any,
+    ) -> None:
+        super().__init__(url, **options)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.pragmas = pragmas or {}
+        self._idle: list[aiosqlite.Connection] = []
+        self._opened_at: dict[aiosqlite.Connection, float] = {}
+        self._slots: asyncio.Semaphore | None = None
+
+    async def open(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_size)
+        while len(self._idle) < self.min_size:
+            self._idle.append(await self._connect())
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await self._close(connection)
+        self._slots = None
+
+    async def acquire(self) -> aiosqlite.Connection:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                connection = self._idle.pop()
+                if not self._expired(connection):
+                    return connection
+                await self._close(connection)
+            return await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, connection: aiosqlite.Connection) -> None:
+        try:
+            # A connection left inside a transaction (e.g. by a cancelled
+            # request) would leak that transaction into the next request.
+            if self._expired(connection) or connection.in_transaction or self._slots is None:
+                await self._close(connection)
+            else:
+                self._idle.append(connection)
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def stats(self) -> dict:
+        return {"max_size": self.max_size, "open": len(self._opened_at), "idle": len(self._idle)}
+
+    def _expired(self, connection: aiosqlite.Connection) -> bool:
+        if self.max_lifetime is None:
+            return False
+        return time.monotonic() - self._opened_at.get(connection, 0.0) > self.max_lifetime
+
+    async def _connect(self) -> aiosqlite.Connection:
+        connection = await super().acquire()
+        for name, value in self.pragmas.items():
+            await connection.execute(f"PRAGMA {name} = {value}")
+        self._opened_at[connection] = time.monotonic()
+        return connection
+
+    async def _close(self, connection: aiosqlite.Connection) -> None:
+        self._opened_at.pop(connection, None)
+        await super().release(connection)
+
+
+class ImmediateSQLiteTransaction(SQLiteTransaction):
+    async def start(self, is_root: bool, extra_options: dict[typing.Any, typing.Any]) -> None:
+        if not is_root:
+            return await super().start(is_root, extra_options)
+        self._is_root = True
+        async with self._connection._connection.execute("BEGIN IMMEDIATE") as cursor:
+            await cursor.close()
+
+
+class PooledSQLiteConnection(SQLiteConnection):
+    def transaction(self) -> ImmediateSQLiteTransaction:
+        return ImmediateSQLiteTransaction(self)
+
+    def _compile(self, query: ClauseElement | BoundStatement) -> tuple:
+        if not isinstance(query, BoundStatement):
+            return super()._compile(query)
+        compiled = query.statement.compiled(self._dialect)
+        if compiled is None:
+            return super()._compile(query.clause())
+        # What SQLiteConnection._compile does after compiling, minus the SQL
+        # rendering it does for its debug log whether or not that is enabled.
+        execution_context = self._dialect.execution_ctx_cls()
+        execution_context.dialect = self._dialect
+        execution_context.result_column_struct = (
+            compiled._result_columns,
+            compiled._ordered_columns,
+            compiled._textual_ordered_columns,
+            compiled._ad_hoc_textual,
+            compiled._loose_column_name_matching,
+        )
+        params = compiled.construct_params(query.params)
+        processors = compiled._bind_processors
+        args = [processors[key](params[key]) if key in processors else params[key] for key in compiled.positiontup]
+        logger.debug("Query: %s Args: %s", query, args, extra=LOG_EXTRA)
+        return compiled.string, args, compiled._result_columns, CompilationContext(execution_context)
+
+
+class PooledSQLiteBackend(SQLiteBackend):
+    def __init__(
+        self,
+        database_url: DatabaseURL | str,
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_lifetime: float | None = None,
+        pragmas: dict[str, typing.Any] | None = None,
+        **options: typing.Any,
+    ) -> None:
+        super().__init__(database_url, **options)
+        self._pool = PooledSQLitePool(self._database_url, min_size, max_size, max_lifetime, pragmas, **options)
+
+    async def connect(self) -> None:
+        await self._pool.open()
+
+    async def disconnect(self) -> None:
+        await super().disconnect()
+        await self._pool.close()
+
+    def connection(self) -> PooledSQLiteConnection:
+        return PooledSQLiteConnection(self._pool, self._dialect)
+
+
+class Database(databases.Database):
+    """`databases.Database` with SQLite URLs served by `PooledSQLiteBackend`.
+
+    Accepts `BoundStatement`s on every backend; those other than the pooled
+    SQLite backend get them as plain SQLAlchemy expressions."""
+
+    SUPPORTED_BACKENDS = {
+        **databases.Database.SUPPORTED_BACKENDS,
+        "sqlite": "api.sqlite_pool:PooledSQLiteBackend",
+    }
+
+    def _statement(self, query):
+        if isinstance(query, BoundStatement) and not isinstance(self._backend, PooledSQLiteBackend):
+            return query.clause()
+        return query
+
+    async def fetch_all(self, query, values=None) -> list[Record]:
+        return await super().fetch_all(self._statement(query), values)
+
+    async def fetch_one(self, query, values=None) -> Record | None:
+        return await super().fetch_one(self._statement(query), values)
+
+    async def fetch_val(self, query, values=None, column=0):
+        return await super().fetch_val(self._statement(query), values, column)
+
+    async def execute(self, query, values=None):
+        return await super().execute(self._statement(query), values)
+
+    async def iterate(self, query, values=None):
+        async for record in super().iterate(self._statement(query), values):
+            yield record
+
+    def pool_stats(self) -> dict[str, int]:
+        """Open and idle connections of the pooled SQLite backend; empty for other backends."""
+        pool = getattr(self._backend, "_pool", None)
+        return pool.stats() if isinstance(pool, PooledSQLitePool) else {}
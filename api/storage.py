@@ -0,0 +1,100 @@
+"""Where uploaded media ends up: a B2 bucket, or a local directory in development and tests.
+
+Backends are blocking and are called through `upload_executor`, never on the
+event loop. `get_storage` picks B2 when its credentials are configured, and
+the app serves a local directory itself, see `mount_local_media`."""
+import logging
+import shutil
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
+
+from api.config import Lazy, config
+from api.workers import BoundedExecutor
+
+if TYPE_CHECKING:
+    from b2sdk.v2 import Bucket
+
+logger = logging.getLogger(__name__)
+
+# Uploads spend their time waiting on the network, so threads are enough.
+@lru_cache()
+def get_upload_executor() -> BoundedExecutor:
+    return BoundedExecutor("thread", config.UPLOAD_WORKERS, name="upload")
+
+
+upload_executor = Lazy(get_upload_executor)
+
+
+class Storage(ABC):
+    @abstractmethod
+    def upload(self, path: Path, name: str, content_type: str) -> str:
+        """Store the file at `path` under `name` and return its public URL."""
+
+
+class LocalStorage(Storage):
+    """Files under `root`, served from `base_url`."""
+
+    def __init__(self, root: Path, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def upload(self, path: Path, name: str, content_type: str) -> str:
+        target = self.root / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+        return f"{self.base_url}/{name}"
+
+
+class B2Storage(Storage):
+    """A Backblaze B2 bucket.
+
+    Files larger than the part size the account recommends (100 MB) go
+    through the large file API: b2sdk reads them from disk in parts and
+    uploads the parts in parallel, so a big upload never has to fit in one
+    request or in memory."""
+
+    def __init__(self, key_id: str, application_key: str, bucket_name: str):
+        self.key_id = key_id
+        self.application_key = application_key
+        self.bucket_name = bucket_name
+        self._bucket: "Bucket | None" = None
+
+    @property
+    def bucket(self) -> "Bucket":
+        # b2sdk is imported and authorized on the first upload; both are slow.
+        if self._bucket is None:
+            from b2sdk.v2 import B2Api, InMemoryAccountInfo
+
+            api = B2Api(InMemoryAccountInfo())
+            api.authorize_account("production", self.key_id, self.application_key)
+            self._bucket = api.get_bucket_by_name(self.bucket_name)
+        return self._bucket
+
+    def upload(self, path: Path, name: str, content_type: str) -> str:
+        logger.debug(f"Uploading {name} to bucket {self.bucket_name}")
+        self.bucket.upload_local_file(local_file=str(path), file_name=name, content_type=content_type)
+        return self.bucket.api.get_download_url_for_file_name(self.bucket_name, name)
+
+
+@lru_cache()
+def get_storage() -> Storage:
+    if config.B2_KEY_ID and config.B2_APPLICATION_KEY and config.B2_BUCKET_NAME:
+        return B2Storage(config.B2_KEY_ID, config.B2_APPLICATION_KEY, config.B2_BUCKET_NAME)
+    return LocalStorage(Path(config.MEDIA_ROOT), config.MEDIA_BASE_URL)
+
+
+def mount_local_media(app: FastAPI, storage: Storage) -> None:
+    """Serve the files of a LocalStorage at its base URL, if that is a path on this app.
+
+    A base URL on another host, such as a CDN in front of the directory, is
+    left to whatever serves it there."""
+    if not isinstance(storage, LocalStorage) or not storage.base_url.startswith("/"):
+        return
+    if any(getattr(route, "name", None) == "media" for route in app.routes):
+        return
+    app.mount(storage.base_url, StaticFiles(directory=storage.root, check_dir=False), name="media")
@@ -1,28 +1,86 @@
+import json
 import logging
+import time
+from typing import TYPE_CHECKING
 
-import httpx
+from api.config import config
+from api.database import database, outbound_email_table
 
-from api.config import get_config
+if TYPE_CHECKING:
+    import httpx
 
 logger = logging.getLogger(__name__)
 
+_http_client: "httpx.AsyncClient | None" = None
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Shared client so every email reuses pooled connections instead of a new TCP+TLS handshake."""
+    # httpx is imported on first send; it is a large share of the app's import time.
+    import httpx
+
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        concurrency = config.MAIL_QUEUE_CONCURRENCY
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+async def send_batch(to: list[str], subject: str, body: str):
+    """Send one message to many recipients with a single Mailgun API call.
+
+    Passing `recipient-variables` makes Mailgun deliver a separate message to
+    each recipient instead of one message listing all of them in `To`."""
+    import httpx
+
+    logger.info(f"Sending email to {len(to)} recipients with subject {subject[:20]}... and body {body[:20]}...")
+    try:
+        response = await get_http_client().post(
+            f"{config.MAILGUN_BASE_URL}/v3/{config.MAILGUN_DOMAIN}/messages",
+            auth=("api", config.MAILGUN_API_KEY),
+            data={
+                "from": f"Max Petrov <mailgun@{config.MAILGUN_DOMAIN}>",
+                "to": to,
+                "subject": subject,
+                "text": body,
+                "recipient-variables": json.dumps({recipient: {} for recipient in to}),
+            },
+        )
+        response.raise_for_status()
+        logger.debug(response.content)
+        return response
+    except httpx.HTTPStatusError as e:
+        raise Exception(f"Error sending email to {len(to)} recipients: {e}") from e
+
 async def send_email(to: str, subject: str, body: str):
     logger.info(f"Sending email to {to[:4]}... with subject {subject[:20]}... and body {body[:20]}...")
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"https://api.mailgun.net/v3/{get_config().MAILGUN_DOMAIN}/messages",
-                auth=("api", get_config().MAILGUN_API_KEY),
-                data={"from": f"Max Petrov <mailgun@{get_config().MAILGUN_DOMAIN}>", "to": [to], "subject": subject, "text": body}
-            )
-            response.raise_for_status()
-            logger.debug(response.content)
-            return response
-        except httpx.HTTPStatusError as e:
-            raise Exception(f"Error sending email to {to}: {e}") from e
-        
+    try:
+        return await send_batch([to], subject, body)
+    except Exception as e:
+        raise Exception(f"Error sending email to {to}: {e.__cause__ or e}") from e
+
+async def enqueue_email(to: str, subject: str, body: str) -> int:
+    """Persist an email for the mail queue worker (see api.mail_queue) to deliver."""
+    logger.debug(f"Queueing email to {to[:4]}... with subject {subject[:20]}...")
+    now = time.time()
+    query = outbound_email_table.insert().values(
+        recipient=to, subject=subject, body=body, status="pending", attempts=0, next_attempt_at=now, created_at=now
+    )
+    email_id = await database.execute(query)
+    # Imported here because the worker module imports this one.
+    from api.mail_queue import mail_worker
+
+    mail_worker.wake()
+    return email_id
+
 async def send_confirmation_email(to: str, confirmation_url: str):
     subject = "Confirm your email"
     body = f"Please click the link to confirm your email: {confirmation_url}"
-    await send_email(to, subject, body)
-        
\ No newline at end of file
+    return await enqueue_email(to, subject, body)
@@ -0,0 +1,98 @@
+"""Thumbnails of post images, generated after the upload has been answered.
+
+`create_thumbnails` runs as a background task of the upload request. The
+resizing is CPU-bound, so `render_thumbnails` runs in `thumbnail_executor`,
+a process pool: in a thread it would hold the GIL for most of its run and
+stall the event loop. The files it writes are uploaded to storage like the
+original, and their sizes and URLs are recorded on the post as JSON in
+`posts.thumbnails`.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path, PurePosixPath
+
+import aiofiles.os
+from sqlalchemy import bindparam
+
+from api.config import Lazy, config
+from api.database import database, post_table
+from api.feed_cache import feed_cache
+from api.statements import Statement
+from api.storage import Storage, upload_executor
+from api.workers import BoundedExecutor
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache()
+def get_thumbnail_executor() -> BoundedExecutor:
+    return BoundedExecutor("process", config.THUMBNAIL_WORKERS, name="thumbnail")
+
+
+thumbnail_executor = Lazy(get_thumbnail_executor)
+
+# Only if the image has not been replaced since, so a slow job cannot attach stale thumbnails.
+set_post_thumbnails = Statement(
+    "set_post_thumbnails",
+    post_table.update()
+    .where(post_table.c.id == bindparam("post_id"), post_table.c.image_url == bindparam("url"))
+    .values(thumbnails=bindparam("thumbnails_json")),
+)
+
+
+def render_thumbnails(source: str, target_dir: str, sizes: list[int]) -> list[dict]:
+    """Write a JPEG of `source` per size, fitting in a square of that size, and return their metadata.
+
+    Runs in a worker process. Each size is shrunk from the previous, larger
+    one rather than from the full image. JPEG sources are decoded at the
+    smallest scale that still covers the largest size; `Image.thumbnail`
+    would do that itself, but `exif_transpose` has loaded the image by then."""
+    from PIL import Image, ImageOps
+
+    thumbnails = []
+    with Image.open(source) as image:
+        # The largest thumbnail's dimensions, which the reduced decode must cover.
+        scale = min(1.0, max(sizes) / max(image.size))
+        image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size))
+            path = os.path.join(target_dir, f"{size}.jpg")
+            image.save(path, "JPEG", quality=85)
+            thumbnails.append({"size": size, "width": image.width, "height": image.height, "path": path})
+    return sorted(thumbnails, key=lambda thumbnail: thumbnail["size"])
+
+
+async def create_thumbnails(post_id: int, source: Path, name: str, image_url: str, storage: Storage) -> None:
+    """Thumbnail the image `source`, stored as `name` at `image_url`, and record them on the post.
+
+    Deletes `source` when done. Failures are logged; the post keeps its
+    image without thumbnails."""
+    stem = PurePosixPath(name).with_suffix("")
+    try:
+        with tempfile.TemporaryDirectory(prefix="thumbnails-") as target_dir:
+            rendered = await thumbnail_executor.run(render_thumbnails, str(source), target_dir, config.THUMBNAIL_SIZES)
+            urls = await asyncio.gather(*(
+                upload_executor.run(storage.upload, Path(thumbnail["path"]), f"{stem}_{thumbnail['size']}.jpg", "image/jpeg")
+                for thumbnail in rendered
+            ))
+        thumbnails = [
+            {"size": thumbnail["size"], "width": thumbnail["width"], "height": thumbnail["height"], "url": url}
+            for thumbnail, url in zip(rendered, urls, strict=True)
+        ]
+        await database.execute(
+            set_post_thumbnails(post_id=post_id, url=image_url, thumbnails_json=json.dumps(thumbnails))
+        )
+        await feed_cache.invalidate()
+        logger.debug(f"Created {len(thumbnails)} thumbnails for post {post_id}")
+    except Exception:
+        logger.exception(f"Creating thumbnails for post {post_id} failed")
+    finally:
+        await aiofiles.os.remove(source)
@@ -0,0 +1,141 @@
+"""Per-user timelines: the posts of the users someone follows, newest first.
+
+Posts are fanned out on write: `fan_out_posts` copies a new post into the
+inbox (`timeline_entries`) of every follower of its author, so a timeline
+page is one range scan of the inbox index. An author with more than
+TIMELINE_FANOUT_MAX_FOLLOWERS followers would make every post insert that
+many rows, so their posts are not fanned out. Instead, `build_timeline_query`
+reads them from `posts` when the timeline is read (fan-out on read) and
+merges them into the inbox page.
+
+Both paths go by the author's current follower count. Posts an author made
+below the threshold stay in the inboxes after they cross it (the merge drops
+the duplicates). When they drop back below it, `backfill_followers` copies
+their recent posts into the inboxes of their followers.
+"""
+from sqlalchemy import Integer, bindparam, desc, exists, select, union
+
+from api.database import follow_table, post_table, timeline_table, user_table
+from api.pagination import decode_cursor
+from api.statements import Statement
+
+TIMELINE_COLUMNS = ["user_id", "post_id", "author_id"]
+
+post_columns = (
+    post_table.c.id,
+    post_table.c.body,
+    post_table.c.user_id,
+    post_table.c.like_count.label("likes"),
+    post_table.c.image_url,
+    post_table.c.thumbnails,
+)
+
+fan_out_limit = bindparam("max_followers", type_=Integer)
+author_follower_count = select(user_table.c.follower_count).where(user_table.c.id == bindparam("author")).scalar_subquery()
+
+# The author's posts after `:after` into the inboxes of their followers, unless the author has too many.
+fan_out_posts = Statement(
+    "fan_out_posts",
+    timeline_table.insert().from_select(
+        TIMELINE_COLUMNS,
+        select(follow_table.c.follower_id, post_table.c.id, post_table.c.user_id)
+        .select_from(post_table.join(follow_table, follow_table.c.followee_id == post_table.c.user_id))
+        .where(
+            post_table.c.user_id == bindparam("author"),
+            post_table.c.id > bindparam("after"),
+            author_follower_count <= fan_out_limit,
+        ),
+    ),
+)
+
+
+def not_in_inbox(user_id_column, post_id_column):
+    return ~exists().where(timeline_table.c.user_id == user_id_column, timeline_table.c.post_id == post_id_column)
+
+
+recent_posts = (
+    select(post_table.c.id, post_table.c.user_id)
+    .where(post_table.c.user_id == bindparam("author"))
+    .order_by(desc(post_table.c.id))
+    .limit(bindparam("limit", type_=Integer))
+    .subquery()
+)
+
+# The author's recent posts into the inbox of a new follower `:follower`, unless the author has too many followers.
+follower = bindparam("follower", type_=Integer)
+backfill_timeline = Statement(
+    "backfill_timeline",
+    timeline_table.insert().from_select(
+        TIMELINE_COLUMNS,
+        select(follower, recent_posts.c.id, recent_posts.c.user_id).where(
+            author_follower_count <= fan_out_limit, not_in_inbox(follower, recent_posts.c.id)
+        ),
+    ),
+)
+
+# The author's recent posts into the inboxes of all their followers.
+backfill_followers = Statement(
+    "backfill_followers",
+    timeline_table.insert().from_select(
+        TIMELINE_COLUMNS,
+        select(follow_table.c.follower_id, recent_posts.c.id, recent_posts.c.user_id)
+        .select_from(recent_posts.join(follow_table, follow_table.c.followee_id == recent_posts.c.user_id))
+        .where(not_in_inbox(follow_table.c.follower_id, recent_posts.c.id)),
+    ),
+)
+
+remove_from_timeline = Statement(
+    "remove_from_timeline",
+    timeline_table.delete().where(
+        timeline_table.c.user_id == bindparam("follower"), timeline_table.c.author_id == bindparam("followee")
+    ),
+)
+
+# Followed accounts whose posts are read from `posts` (seeks on the follower_count index, then on follows).
+select_fan_out_on_read_followees = Statement(
+    "select_fan_out_on_read_followees",
+    select(user_table.c.id)
+    .select_from(user_table.join(follow_table, follow_table.c.followee_id == user_table.c.id))
+    .where(user_table.c.follower_count > fan_out_limit, follow_table.c.follower_id == bindparam("user")),
+)
+
+
+def inbox_page_query(after_cursor: bool):
+    """`:limit` posts from the inbox of `:user`, newest first, older than `:before` after a cursor."""
+    query = (
+        select(*post_columns)
+        .select_from(timeline_table.join(post_table, post_table.c.id == timeline_table.c.post_id))
+        .where(timeline_table.c.user_id == bindparam("user"))
+    )
+    if after_cursor:
+        query = query.where(timeline_table.c.post_id < bindparam("before"))
+    return query.order_by(desc(timeline_table.c.post_id)).limit(bindparam("limit", type_=Integer))
+
+
+inbox_page_statements = {
+    after_cursor: Statement(f"select_timeline{'_after_cursor' if after_cursor else ''}", inbox_page_query(after_cursor))
+    for after_cursor in (False, True)
+}
+
+
+def build_timeline_query(user_id: int, limit: int, cursor: str | None = None, pull_from: list[int] = ()):
+    """One timeline page: the inbox of `user_id` merged with the latest posts of the `pull_from` authors.
+
+    Each author is read with its own seek of at most `limit` rows on the
+    posts index by user, rather than one scan over all of their posts."""
+    params = {"user": user_id, "limit": limit}
+    if cursor:
+        (params["before"],) = decode_cursor(cursor, "timeline", 1)
+    inbox = inbox_page_statements[bool(cursor)](**params)
+    if not pull_from:
+        return inbox
+
+    pages = [inbox.clause()]
+    for author_id in pull_from:
+        query = select(*post_columns).where(post_table.c.user_id == author_id)
+        if cursor:
+            query = query.where(post_table.c.id < params["before"])
+        pages.append(query.order_by(desc(post_table.c.id)).limit(limit))
+    # UNION, not UNION ALL: posts from before an author crossed the threshold are also in the inbox.
+    page = union(*(select(query.subquery()) for query in pages)).subquery()
+    return select(page).order_by(desc(page.c.id)).limit(limit)
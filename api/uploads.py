@@ -0,0 +1,136 @@
+"""Streaming multipart uploads.
+
+FastAPI's `UploadFile` parameters parse the whole form before the endpoint
+runs. `received_file` instead feeds the request body to the multipart parser
+as it arrives and appends the bytes of the file part to a temporary file
+with aiofiles, so memory use stays at one body chunk however large the
+upload is, and an upload over the size limit is rejected as soon as it
+crosses it rather than after it has been read.
+"""
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import AsyncIterator
+
+import aiofiles.os
+import aiofiles.tempfile
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReceivedFile:
+    path: Path
+    filename: str
+    content_type: str
+    size: int
+
+    @property
+    def suffix(self) -> str:
+        """The client's file extension, lowercased, if it is a plain one."""
+        suffix = PurePosixPath(self.filename).suffix.lower()
+        return suffix if suffix[1:].isalnum() else ""
+
+    async def keep(self) -> Path:
+        """A second link to the file that outlives the `received_file` block; the caller deletes it."""
+        path = self.path.with_name(f"kept-{self.path.name}")
+        await aiofiles.os.link(self.path, path)
+        return path
+
+
+class FilePartReceiver:
+    """Parser callbacks that collect the bytes of the file part `field`; every other part is skipped."""
+
+    def __init__(self, field: str, max_bytes: int, content_types: tuple[str, ...]):
+        self.field = field
+        self.max_bytes = max_bytes
+        self.content_types = content_types
+        self.file: ReceivedFile | None = None
+        self.pending: list[bytes] = []
+        self._in_file = False
+        self._headers: dict[bytes, bytes] = {}
+        self._header_name = b""
+        self._header_value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        if options.get(b"name", b"").decode("latin-1") != self.field or b"filename" not in options or self.file:
+            return
+        content_type = self._headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+        if not content_type.startswith(self.content_types):
+            raise HTTPException(status_code=415, detail=f"Unsupported media type: {content_type}")
+        self.file = ReceivedFile(Path(), options[b"filename"].decode("utf-8", "replace"), content_type, 0)
+        self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._in_file:
+            return
+        self.file.size += end - start
+        if self.file.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"File larger than {self.max_bytes} bytes")
+        self.pending.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        self._in_file = False
+
+
+@asynccontextmanager
+async def received_file(
+    request: Request, field: str, max_bytes: int, content_types: tuple[str, ...] = ("",)
+) -> AsyncIterator[ReceivedFile]:
+    """Stream the file part `field` of a multipart request body to a temporary file.
+
+    The temporary file is deleted when the block exits. Raises 400 for a
+    body that is not multipart or has no such part, 413 past `max_bytes` and
+    415 if the part's content type does not start with one of `content_types`."""
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    receiver = FilePartReceiver(field, max_bytes, content_types)
+    parser = MultipartParser(options[b"boundary"], receiver.callbacks())
+    async with aiofiles.tempfile.NamedTemporaryFile("wb", prefix="upload-") as temp:
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                # The callbacks cannot await, so the data they collected is written here.
+                if receiver.pending:
+                    await temp.write(b"".join(receiver.pending))
+                    receiver.pending.clear()
+            parser.finalize()
+        except FormParserError as e:
+            raise HTTPException(status_code=400, detail="Invalid multipart body") from e
+        if receiver.file is None:
+            raise HTTPException(status_code=400, detail=f"Missing file field: {field}")
+        await temp.flush()
+        receiver.file.path = Path(temp.name)
+        logger.debug(f"Received {receiver.file.size} bytes of {receiver.file.content_type}")
+        yield receiver.file
@@ -0,0 +1,86 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks run against their own throwaway SQLite files, never against the
+configured application database. Run them from the repository root, e.g.
+`python -m benchmarks.posts_pagination`."""
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+os.environ.setdefault("ENV_STATE", "test")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+# Benchmarks measure the app under load; budgets and load shedding would only get in the way.
+os.environ.setdefault("TEST_RATE_LIMITS", "{}")
+os.environ.setdefault("TEST_MAX_IN_FLIGHT_REQUESTS", "0")
+# Keep log files out of the repository's logs/ directory.
+os.environ.setdefault("TEST_LOG_DIR", str(Path(__file__).resolve().parent.parent / ".bench" / "logs"))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from api.database import like_table, post_table, user_table  # noqa: E402
+from api.migrations import upgrade  # noqa: E402
+
+BENCH_DIR = Path(__file__).resolve().parent.parent / ".bench"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_calls(fn, repeat: int) -> list[float]:
+    """Call `fn` `repeat` times and return the wall time of each call in ms."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float]) -> None:
+    print(
+        f"{label:<40} median {statistics.median(samples):8.3f} ms"
+        f"  p99 {percentile(samples, 99):8.3f} ms  (n={len(samples)})"
+    )
+
+
+def sqlite_engine(name: str):
+    """Create a fresh SQLite database file with the application schema."""
+    BENCH_DIR.mkdir(exist_ok=True)
+    path = BENCH_DIR / f"{name}.db"
+    # The app's WAL connections leave these behind, and a stale log would be replayed into the new file.
+    for suffix in ("", "-wal", "-shm"):
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    upgrade(engine)
+    return engine
+
+
+def app_engine(name: str):
+    """Like `sqlite_engine`, and point the app's own database at that file.
+
+    Call it before the app first reads its settings, i.e. before `api.database.database` is used."""
+    engine = sqlite_engine(name)
+    os.environ["TEST_DATABASE_URL"] = engine.url.render_as_string(hide_password=False)
+    return engine
+
+
+def seed_posts(engine, posts: int, likes_per_post: float = 0.5, chunk: int = 50_000) -> None:
+    """Insert one user, `posts` posts and `likes_per_post` likes per post (at most one each) on random posts."""
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(user_table.insert(), [{"id": 1, "email": "bench@example.com", "password": "x", "confirmed": True}])
+        for start in range(1, posts + 1, chunk):
+            stop = min(start + chunk, posts + 1)
+            conn.execute(post_table.insert(), [{"id": i, "body": f"post {i}", "user_id": 1} for i in range(start, stop)])
+        # The user likes each post at most once (uq_likes_post_id_user_id).
+        liked = rng.sample(range(1, posts + 1), min(posts, int(posts * likes_per_post)))
+        for start in range(0, len(liked), chunk):
+            conn.execute(like_table.insert(), [{"post_id": post_id, "user_id": 1} for post_id in liked[start:start + chunk]])
+        conn.execute(text(
+            "UPDATE posts SET like_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id)"
+        ))
@@ -0,0 +1,69 @@
+"""Latency of the read endpoints answered in full and as 304 Not Modified.
+
+Seeds a benchmark database with `--posts` posts, one of them with
+`--comments` comments, then times GET /posts (feed cache off and on) and
+GET /post/{id}, first without validators and then with the ETag of the
+previous response in If-None-Match.
+
+    python -m benchmarks.conditional_requests --posts 10000 --comments 500
+"""
+import argparse
+import asyncio
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from benchmarks.common import app_engine, report
+from api.database import comment_table, database, post_table, user_table
+from api.feed_cache import feed_cache
+from api.main import app
+
+
+async def time_gets(client: AsyncClient, url: str, requests: int, headers: dict | None = None) -> list[float]:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == (304 if headers else 200), response.status_code
+    return samples
+
+
+async def run(posts: int, comments: int, requests: int) -> None:
+    post_id = 1
+    engine = app_engine("conditional_requests")
+    with engine.begin() as conn:
+        conn.execute(user_table.insert().values(id=1, email="bench@example.com", password="x", confirmed=True))
+        conn.execute(post_table.insert(), [
+            {"id": i, "body": f"post {i}", "user_id": 1, "like_count": i % 97} for i in range(1, posts + 1)
+        ])
+        conn.execute(comment_table.insert(), [
+            {"body": f"comment {i}", "post_id": post_id, "user_id": 1} for i in range(comments)
+        ])
+    engine.dispose()
+    await database.connect()
+    try:
+        ttl = feed_cache.ttl
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            for label, url, cache_ttl in (
+                ("GET /posts, feed cache off", "/posts?sorting=most_likes&limit=50", 0),
+                ("GET /posts, feed cache on", "/posts?sorting=most_likes&limit=50", ttl),
+                (f"GET /post/{{id}}, {comments} comments", f"/post/{post_id}?limit=100", ttl),
+            ):
+                feed_cache.ttl = cache_ttl
+                full = await time_gets(client, url, requests)
+                etag = (await client.get(url)).headers["ETag"]
+                report(f"{label}, 200", full)
+                report(f"{label}, 304", await time_gets(client, url, requests, {"If-None-Match": etag}))
+        feed_cache.ttl = ttl
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--comments", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.posts, args.comments, args.requests))
@@ -0,0 +1,86 @@
+"""Concurrent read/write throughput on SQLite, stock backend vs the pooled one.
+
+Runs `--readers` tasks reading a feed page and `--writers` tasks each liking
+a post (read-then-write transaction, like the /like endpoint) for
+`--seconds`, first with the stock `databases` SQLite backend and defaults,
+then with the pooled backend and the configured pragmas.
+
+    python -m benchmarks.db_stress --readers 20 --writers 5 --seconds 5
+"""
+import argparse
+import asyncio
+import sqlite3
+import time
+
+import databases
+
+from benchmarks.common import seed_posts, sqlite_engine
+from api.database import like_table, pool_options, post_table
+from api.sqlite_pool import Database
+
+
+async def stress(database, posts: int, readers: int, writers: int, seconds: float) -> dict:
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    deadline = time.perf_counter() + seconds
+    page = post_table.select().order_by(post_table.c.like_count.desc(), post_table.c.id.desc()).limit(20)
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            await database.fetch_all(page)
+            counts["reads"] += 1
+
+    async def writer(user_id: int):
+        post_id = user_id
+        while time.perf_counter() < deadline:
+            post_id = post_id % posts + 1
+            try:
+                async with database.transaction():
+                    await database.fetch_one(
+                        like_table.select().where(like_table.c.post_id == post_id, like_table.c.user_id == user_id)
+                    )
+                    await database.execute(like_table.insert().values(post_id=post_id, user_id=user_id))
+                    await database.execute(
+                        post_table.update().where(post_table.c.id == post_id).values(like_count=post_table.c.like_count + 1)
+                    )
+                counts["writes"] += 1
+            except sqlite3.IntegrityError:
+                pass
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                counts["locked"] += 1
+
+    await database.connect()
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(reader() for _ in range(readers)), *(writer(1000 + i) for i in range(writers)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await database.disconnect()
+    return {key: value / elapsed for key, value in counts.items()}
+
+
+async def run(posts: int, readers: int, writers: int, seconds: float) -> None:
+    for label, make_database in [
+        ("stock", lambda url: databases.Database(url)),
+        ("pooled", lambda url: Database(url, **pool_options(url))),
+    ]:
+        engine = sqlite_engine(f"db_stress_{label}")
+        seed_posts(engine, posts, likes_per_post=0)
+        url = str(engine.url)
+        engine.dispose()
+        rates = await stress(make_database(url), posts, readers, writers, seconds)
+        print(
+            f"{label:<8} reads {rates['reads']:9.1f}/s  writes {rates['writes']:8.1f}/s"
+            f"  locked errors {rates['locked']:8.1f}/s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--writers", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.posts, args.readers, args.writers, args.seconds))
@@ -0,0 +1,249 @@
+"""Load test of the real-time event hub: thousands of WebSocket subscribers on one worker.
+
+Starts the app under uvicorn with a single worker and its own SQLite file,
+connects `--subscribers` WebSocket clients to /ws/events and then:
+
+1. leaves them idle for a few seconds and reports the server's memory and
+   CPU use;
+2. creates `--posts` posts at `--rate` per second, plus a burst of likes on
+   one post after each, and reports how many events the subscribers got
+   and the delay from the POST being sent to each subscriber getting it;
+3. closes those subscribers, connects `--stalled` clients that stop
+   reading, publishes large posts until the socket buffers and then the
+   hub buffers of those clients fill up, and reports how many the server
+   disconnected.
+
+    python -m benchmarks.event_fanout --subscribers 2000 --posts 50 --rate 10
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmarks.common import BENCH_DIR, percentile
+from api.security import ALGORITHM
+
+SECRET_KEY = "benchmark-secret-key"
+EMAIL = "bench@example.com"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, buffer_size: int) -> subprocess.Popen:
+    BENCH_DIR.mkdir(exist_ok=True)
+    path = BENCH_DIR / "event_fanout.db"
+    for suffix in ("", "-wal", "-shm"):
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+    env = {
+        **os.environ,
+        "ENV_STATE": "dev",
+        "DEV_DATABASE_URL": f"sqlite:///{path}",
+        "DEV_SECRET_KEY": SECRET_KEY,
+        "DEV_EVENTS_BUFFER_SIZE": str(buffer_size),
+        "DEV_RATE_LIMITS": "{}",
+        "DEV_MAX_IN_FLIGHT_REQUESTS": "0",
+        # The dev config logs every request at DEBUG, post bodies included.
+        "DEV_LOG_DIR": str(BENCH_DIR / "logs"),
+    }
+    # The dev config logs at DEBUG; keep that out of the report.
+    with open(BENCH_DIR / "event_fanout.log", "w") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--workers", "1", "--no-access-log"],
+            env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+
+
+def create_user(path) -> str:
+    """A confirmed user inserted directly, and an access token for it."""
+    from jose import jwt
+    from sqlalchemy import create_engine, insert
+
+    from api.database import user_table
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(insert(user_table).values(email=EMAIL, password="x", confirmed=True))
+    engine.dispose()
+    return jwt.encode({"sub": EMAIL, "exp": time.time() + 3600, "type": "access"}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def process_stats(pid: int) -> tuple[float, float]:
+    """Resident memory in MB and CPU seconds used so far."""
+    with open(f"/proc/{pid}/status") as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmRSS"))
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return rss_kb / 1024, cpu
+
+
+async def wait_until_up(client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            await client.get("/metrics")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def hub_stats(client: httpx.AsyncClient) -> dict[str, float]:
+    text = (await client.get("/metrics")).text
+    return {
+        line.split('stat="')[1].split('"')[0]: float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith("app_events{")
+    }
+
+
+class Subscriber:
+    def __init__(self):
+        self.posts = 0
+        self.likes = 0
+        self.delays: list[float] = []
+
+    async def run(self, url: str, connected: asyncio.Event, sample: bool) -> None:
+        async with connect(url, max_queue=None) as websocket:
+            connected.set()
+            async for message in websocket:
+                event = json.loads(message)
+                if event["type"] == "post" and event["data"]["body"][0] != "x":
+                    self.posts += 1
+                    if sample:
+                        self.delays.append((time.perf_counter() - float(event["data"]["body"])) * 1000)
+                elif event["type"] == "likes":
+                    self.likes += 1
+
+
+async def connect_all(url: str, count: int, sampled: int) -> tuple[list[Subscriber], list[asyncio.Task]]:
+    subscribers, tasks = [], []
+    for start in range(0, count, 200):
+        batch = []
+        for i in range(start, min(start + 200, count)):
+            subscriber, connected = Subscriber(), asyncio.Event()
+            tasks.append(asyncio.create_task(subscriber.run(url, connected, sample=i < sampled)))
+            subscribers.append(subscriber)
+            batch.append(connected.wait())
+        await asyncio.wait_for(asyncio.gather(*batch), 60)
+    return subscribers, tasks
+
+
+async def stalled_client(url: str, port: int, connected: asyncio.Event, done: asyncio.Event) -> None:
+    # With no room in its receive queue the client stops reading the socket. A
+    # fixed small receive buffer, since loopback autotuning would grow it to
+    # tens of MB before the server noticed anything.
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    async with connect(url, sock=sock, max_queue=1) as websocket:
+        connected.set()
+        await done.wait()
+        websocket.transport.abort()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--sampled", type=int, default=200, help="subscribers that record delays")
+    parser.add_argument("--posts", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=10.0, help="posts per second")
+    parser.add_argument("--likes", type=int, default=20, help="likes on a post after each post")
+    parser.add_argument("--stalled", type=int, default=20)
+    parser.add_argument("--buffer-size", type=int, default=100)
+    parser.add_argument("--stall-body-bytes", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(port, args.buffer_size)
+    base_url = f"http://127.0.0.1:{port}"
+    ws_url = f"ws://127.0.0.1:{port}/ws/events"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            await wait_until_up(client)
+            token = create_user(BENCH_DIR / "event_fanout.db")
+            headers = {"Authorization": f"Bearer {token}"}
+            liked = (await client.post("/post", json={"body": "0"}, headers=headers)).json()["id"]
+
+            rss, cpu = process_stats(server.pid)
+            print(f"server before subscribers: {rss:.0f} MB")
+            start = time.perf_counter()
+            subscribers, tasks = await connect_all(ws_url, args.subscribers, args.sampled)
+            print(f"connected {args.subscribers} subscribers in {time.perf_counter() - start:.1f} s")
+
+            rss, cpu = process_stats(server.pid)
+            await asyncio.sleep(5)
+            idle_rss, idle_cpu = process_stats(server.pid)
+            print(f"idle for 5 s: {idle_rss:.0f} MB, {idle_cpu - cpu:.2f} s CPU")
+
+            # Likes come from one user, so they alternate like/unlike to keep changing the count.
+            start, cpu = time.perf_counter(), idle_cpu
+            for i in range(args.posts):
+                await client.post("/post", json={"body": repr(time.perf_counter())}, headers=headers)
+                for j in range(args.likes):
+                    if j % 2 == 0:
+                        await client.post("/like", json={"post_id": liked}, headers=headers)
+                    else:
+                        await client.delete(f"/like/{liked}", headers=headers)
+                await asyncio.sleep(max(0.0, start + (i + 1) / args.rate - time.perf_counter()))
+            await asyncio.sleep(2)
+            active_rss, active_cpu = process_stats(server.pid)
+            delays = [delay for subscriber in subscribers for delay in subscriber.delays]
+            posts = sum(subscriber.posts for subscriber in subscribers)
+            likes = sum(subscriber.likes for subscriber in subscribers)
+            print(
+                f"active: {active_rss:.0f} MB, {active_cpu - cpu:.2f} s CPU;"
+                f" {posts}/{args.posts * args.subscribers} post events delivered,"
+                f" {likes / args.subscribers:.1f} of {args.posts * args.likes} like updates per subscriber"
+            )
+            print(
+                f"post delivery delay: p50 {percentile(delays, 50):.1f} ms"
+                f"  p99 {percentile(delays, 99):.1f} ms  max {max(delays):.1f} ms"
+            )
+
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            while (await hub_stats(client))["subscribers"]:
+                await asyncio.sleep(0.1)
+
+            done = asyncio.Event()
+            stalled = []
+            for _ in range(args.stalled):
+                connected = asyncio.Event()
+                stalled.append(asyncio.create_task(stalled_client(ws_url, port, connected, done)))
+                await connected.wait()
+            before = await hub_stats(client)
+            # Random, since the connection compresses messages.
+            body = "x" + base64.b64encode(os.urandom(args.stall_body_bytes * 3 // 4)).decode()
+            for i in range(args.buffer_size * 10):
+                await client.post("/post", json={"body": body}, headers=headers)
+                if (await hub_stats(client))["slow_consumers"] - before["slow_consumers"] >= args.stalled:
+                    break
+            after = await hub_stats(client)
+            print(
+                f"stalled clients: {after['slow_consumers'] - before['slow_consumers']:.0f}/{args.stalled}"
+                f" disconnected after {i + 1} posts of {args.stall_body_bytes // 1024} KB;"
+                f" {after['subscribers']:.0f} subscribers left"
+            )
+            done.set()
+            await asyncio.gather(*stalled, return_exceptions=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""GET /posts throughput with and without the feed cache.
+
+Seeds a benchmark database, then issues `--requests` GET /posts calls from
+`--concurrency` concurrent clients, once with the cache disabled and once
+enabled.
+
+    python -m benchmarks.feed_cache --posts 10000 --requests 2000
+"""
+import argparse
+import asyncio
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from benchmarks.common import app_engine
+from api.database import database, post_table, user_table
+from api.feed_cache import feed_cache
+from api.main import app
+
+
+async def hammer(client: AsyncClient, requests: int, concurrency: int) -> float:
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            response = await client.get("/posts?sorting=most_likes&limit=50")
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def run(posts: int, requests: int, concurrency: int) -> None:
+    engine = app_engine("feed_cache")
+    with engine.begin() as conn:
+        conn.execute(user_table.insert().values(id=1, email="bench@example.com", password="x", confirmed=True))
+        conn.execute(post_table.insert(), [{"body": f"post {i}", "user_id": 1, "like_count": i % 97} for i in range(posts)])
+    engine.dispose()
+    await database.connect()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            ttl = feed_cache.ttl
+            feed_cache.ttl = 0
+            uncached = await hammer(client, requests, concurrency)
+            feed_cache.ttl = ttl
+            await feed_cache.clear()
+            cached = await hammer(client, requests, concurrency)
+        print(f"{'uncached':<12} {uncached:10.1f} req/s")
+        print(f"{'cached':<12} {cached:10.1f} req/s   {feed_cache.stats()}")
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.posts, args.requests, args.concurrency))
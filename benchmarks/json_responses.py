@@ -0,0 +1,78 @@
+"""Latency of list responses: FastAPI's response_model path vs RowsJSONResponse.
+
+Serves the same in-memory rows (no database) from two routes: one returning
+the row dicts with `response_model=list[UserPostWithLikes]`, as get_posts
+did, and one returning `RowsJSONResponse.from_rows`. Also times the
+serializers alone.
+
+    python -m benchmarks.json_responses --rows 10000 --repeat 30
+"""
+import argparse
+import asyncio
+import time
+import timeit
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pydantic import TypeAdapter
+
+import benchmarks.common  # noqa: F401  (configures the environment before importing the app)
+from api.models.post import UserPostWithLikes
+from api.responses import RowsAdapter, RowsJSONResponse
+from benchmarks.common import report
+
+
+def make_rows(count: int) -> list[dict]:
+    return [
+        {"id": i, "body": f"Post number {i} about nothing much", "user_id": i % 500, "likes": i % 17, "image_url": None, "thumbnails": None}
+        for i in range(count)
+    ]
+
+
+def make_app(rows: list[dict]) -> FastAPI:
+    app = FastAPI()
+    post_rows = RowsAdapter(UserPostWithLikes)
+
+    @app.get("/response_model", response_model=list[UserPostWithLikes])
+    async def with_response_model():
+        return rows
+
+    @app.get("/rows", response_model=list[UserPostWithLikes])
+    async def with_rows_response():
+        return RowsJSONResponse.from_rows(post_rows, rows)
+
+    return app
+
+
+def serializers(rows: list[dict], number: int) -> None:
+    model_adapter = TypeAdapter(list[UserPostWithLikes])
+    post_rows = RowsAdapter(UserPostWithLikes)
+    for label, fn in [
+        ("models: validate + dump_json", lambda: model_adapter.dump_json(model_adapter.validate_python(rows))),
+        ("RowsAdapter.dump_json", lambda: post_rows.dump_json(rows)),
+    ]:
+        seconds = timeit.timeit(fn, number=number) / number
+        print(f"{label:<40} {seconds * 1e3:8.2f} ms")
+
+
+async def requests(rows: list[dict], repeat: int) -> None:
+    async with AsyncClient(transport=ASGITransport(app=make_app(rows)), base_url="http://bench") as client:
+        assert (await client.get("/rows")).json() == (await client.get("/response_model")).json()
+        for path in ("/response_model", "/rows"):
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = await client.get(path)
+                samples.append((time.perf_counter() - start) * 1e3)
+                response.raise_for_status()
+            report(f"GET {path} ({len(rows)} rows)", samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+    serializers(rows, args.repeat)
+    asyncio.run(requests(rows, args.repeat))
@@ -0,0 +1,105 @@
+"""Request throughput with INFO logging, handlers called directly vs queued.
+
+Serves an endpoint that logs like the routers do (a few INFO lines per
+request) through the production handler set: a console StreamHandler (to
+/dev/null), the JSON RotatingFileHandler (to a temporary directory) and, in
+place of Logtail, a handler that sleeps `--network-ms` per record to stand in
+for a network round trip. "direct" runs the handlers on the event loop, as
+configure_logging used to; "queued" moves them behind `attach_queue`.
+
+    python -m benchmarks.logging_throughput --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pythonjsonlogger.jsonlogger import JsonFormatter
+
+import benchmarks.common  # noqa: F401  (configures the environment before importing the app)
+from api.logging_conf import attach_queue, dropped_records, stop_logging
+
+logger = logging.getLogger("api.bench")
+
+
+class NetworkHandler(logging.Handler):
+    """Formats the record and blocks for a fixed time, like a synchronous HTTP log shipper."""
+
+    def __init__(self, seconds: float):
+        super().__init__()
+        self.seconds = seconds
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.format(record)
+        time.sleep(self.seconds)
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/post/{post_id}")
+    async def get_post(post_id: int):
+        logger.info("Getting post %s", post_id)
+        logger.info("Fetched %d comments", 3, extra={"email": "bench@example.net"})
+        return {"id": post_id}
+
+    return app
+
+
+def install_handlers(log_dir: Path, network_seconds: float, queued: bool) -> None:
+    stream = logging.StreamHandler(open(os.devnull, "w"))
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)-8s %(name)s - %(message)s"))
+    file = RotatingFileHandler(log_dir / "app.log", maxBytes=5 * 1024 * 1024, backupCount=2, encoding="utf-8")
+    file.setFormatter(JsonFormatter("%(asctime)s %(levelname)s %(name)s:%(lineno)d %(message)s"))
+    handlers = [stream, file]
+    if network_seconds:
+        handlers.append(NetworkHandler(network_seconds))
+
+    logger.handlers = handlers
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if queued:
+        attach_queue([logger.name], maxsize=10_000)
+
+
+async def run(count: int, concurrency: int) -> float:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(client: AsyncClient, i: int) -> None:
+        async with limit:
+            response = await client.get(f"/post/{i}")
+            response.raise_for_status()
+
+    async with AsyncClient(transport=ASGITransport(app=make_app()), base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(count)))
+        return count / (time.perf_counter() - start)
+
+
+def main(count: int, concurrency: int, network_ms: float) -> None:
+    with tempfile.TemporaryDirectory() as log_dir:
+        for network in sorted({0.0, network_ms}):
+            for queued in (False, True):
+                install_handlers(Path(log_dir), network / 1000, queued)
+                rate = asyncio.run(run(count, concurrency))
+                # Time the drain too: the records still have to be written.
+                start = time.perf_counter()
+                stop_logging()
+                drain = time.perf_counter() - start
+                label = f"{'queued' if queued else 'direct'}, network handler {network:g} ms"
+                print(f"{label:<40} {rate:8.0f} req/s  (drain {drain:.2f} s, dropped {dropped_records()})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--network-ms", type=float, default=1.0, help="simulated log shipping latency per record")
+    args = parser.parse_args()
+    main(args.requests, args.concurrency, args.network_ms)
@@ -0,0 +1,76 @@
+"""GET /posts latency while a burst of logins runs.
+
+Fires `--logins` concurrent POST /token requests and measures GET /posts
+latency from a concurrent poller, first with bcrypt on the password worker
+pool and then (`--inline`) with bcrypt run on the event loop as before.
+
+    python -m benchmarks.login_burst --logins 20
+"""
+import argparse
+import asyncio
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from benchmarks.common import app_engine, percentile, report
+from api import security
+from api.database import database, user_table
+from api.main import app
+
+EMAIL = "bench@example.com"
+PASSWORD = "benchmark-password"
+
+
+async def poll_posts(client: AsyncClient, stop: asyncio.Event) -> list[float]:
+    samples = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/posts")
+        response.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+    return samples
+
+
+async def run(logins: int, inline: bool) -> None:
+    engine = app_engine("login_burst")
+    with engine.begin() as conn:
+        conn.execute(user_table.insert().values(email=EMAIL, password=security.hash_password(PASSWORD), confirmed=True))
+    engine.dispose()
+    await database.connect()
+    if inline:
+        async def verify_inline(password: str, hashed_password: str) -> bool:
+            return security.verify_password(password, hashed_password)
+        security.verify_password_async = verify_inline
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            stop = asyncio.Event()
+            idle = asyncio.create_task(poll_posts(client, stop))
+            await asyncio.sleep(1)
+            stop.set()
+            report("GET /posts, idle", await idle)
+
+            stop = asyncio.Event()
+            busy = asyncio.create_task(poll_posts(client, stop))
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.post("/token", data={"username": EMAIL, "password": PASSWORD}) for _ in range(logins)
+            ))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            samples = await busy
+            assert all(response.status_code == 200 for response in responses)
+            mode = "inline bcrypt" if inline else f"{security.password_executor.max_workers} password workers"
+            report(f"GET /posts, {logins} logins ({mode})", samples)
+            print(f"{'logins finished in':<40} {elapsed:8.3f} s   max latency {percentile(samples, 100):.1f} ms")
+    finally:
+        await database.disconnect()
+        security.password_executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--inline", action="store_true", help="verify passwords on the event loop")
+    args = parser.parse_args()
+    asyncio.run(run(args.logins, args.inline))
@@ -0,0 +1,86 @@
+"""Cost of the metrics instrumentation.
+
+Times the primitives (histogram observe, counter inc, query naming, the
+query timer) with `timeit`, then the per-request cost of MetricsMiddleware
+by serving a trivial endpoint with and without it.
+
+    python -m benchmarks.metrics_overhead --requests 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import timeit
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+import benchmarks.common  # noqa: F401  (configures the environment before importing the app)
+from api.database import post_table
+from api.metrics import Counter, Histogram, MetricsMiddleware, query_name, timed_query
+from api.routers.post import PostSorting, build_posts_query
+
+
+def primitives(number: int) -> None:
+    histogram = Histogram("bench_seconds", "Bench.", ("route",))
+    counter = Counter("bench_total", "Bench.", ("method", "route", "status"))
+    query = build_posts_query(PostSorting.new, 20)
+    insert = post_table.insert().values(body="x", user_id=1)
+
+    def timed():
+        with timed_query(query):
+            pass
+
+    for label, fn in [
+        ("Histogram.observe", lambda: histogram.observe(0.003, "/posts")),
+        ("Counter.inc", lambda: counter.inc("GET", "/posts", 200)),
+        ("query_name(select)", lambda: query_name(query)),
+        ("query_name(insert)", lambda: query_name(insert)),
+        ("timed_query", timed),
+    ]:
+        seconds = timeit.timeit(fn, number=number)
+        print(f"{label:<40} {seconds / number * 1e6:8.2f} us")
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping/{item_id}")
+    async def ping(item_id: int):
+        return {"item_id": item_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def requests(instrumented: bool, count: int) -> list[float]:
+    samples = []
+    async with AsyncClient(transport=ASGITransport(app=make_app(instrumented)), base_url="http://bench") as client:
+        for i in range(count):
+            start = time.perf_counter()
+            response = await client.get(f"/ping/{i}")
+            samples.append((time.perf_counter() - start) * 1e6)
+            response.raise_for_status()
+    return samples
+
+
+async def middleware(count: int) -> None:
+    # Interleave runs so drift (CPU frequency, GC) hits both variants alike.
+    results = {False: [], True: []}
+    for _ in range(3):
+        for instrumented in (False, True):
+            results[instrumented] += await requests(instrumented, count)
+    plain, instrumented = statistics.median(results[False]), statistics.median(results[True])
+    print(f"{'request without middleware':<40} {plain:8.1f} us (median)")
+    print(f"{'request with MetricsMiddleware':<40} {instrumented:8.1f} us (median)")
+    print(f"{'overhead':<40} {instrumented - plain:8.1f} us ({(instrumented / plain - 1) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=100_000, help="iterations per primitive")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per variant and round")
+    args = parser.parse_args()
+    primitives(args.number)
+    asyncio.run(middleware(args.requests))
@@ -0,0 +1,44 @@
+"""Latency of GET /posts pages as the posts table grows.
+
+For each table size this times the first page and a page from the middle of
+the feed for every sorting. With keyset pagination both should stay flat as
+the table grows; an OFFSET-style or unpaginated feed grows linearly.
+
+    python -m benchmarks.posts_pagination --sizes 10000 100000 1000000
+"""
+import argparse
+
+from benchmarks.common import report, seed_posts, sqlite_engine, time_calls
+from api.routers.post import PostSorting, build_posts_query, next_posts_cursor
+
+
+def middle_cursor(conn, sorting: PostSorting, size: int) -> str:
+    """Cursor pointing at the middle of the feed, as a client paging down would get."""
+    query = build_posts_query(sorting, 1).clause().offset(size // 2)
+    row = conn.execute(query).mappings().one()
+    return next_posts_cursor(sorting, row)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        engine = sqlite_engine(f"posts_pagination_{size}")
+        seed_posts(engine, size)
+        print(f"--- {size} posts")
+        with engine.connect() as conn:
+            for sorting in PostSorting:
+                cursor = middle_cursor(conn, sorting, size)
+                first_page = build_posts_query(sorting, args.limit + 1).clause()
+                deep_page = build_posts_query(sorting, args.limit + 1, cursor).clause()
+                for label, query in (("first page", first_page), ("middle page", deep_page)):
+                    report(f"{sorting.value} {label}", time_calls(lambda query=query: conn.execute(query).fetchall(), args.repeat))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
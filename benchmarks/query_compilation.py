@@ -0,0 +1,91 @@
+"""CPU time spent turning the routers' queries into SQL, per request.
+
+"built" is what the handlers used to do on every request: build the
+`select(...)` with the request's values, let `databases` compile it, and, for
+`find_post`, render it once more for `logger.info(query)`. "statement" binds
+the values to the precompiled statement and takes the cached compilation,
+which is what the pooled SQLite backend now does. No query is executed; this
+is the per-request CPU cost in front of the database.
+
+    python -m benchmarks.query_compilation --number 20000
+"""
+import argparse
+import timeit
+
+from databases.backends.sqlite import SQLiteConnection
+from sqlalchemy import asc, desc, select
+from sqlalchemy.dialects.sqlite import pysqlite
+
+import benchmarks.common  # noqa: F401  (configures the environment before importing the app)
+from api.database import comment_table, post_table, user_table
+from api.pagination import encode_cursor
+from api.routers.post import (
+    PostSorting,
+    build_post_with_comments_query,
+    build_posts_query,
+    insert_comment,
+    select_post_by_id,
+    select_post_with_likes,
+)
+from api.security import select_user_by_email
+from api.sqlite_pool import PooledSQLiteConnection
+
+
+def built_queries() -> dict:
+    def find_post():
+        query = post_table.select().where(post_table.c.id == 42)
+        str(query)  # logger.info(query)
+        return query
+
+    return {
+        "find_post": find_post,
+        "get_user": lambda: select(user_table).where(user_table.c.email == "user@example.net"),
+        "posts page (new, cursor)": lambda: (
+            select_post_with_likes.where(post_table.c.id < 1000).order_by(desc(post_table.c.id)).limit(21)
+        ),
+        "post with comments": lambda: (
+            select_post_with_likes.add_columns(
+                comment_table.c.id.label("comment_id"),
+                comment_table.c.body.label("comment_body"),
+                comment_table.c.user_id.label("comment_user_id"),
+            )
+            .select_from(post_table.outerjoin(comment_table, comment_table.c.post_id == post_table.c.id))
+            .where(post_table.c.id == 42)
+            .order_by(asc(comment_table.c.id))
+            .limit(21)
+        ),
+        "insert comment": lambda: comment_table.insert().values(body="Nice post", post_id=42, user_id=7),
+    }
+
+
+def statements() -> dict:
+    cursor = encode_cursor(PostSorting.new.value, 1000)
+    return {
+        "find_post": lambda: select_post_by_id(post_id=42),
+        "get_user": lambda: select_user_by_email(email="user@example.net"),
+        "posts page (new, cursor)": lambda: build_posts_query(PostSorting.new, 21, cursor),
+        "post with comments": lambda: build_post_with_comments_query(42, 21),
+        "insert comment": lambda: insert_comment(body="Nice post", post_id=42, user_id=7),
+    }
+
+
+def main(number: int) -> None:
+    dialect = pysqlite.dialect(paramstyle="qmark")
+    stock, pooled = SQLiteConnection(None, dialect), PooledSQLiteConnection(None, dialect)
+    built, prepared = built_queries(), statements()
+    total_built = total_prepared = 0.0
+    print(f"{'query':<28} {'built':>10} {'statement':>10}")
+    for name, build in built.items():
+        prepare = prepared[name]
+        before = timeit.timeit(lambda build=build: stock._compile(build()), number=number) / number * 1e6
+        after = timeit.timeit(lambda prepare=prepare: pooled._compile(prepare()), number=number) / number * 1e6
+        total_built, total_prepared = total_built + before, total_prepared + after
+        print(f"{name:<28} {before:8.1f} us {after:8.1f} us")
+    print(f"{'total':<28} {total_built:8.1f} us {total_prepared:8.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20_000, help="iterations per query")
+    args = parser.parse_args()
+    main(args.number)
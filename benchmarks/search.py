@@ -0,0 +1,76 @@
+"""Full-text search latency over a large post corpus.
+
+Seeds `--posts` posts with random bodies drawn from a Zipf-like vocabulary
+(indexed by the search triggers as they are inserted), then times the first
+page and a deep page for common, rare, multi-term and prefix queries.
+
+    python -m benchmarks.search --posts 1000000
+"""
+import argparse
+import itertools
+import random
+import time
+
+from sqlalchemy import text
+
+from benchmarks.common import report, sqlite_engine, time_calls
+from api.database import post_table, user_table
+from api.pagination import encode_cursor
+from api.search import SQLiteFTS5SearchBackend, to_match_expression
+
+VOCABULARY = [f"word{i}" for i in range(20_000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+QUERIES = ["word0", "word19999", "word1 word2", "word12*"]
+
+
+def seed(engine, posts: int, chunk: int = 50_000) -> None:
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(user_table.insert(), [{"id": 1, "email": "bench@example.com", "password": "x", "confirmed": True}])
+        for start in range(1, posts + 1, chunk):
+            rows = [
+                {"id": i, "body": " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=12)), "user_id": 1}
+                for i in range(start, min(start + chunk, posts + 1))
+            ]
+            conn.execute(post_table.insert(), rows)
+        conn.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+
+
+def main(posts: int, limit: int, pages: int, repeat: int) -> None:
+    engine = sqlite_engine("search")
+    start = time.perf_counter()
+    seed(engine, posts)
+    print(f"seeded and indexed {posts} posts in {time.perf_counter() - start:.1f} s")
+
+    with engine.connect() as conn:
+        for query in QUERIES:
+            match = to_match_expression(query)
+            sql, values = SQLiteFTS5SearchBackend.build_query(match, limit)
+            report(
+                f"{query!r} first page",
+                time_calls(lambda sql=sql, values=values: conn.execute(text(sql), values).all(), repeat),
+            )
+
+            # Walk to page `pages` and time fetching the one after it.
+            cursor = None
+            for _ in range(pages):
+                sql, values = SQLiteFTS5SearchBackend.build_query(match, limit, cursor)
+                rows = conn.execute(text(sql), values).all()
+                if len(rows) < limit:
+                    break
+                cursor = encode_cursor("search", rows[-1].rank, rows[-1].row_id)
+            sql, values = SQLiteFTS5SearchBackend.build_query(match, limit, cursor)
+            report(
+                f"{query!r} page {pages + 1}",
+                time_calls(lambda sql=sql, values=values: conn.execute(text(sql), values).all(), repeat),
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.posts, args.limit, args.pages, args.repeat)
@@ -0,0 +1,83 @@
+"""Thumbnailing throughput for a batch of images, and what it does to the event loop.
+
+Writes `--images` synthetic photos, then thumbnails the batch with
+`render_thumbnails` through a BoundedExecutor of threads and of processes
+for each worker count. While a batch runs, a coroutine that sleeps 1 ms in a
+loop records how late it wakes up: the event loop lag that requests being
+served at the same time would see.
+
+    python -m benchmarks.thumbnails --images 40 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from PIL import Image
+
+from benchmarks.common import BENCH_DIR, percentile
+from api.config import config
+from api.thumbnails import render_thumbnails
+from api.workers import BoundedExecutor
+
+
+def make_images(count: int, width: int, height: int) -> list[str]:
+    directory = BENCH_DIR / "thumbnails"
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = directory / f"photo_{i}.jpg"
+        if not path.exists():
+            noise = Image.effect_noise((width, height), 40 + i % 20)
+            bands = [noise, noise.transpose(Image.FLIP_TOP_BOTTOM), noise.transpose(Image.FLIP_LEFT_RIGHT)]
+            Image.merge("RGB", bands).save(path, quality=90)
+        paths.append(str(path))
+    return paths
+
+
+async def measure_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - start - 0.001) * 1000)
+
+
+async def run_batch(executor: BoundedExecutor, paths: list[str], sizes: list[int]) -> tuple[float, list[float]]:
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    with tempfile.TemporaryDirectory() as target:
+        # One warm-up call starts the worker processes outside the timing.
+        await executor.run(render_thumbnails, paths[0], target, sizes)
+        start = time.perf_counter()
+        await asyncio.gather(*(executor.run(render_thumbnails, path, target, sizes) for path in paths))
+        elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return elapsed, lags
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    paths = make_images(args.images, args.width, args.height)
+    sizes = config.THUMBNAIL_SIZES
+    print(f"{len(paths)} images of {args.width}x{args.height}, sizes {sizes}")
+    for kind in ("thread", "process"):
+        for workers in args.workers:
+            executor = BoundedExecutor(kind, workers, name="bench")
+            elapsed, lags = await run_batch(executor, paths, sizes)
+            executor.shutdown()
+            print(
+                f"{kind:>7} x{workers}  {len(paths) / elapsed:7.1f} images/s"
+                f"  loop lag p50 {percentile(lags, 50):7.2f} ms  p99 {percentile(lags, 99):7.2f} ms"
+                f"  max {max(lags):7.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
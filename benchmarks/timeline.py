@@ -0,0 +1,101 @@
+"""Cost of timelines with pure fan-out on write vs the hybrid with fan-out on read.
+
+Seeds users whose follower counts follow a power law (user k has about
+users / k followers, so a few accounts are followed by most users), then for
+each fan-out limit creates the same posts, timing the insert plus fan-out of
+each post, and reads the first timeline page of random users. A limit at
+least the number of users is pure fan-out on write.
+
+    python -m benchmarks.timeline --users 20000 --posts 2000 --limits 20000 1000
+"""
+import argparse
+import random
+
+from sqlalchemy import func, select
+
+from benchmarks.common import report, sqlite_engine, time_calls
+from api.database import follow_table, post_table, timeline_table, user_table
+from api.statements import BoundStatement
+from api.timeline import build_timeline_query, fan_out_posts, select_fan_out_on_read_followees
+
+
+def seed_users(engine, users: int) -> None:
+    rng = random.Random(42)
+    follows = set()
+    for followee in range(1, users + 1):
+        for follower in rng.sample(range(1, users + 1), min(users - 1, users // followee)):
+            if follower != followee:
+                follows.add((follower, followee))
+    counts = {}
+    for _, followee in follows:
+        counts[followee] = counts.get(followee, 0) + 1
+    with engine.begin() as conn:
+        conn.execute(user_table.insert(), [
+            {"id": i, "email": f"user{i}@example.com", "password": "x", "confirmed": True, "follower_count": counts.get(i, 0)}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(follow_table.insert(), [{"follower_id": a, "followee_id": b} for a, b in follows])
+    print(f"{users} users, {len(follows)} follows, most followed has {max(counts.values())}")
+
+
+def create_posts(engine, authors: list[int], max_followers: int) -> None:
+    samples = {"< 100 followers": [], "100-999 followers": [], "1000+ followers": []}
+    with engine.connect() as conn:
+        counts = dict(conn.execute(select(user_table.c.id, user_table.c.follower_count)).all())
+        conn.rollback()
+        for author in authors:
+            def create(author=author):
+                with conn.begin():
+                    post_id = conn.execute(post_table.insert().values(body="post", user_id=author)).inserted_primary_key[0]
+                    conn.execute(fan_out_posts(author=author, after=post_id - 1, max_followers=max_followers).clause())
+            bucket = list(samples)[(counts[author] >= 100) + (counts[author] >= 1000)]
+            samples[bucket] += time_calls(create, 1)
+    with engine.connect() as conn:
+        inbox_rows = conn.execute(select(func.count()).select_from(timeline_table)).scalar()
+    for bucket, bucket_samples in samples.items():
+        if bucket_samples:
+            report(f"create post, author {bucket}", bucket_samples)
+    print(f"{'timeline rows written':<40} {inbox_rows}")
+
+
+def read_timelines(engine, readers: list[int], max_followers: int, limit: int, repeat: int) -> None:
+    samples = []
+    with engine.connect() as conn:
+        for reader in readers:
+            def read(reader=reader):
+                pull_from = conn.execute(
+                    select_fan_out_on_read_followees(user=reader, max_followers=max_followers).clause()
+                ).scalars().all()
+                query = build_timeline_query(reader, limit + 1, None, pull_from)
+                conn.execute(query.clause() if isinstance(query, BoundStatement) else query).fetchall()
+            samples += time_calls(read, repeat)
+    report("read first timeline page", samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--posts", type=int, default=2_000)
+    parser.add_argument("--limits", type=int, nargs="+", default=[20_000, 1_000])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    # Every account posts about as often, but the most followed ones are in every run.
+    authors = list(range(1, 11)) + [rng.randint(1, args.users) for _ in range(args.posts - 10)]
+    rng.shuffle(authors)
+    readers = rng.sample(range(1, args.users + 1), args.readers)
+
+    for max_followers in args.limits:
+        print(f"--- fan-out limit {max_followers}")
+        engine = sqlite_engine(f"timeline_{max_followers}")
+        seed_users(engine, args.users)
+        create_posts(engine, authors, max_followers)
+        read_timelines(engine, readers, max_followers, args.limit, args.repeat)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,29 @@ from fastapi import Request, Response
 import pytest
 from fastapi.testclient import TestClient
 from httpx import AsyncClient, ASGITransport
+from sqlalchemy import create_engine
 from sqlalchemy.sql import select
-from api.database import database, post_table, comment_table, user_table, like_table
 
+# Must be set before anything reads the config.
 os.environ["ENV_STATE"] = "test"
 
+from api.database import database, get_engine, post_table, comment_table, user_table, like_table, outbound_email_table, follow_table, timeline_table
+from api.migrations import upgrade
+from api import security
+from api.feed_cache import feed_cache
+from api.rate_limit import rate_limiter
 from api.main import app
+from api.sqlite_pool import Database
+
+
+class FakeClock:
+    """A clock for TTL caches that moves only when a test sets `now`."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
 
 
 @pytest.fixture(scope="session")
@@ -18,6 +35,11 @@ def anyio_backend():
     return "asyncio"
 
 
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    upgrade(get_engine())
+
+
 @pytest.fixture()
 def client() -> Generator:
     yield TestClient(app)
@@ -28,8 +50,15 @@ async def db() -> AsyncGenerator:
     await database.connect()
     await database.execute(comment_table.delete())
     await database.execute(like_table.delete())
+    await database.execute(timeline_table.delete())
+    await database.execute(follow_table.delete())
     await database.execute(post_table.delete())
     await database.execute(user_table.delete())
+    await database.execute(outbound_email_table.delete())
+    security.token_cache.clear()
+    security.user_cache.clear()
+    await feed_cache.clear()
+    await rate_limiter.clear()
     yield
     await database.disconnect()
 
@@ -59,14 +88,62 @@ async def logged_in_token(async_client, confirmed_user: dict) -> str:
     response = await async_client.post("/token", data={"username": confirmed_user["email"], "password": confirmed_user["password"]})
     return response.json()["access_token"]
 
+async def create_post(body: str, async_client: AsyncClient, logged_in_token: str) -> dict:
+    response = await async_client.post(
+        "/post",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        json={"body": body},
+    )
+    return response.json()
+
+async def like_post(async_client: AsyncClient, post_id: int, logged_in_token: str):
+    response = await async_client.post(
+        "/like",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        json={"post_id": post_id},
+    )
+    return response
+
+
+@pytest.fixture()
+async def created_post(async_client: AsyncClient, logged_in_token: str):
+    return await create_post("Test Post", async_client, logged_in_token)
+
+@pytest.fixture()
+async def created_comment(async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    return await create_comment("Test Comment", async_client, created_post, logged_in_token)
+
+async def create_comment(body: str, async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    response = await async_client.post(
+        "/comment",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        json={"body": body, "post_id": created_post["id"]},
+    )
+    return response.json()
+
+
 @pytest.fixture(autouse=True)
 async def mock_httpx_client(mocker):
-    mocked_client = mocker.patch("api.tasks.httpx.AsyncClient")
     mocked_async_client = Mock()
     response = Response(status_code=200, content="")
     response.raise_for_status = Mock()
     response.content = b"Mock response content"
     mocked_async_client.post = AsyncMock(return_value=response)
-    mocked_client.return_value.__aenter__.return_value = mocked_async_client
+    mocker.patch("api.tasks.get_http_client", return_value=mocked_async_client)
     
-    return mocked_async_client
\ No newline at end of file
+    return mocked_async_client
+
+
+@pytest.fixture()
+async def pooled_database(tmp_path) -> AsyncGenerator:
+    """A pooled SQLite database of its own, migrated, with user 1."""
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(url)
+    upgrade(engine)
+    engine.dispose()
+    pragmas = {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000}
+    pooled = Database(url, min_size=1, max_size=3, max_lifetime=60, pragmas=pragmas)
+    await pooled.connect()
+    await pooled.execute(user_table.insert().values(id=1, email="test@test.com", password="x", confirmed=True))
+    yield pooled
+    await pooled.disconnect()
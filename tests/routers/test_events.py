@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from api.events import EventHub, event_hub
+from api.main import app
+from api.routers.events import TRY_AGAIN_LATER, event_stream
+from tests.conftest import create_comment, create_post, like_post
+
+
+class WebSocketClient:
+    """Drives the app's WebSocket endpoint in the test's event loop, where the HTTP client and database run too."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.to_app: asyncio.Queue = asyncio.Queue()
+        self.from_app: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self) -> "WebSocketClient":
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+            "scheme": "ws",
+            "server": ("test", 80),
+            "client": ("test", 50000),
+            "subprotocols": [],
+        }
+        self.to_app.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(app(scope, self.to_app.get, self.from_app.put))
+        assert (await self.receive())["type"] == "websocket.accept"
+        return self
+
+    async def receive(self) -> dict:
+        return await asyncio.wait_for(self.from_app.get(), 1)
+
+    async def receive_json(self) -> dict:
+        return json.loads((await self.receive())["text"])
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.to_app.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 1)
+
+
+@pytest.mark.anyio
+async def test_websocket_receives_writes(async_client: AsyncClient, logged_in_token: str, confirmed_user: dict):
+    async with WebSocketClient("/ws/events") as websocket:
+        post = await create_post("Live post", async_client, logged_in_token)
+        assert await websocket.receive_json() == {
+            "type": "post",
+            "data": {
+                "body": "Live post", "user_id": confirmed_user["id"], "id": post["id"], "likes": 0,
+                "image_url": None, "thumbnails": None,
+            },
+        }
+        comment = await create_comment("Live comment", async_client, post, logged_in_token)
+        assert await websocket.receive_json() == {"type": "comment", "data": comment}
+        await like_post(async_client, post["id"], logged_in_token)
+        assert await websocket.receive_json() == {"type": "likes", "data": {"post_id": post["id"], "likes": 1}}
+        await async_client.delete(f"/like/{post['id']}", headers={"Authorization": f"Bearer {logged_in_token}"})
+        assert await websocket.receive_json() == {"type": "likes", "data": {"post_id": post["id"], "likes": 0}}
+    assert event_hub.subscribers == set()
+
+
+@pytest.mark.anyio
+async def test_websocket_receives_batch_writes(async_client: AsyncClient, logged_in_token: str, confirmed_user: dict):
+    headers = {"Authorization": f"Bearer {logged_in_token}"}
+    existing = await create_post("Existing post", async_client, logged_in_token)
+    async with WebSocketClient("/ws/events") as websocket:
+        await async_client.post("/post/batch", headers=headers, json=[{"body": "Post 1"}, {"body": "Post 2"}])
+        posts = [await websocket.receive_json(), await websocket.receive_json()]
+        assert [(event["type"], event["data"]["body"]) for event in posts] == [("post", "Post 1"), ("post", "Post 2")]
+        assert posts[0]["data"]["id"] > existing["id"]
+        assert posts[0]["data"]["user_id"] == confirmed_user["id"]
+
+        post_id = posts[0]["data"]["id"]
+        await async_client.post(
+            "/comment/batch", headers=headers, json=[{"body": "Comment", "post_id": post_id}, {"body": "x", "post_id": 999}]
+        )
+        comment = await websocket.receive_json()
+        assert comment["type"] == "comment"
+        assert comment["data"] == {"body": "Comment", "post_id": post_id, "user_id": confirmed_user["id"], "id": comment["data"]["id"]}
+
+        await async_client.post("/like/batch", headers=headers, json=[{"post_id": post_id}, {"post_id": existing["id"]}])
+        likes = [await websocket.receive_json(), await websocket.receive_json()]
+        assert sorted(event["data"]["post_id"] for event in likes) == sorted([post_id, existing["id"]])
+        assert {event["data"]["likes"] for event in likes} == {1}
+        assert websocket.from_app.empty()
+
+
+@pytest.mark.anyio
+async def test_slow_websocket_is_closed(mocker):
+    mocker.patch.object(event_hub, "buffer_size", 2)
+    async with WebSocketClient("/ws/events") as websocket:
+        # Published before the endpoint gets to send any of them.
+        for i in range(3):
+            event_hub.publish_post({"id": i})
+        message = await websocket.receive()
+        assert message["type"] == "websocket.close" and message["code"] == TRY_AGAIN_LATER
+    assert event_hub.subscribers == set()
+
+
+@pytest.mark.anyio
+async def test_server_sent_events():
+    hub = EventHub(buffer_size=10)
+    stream = event_stream(hub, heartbeat=0.01)
+    assert await anext(stream) == b"retry: 1000\n\n"
+    assert await anext(stream) == b": keepalive\n\n"
+    hub.publish_likes(1, 5)
+    assert await anext(stream) == b'data: {"type":"likes","data":{"post_id":1,"likes":5}}\n\n'
+    await stream.aclose()
+    assert hub.subscribers == set()
+
+
+@pytest.mark.anyio
+async def test_events_endpoint_is_an_event_stream(async_client: AsyncClient, mocker):
+    # The test client reads whole responses, so the endless stream is swapped for a finite one.
+    mocker.patch("api.routers.events.event_stream", return_value=iter([b"retry: 1000\n\n"]))
+    response = await async_client.get("/events")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == "retry: 1000\n\n"
@@ -0,0 +1,52 @@
+import gzip
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from tests.conftest import create_comment, create_post, like_post
+
+
+@pytest.fixture()
+async def content(async_client: AsyncClient, logged_in_token: str):
+    post = await create_post("Test Post", async_client, logged_in_token)
+    await create_comment("Test Comment", async_client, post, logged_in_token)
+    await like_post(async_client, post["id"], logged_in_token)
+    return post
+
+
+def parse_ndjson(data: bytes) -> list[dict]:
+    return [json.loads(line) for line in data.splitlines()]
+
+
+@pytest.mark.anyio
+async def test_export(async_client: AsyncClient, logged_in_token: str, content: dict):
+    response = await async_client.get("/export", headers={"Authorization": f"Bearer {logged_in_token}"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = parse_ndjson(response.content)
+    assert [record["table"] for record in records] == ["posts", "comments", "likes"]
+    assert records[0]["data"]["body"] == "Test Post"
+    assert records[1]["data"]["post_id"] == content["id"]
+
+
+@pytest.mark.anyio
+async def test_export_selected_tables_gzip(async_client: AsyncClient, logged_in_token: str, content: dict):
+    response = await async_client.get(
+        "/export?tables=likes&gzip=true", headers={"Authorization": f"Bearer {logged_in_token}"}
+    )
+    assert response.status_code == 200
+    records = parse_ndjson(gzip.decompress(response.content))
+    assert [record["table"] for record in records] == ["likes"]
+
+
+@pytest.mark.anyio
+async def test_export_unknown_table(async_client: AsyncClient, logged_in_token: str):
+    response = await async_client.get("/export?tables=users", headers={"Authorization": f"Bearer {logged_in_token}"})
+    assert response.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_export_requires_authentication(async_client: AsyncClient):
+    response = await async_client.get("/export")
+    assert response.status_code == 401
@@ -0,0 +1,39 @@
+import pytest
+from httpx import AsyncClient
+
+from api.metrics import db_query_duration_seconds, http_request_duration_seconds, http_requests_total
+
+
+@pytest.mark.anyio
+async def test_requests_counted_by_route_template(async_client: AsyncClient, created_post: dict):
+    before = http_requests_total.get("GET", "/post/{post_id}", 200)
+    await async_client.get(f"/post/{created_post['id']}")
+    await async_client.get("/post/999")
+    assert http_requests_total.get("GET", "/post/{post_id}", 200) == before + 1
+    assert http_requests_total.get("GET", "/post/{post_id}", 404) >= 1
+    assert http_request_duration_seconds.count("GET", "/post/{post_id}") >= 2
+
+
+@pytest.mark.anyio
+async def test_unmatched_paths_share_a_label(async_client: AsyncClient):
+    before = http_requests_total.get("GET", "<unmatched>", 404)
+    await async_client.get("/nope/1")
+    await async_client.get("/nope/2")
+    assert http_requests_total.get("GET", "<unmatched>", 404) == before + 2
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint(async_client: AsyncClient, created_post: dict):
+    before = db_query_duration_seconds.count("select_posts_new")
+    await async_client.get("/posts")
+    assert db_query_duration_seconds.count("select_posts_new") == before + 1
+
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/posts",status="200"}' in body
+    assert 'db_query_duration_seconds_bucket{query="select_posts_new",le="+Inf"}' in body
+    assert 'http_requests_in_progress{method="GET",route="/metrics"} 1' in body
+    assert 'app_cache{cache="feed",stat="misses"}' in body
+    assert 'app_executor{executor="password",stat="max_workers"}' in body
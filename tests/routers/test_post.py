@@ -1,41 +1,19 @@
+import io
+import time
+
 import pytest
 from httpx import AsyncClient
+from PIL import Image
+from sqlalchemy import select
 
 from api import security
-
-
-async def create_post(body: str, async_client: AsyncClient, logged_in_token: str) -> dict:
-    response = await async_client.post(
-        "/post",
-        headers={"Authorization": f"Bearer {logged_in_token}"},
-        json={"body": body},
-    )
-    return response.json()
-
-async def like_post(async_client: AsyncClient, post_id: int, logged_in_token: str):
-    response = await async_client.post(
-        "/like",
-        headers={"Authorization": f"Bearer {logged_in_token}"},
-        json={"post_id": post_id},
-    )
-    return response
-
-
-@pytest.fixture()
-async def created_post(async_client: AsyncClient, logged_in_token: str):
-    return await create_post("Test Post", async_client, logged_in_token)
-
-@pytest.fixture()
-async def created_comment(async_client: AsyncClient, created_post: dict, logged_in_token: str):
-    return await create_comment("Test Comment", async_client, created_post, logged_in_token)
-
-async def create_comment(body: str, async_client: AsyncClient, created_post: dict, logged_in_token: str):
-    response = await async_client.post(
-        "/comment",
-        headers={"Authorization": f"Bearer {logged_in_token}"},
-        json={"body": body, "post_id": created_post["id"]},
-    )
-    return response.json()
+from api.config import config
+from api.database import database, post_table, user_table
+from api.feed_cache import feed_cache
+from api.main import app
+from api.rate_limit import Budget, rate_limiter
+from api.storage import LocalStorage, get_storage
+from tests.conftest import create_comment, create_post, like_post
 
 
 @pytest.mark.anyio
@@ -114,6 +92,92 @@ async def test_get_all_posts_sorting_by_likes(async_client: AsyncClient, logged_
     post_ids = [post["id"] for post in posts]
     assert post_ids == [1, 2]
     
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "sorting,expected_pages", [
+        ("new", [[3, 2], [1]]),
+        ("old", [[1, 2], [3]]),
+        ("most_likes", [[2, 3], [1]]),
+    ]
+)
+async def test_get_posts_paginated(async_client: AsyncClient, logged_in_token: str, sorting: str, expected_pages: list[list[int]]):
+    for body in ("Test Post 1", "Test Post 2", "Test Post 3"):
+        await create_post(body, async_client, logged_in_token)
+    await like_post(async_client, 2, logged_in_token)
+    response = await async_client.get(f"/posts?sorting={sorting}&limit=2")
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()] == expected_pages[0]
+    cursor = response.headers["X-Next-Cursor"]
+    response = await async_client.get(f"/posts?sorting={sorting}&limit=2&cursor={cursor}")
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()] == expected_pages[1]
+    assert "X-Next-Cursor" not in response.headers
+
+@pytest.mark.anyio
+async def test_get_posts_invalid_cursor(async_client: AsyncClient, logged_in_token: str):
+    await create_post("Test Post 1", async_client, logged_in_token)
+    await create_post("Test Post 2", async_client, logged_in_token)
+    cursor = (await async_client.get("/posts?sorting=new&limit=1")).headers["X-Next-Cursor"]
+    response = await async_client.get(f"/posts?sorting=most_likes&cursor={cursor}")
+    assert response.status_code == 400
+    response = await async_client.get("/posts?cursor=garbage")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+@pytest.mark.anyio
+async def test_get_posts_limit_out_of_range(async_client: AsyncClient):
+    response = await async_client.get("/posts?limit=0")
+    assert response.status_code == 422
+    response = await async_client.get("/posts?limit=1000")
+    assert response.status_code == 422
+
+@pytest.mark.anyio
+async def test_get_posts_cached_until_write(async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    await async_client.get("/posts")
+    await async_client.get("/posts")
+    assert feed_cache.stats()["hits"] == 1
+    await like_post(async_client, created_post["id"], logged_in_token)
+    response = await async_client.get("/posts")
+    assert response.json()[0]["likes"] == 1
+
+@pytest.mark.anyio
+async def test_get_posts_rate_limited_per_user(async_client: AsyncClient, logged_in_token: str, mocker):
+    mocker.patch.dict(rate_limiter.budgets, {"read": Budget(2, 60)})
+    headers = {"Authorization": f"Bearer {logged_in_token}"}
+    assert [(await async_client.get("/posts", headers=headers)).status_code for _ in range(3)] == [200, 200, 429]
+    # Anonymous callers are counted by address, apart from the user.
+    assert (await async_client.get("/posts")).status_code == 200
+
+@pytest.mark.anyio
+async def test_get_posts_not_modified(async_client: AsyncClient, created_post: dict, logged_in_token: str, mocker):
+    response = await async_client.get("/posts")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"].startswith("public, max-age=0, s-maxage=")
+    assert response.headers["Vary"] == "Authorization"
+    page_loads = mocker.spy(feed_cache, "get_or_load")
+
+    not_modified = await async_client.get("/posts", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+    # Last-Modified is sent once the second of the change has passed.
+    mocker.patch("api.conditional.time").time.return_value = time.time() + 1
+    last_modified = (await async_client.get("/posts", headers={"If-None-Match": etag})).headers["Last-Modified"]
+    not_modified = await async_client.get("/posts", headers={"If-Modified-Since": last_modified})
+    assert not_modified.status_code == 304
+    assert page_loads.call_count == 0
+
+    await like_post(async_client, created_post["id"], logged_in_token)
+    response = await async_client.get("/posts", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["likes"] == 1
+
+@pytest.mark.anyio
+async def test_get_posts_authenticated_not_cached_by_cdn(async_client: AsyncClient, logged_in_token: str):
+    response = await async_client.get("/posts", headers={"Authorization": f"Bearer {logged_in_token}"})
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
 @pytest.mark.anyio
 async def test_get_all_posts_wrong_sorting(async_client: AsyncClient):
     response = await async_client.get("/posts?sorting=wrong")
@@ -174,6 +238,56 @@ async def test_get_post_with_comments(
     assert data["comments"][0]["id"] == created_comment["id"]
 
 
+@pytest.mark.anyio
+async def test_get_post_with_comments_single_query(
+    async_client: AsyncClient, created_post: dict, created_comment: dict, mocker
+):
+    spies = {method: mocker.spy(database, method) for method in ("fetch_one", "fetch_all", "fetch_val", "execute")}
+    response = await async_client.get(f"/post/{created_post['id']}")
+    assert response.status_code == 200
+    # The content version lookup, then the post and its comments in one query.
+    assert {method: spy.call_count for method, spy in spies.items()} == {
+        "fetch_one": 0, "fetch_all": 1, "fetch_val": 1, "execute": 0
+    }
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("path", ["/post/{post_id}", "/post/{post_id}/comments"])
+async def test_get_comments_paginated(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str, path: str
+):
+    comments = [await create_comment(f"Comment {i}", async_client, created_post, logged_in_token) for i in range(3)]
+    url = path.format(post_id=created_post["id"])
+    response = await async_client.get(f"{url}?limit=2")
+    page = response.json() if isinstance(response.json(), list) else response.json()["comments"]
+    assert [comment["id"] for comment in page] == [comments[0]["id"], comments[1]["id"]]
+    response = await async_client.get(f"{url}?limit=2&cursor={response.headers['X-Next-Cursor']}")
+    page = response.json() if isinstance(response.json(), list) else response.json()["comments"]
+    assert [comment["id"] for comment in page] == [comments[2]["id"]]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_get_post_with_comments_not_modified(async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    url = f"/post/{created_post['id']}"
+    etag = (await async_client.get(url)).headers["ETag"]
+    feed_etag = (await async_client.get("/posts")).headers["ETag"]
+    assert (await async_client.get(url, headers={"If-None-Match": etag})).status_code == 304
+    assert (await async_client.get(f"{url}/comments", headers={"If-None-Match": etag})).status_code == 304
+
+    await create_comment("Test Comment", async_client, created_post, logged_in_token)
+    response = await async_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()["comments"]) == 1
+    # The feed shows no comments, so its copy is still current.
+    assert (await async_client.get("/posts", headers={"If-None-Match": feed_etag})).status_code == 304
+
+@pytest.mark.anyio
+async def test_get_comments_missing_post(async_client: AsyncClient):
+    response = await async_client.get("/post/999/comments")
+    assert response.status_code == 404
+
+
 @pytest.mark.anyio
 async def test_get_missing_post_with_comments(
     async_client: AsyncClient, created_post: dict, created_comment: dict
@@ -191,8 +305,213 @@ async def test_like_post(async_client: AsyncClient, created_post: dict, logged_i
     assert "id" in data
     assert isinstance(data["id"], int)
     
+@pytest.mark.anyio
+async def test_like_post_updates_like_count(async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    await like_post(async_client, created_post["id"], logged_in_token)
+    response = await async_client.get(f"/post/{created_post['id']}")
+    assert response.json()["post"]["likes"] == 1
+
+@pytest.mark.anyio
+async def test_like_post_twice(async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    await like_post(async_client, created_post["id"], logged_in_token)
+    response = await like_post(async_client, created_post["id"], logged_in_token)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Post already liked"
+
+@pytest.mark.anyio
+async def test_unlike_post(async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    await like_post(async_client, created_post["id"], logged_in_token)
+    response = await async_client.delete(
+        f"/like/{created_post['id']}", headers={"Authorization": f"Bearer {logged_in_token}"}
+    )
+    assert response.status_code == 204
+    response = await async_client.get(f"/post/{created_post['id']}")
+    assert response.json()["post"]["likes"] == 0
+
+@pytest.mark.anyio
+async def test_unlike_post_not_liked(async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    response = await async_client.delete(
+        f"/like/{created_post['id']}", headers={"Authorization": f"Bearer {logged_in_token}"}
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Like not found"
+
 @pytest.mark.anyio
 async def test_like_post_missing_post(async_client: AsyncClient, logged_in_token: str):
     response = await like_post(async_client, 999, logged_in_token)
     assert response.status_code == 404
-    assert response.json()["detail"] == "Post not found"
\ No newline at end of file
+    assert response.json()["detail"] == "Post not found"
+
+@pytest.mark.anyio
+async def test_create_posts_batch(async_client: AsyncClient, logged_in_token: str):
+    response = await async_client.post(
+        "/post/batch",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        json=[{"body": "Post 1"}, {"body": "Post 2"}],
+    )
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()] == [201, 201]
+    posts = (await async_client.get("/posts?sorting=old")).json()
+    assert [post["body"] for post in posts] == ["Post 1", "Post 2"]
+    assert [item["id"] for item in response.json()] == [post["id"] for post in posts]
+
+
+@pytest.mark.anyio
+async def test_create_posts_batch_in_chunks(async_client: AsyncClient, logged_in_token: str, mocker):
+    mocker.patch("api.database.ROWS_PER_STATEMENT", 2)
+    execute = mocker.spy(database, "execute")
+    response = await async_client.post(
+        "/post/batch",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        json=[{"body": f"Post {i}"} for i in range(5)],
+    )
+    assert [item["status"] for item in response.json()] == [201] * 5
+    inserts = [call.args[0] for call in execute.call_args_list if str(call.args[0]).startswith("INSERT INTO posts")]
+    assert len(inserts) == 3
+    posts = (await async_client.get("/posts?sorting=old")).json()
+    assert [post["body"] for post in posts] == [f"Post {i}" for i in range(5)]
+
+
+@pytest.mark.anyio
+async def test_create_posts_batch_too_large(async_client: AsyncClient, logged_in_token: str):
+    response = await async_client.post(
+        "/post/batch",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        json=[{"body": "Post"}] * 501,
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_create_comments_batch(async_client: AsyncClient, created_post: dict, logged_in_token: str):
+    response = await async_client.post(
+        "/comment/batch",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        json=[{"body": "Comment", "post_id": created_post["id"]}, {"body": "Comment", "post_id": 999}],
+    )
+    assert response.status_code == 200
+    comments = (await async_client.get(f"/post/{created_post['id']}/comments")).json()
+    assert len(comments) == 1
+    assert response.json() == [
+        {"index": 0, "status": 201, "id": comments[0]["id"], "detail": None},
+        {"index": 1, "status": 404, "id": None, "detail": "Post not found"},
+    ]
+
+
+@pytest.mark.anyio
+async def test_like_posts_batch(async_client: AsyncClient, logged_in_token: str):
+    await create_post("Test Post 1", async_client, logged_in_token)
+    await create_post("Test Post 2", async_client, logged_in_token)
+    await like_post(async_client, 1, logged_in_token)
+    response = await async_client.post(
+        "/like/batch",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        json=[{"post_id": 1}, {"post_id": 2}, {"post_id": 2}, {"post_id": 999}],
+    )
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()] == [409, 201, 409, 404]
+    posts = (await async_client.get("/posts?sorting=old")).json()
+    assert [post["likes"] for post in posts] == [1, 1]
+
+
+@pytest.fixture()
+def media_storage(tmp_path):
+    storage = LocalStorage(tmp_path, "/media")
+    app.dependency_overrides[get_storage] = lambda: storage
+    yield storage
+    del app.dependency_overrides[get_storage]
+
+async def upload_media(async_client: AsyncClient, post_id: int, logged_in_token: str, files: dict):
+    return await async_client.post(
+        f"/post/{post_id}/media",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        files=files,
+    )
+
+
+@pytest.mark.anyio
+async def test_upload_post_media(async_client: AsyncClient, created_post: dict, logged_in_token: str, media_storage):
+    content = bytes(range(256)) * 1000
+    response = await upload_media(
+        async_client, created_post["id"], logged_in_token, {"file": ("photo.PNG", content, "image/png")}
+    )
+    assert response.status_code == 201
+    image_url = response.json()["image_url"]
+    assert response.json()["post_id"] == created_post["id"]
+    assert image_url.startswith(f"/media/posts/{created_post['id']}/") and image_url.endswith(".png")
+    assert (media_storage.root / image_url.removeprefix("/media/")).read_bytes() == content
+    row = await database.fetch_one(select(post_table.c.image_url).where(post_table.c.id == created_post["id"]))
+    assert row["image_url"] == image_url
+
+@pytest.mark.anyio
+async def test_upload_post_media_ignores_other_fields(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str, media_storage
+):
+    response = await async_client.post(
+        f"/post/{created_post['id']}/media",
+        headers={"Authorization": f"Bearer {logged_in_token}"},
+        data={"caption": "A photo"},
+        files={"other": ("a.png", b"other", "image/png"), "file": ("b.png", b"image", "image/png")},
+    )
+    assert response.status_code == 201
+    assert (media_storage.root / response.json()["image_url"].removeprefix("/media/")).read_bytes() == b"image"
+
+@pytest.mark.anyio
+async def test_upload_post_media_errors(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str, media_storage, mocker
+):
+    image = {"file": ("photo.png", b"x" * 100, "image/png")}
+    assert (await upload_media(async_client, 999, logged_in_token, image)).status_code == 404
+    text_file = {"file": ("notes.txt", b"hello", "text/plain")}
+    assert (await upload_media(async_client, created_post["id"], logged_in_token, text_file)).status_code == 415
+    no_file = {"image": ("photo.png", b"x", "image/png")}
+    assert (await upload_media(async_client, created_post["id"], logged_in_token, no_file)).status_code == 400
+    mocker.patch.object(config, "MEDIA_MAX_BYTES", 99)
+    assert (await upload_media(async_client, created_post["id"], logged_in_token, image)).status_code == 413
+    assert list(media_storage.root.iterdir()) == []
+
+@pytest.mark.anyio
+async def test_upload_media_to_other_users_post(async_client: AsyncClient, logged_in_token: str, media_storage):
+    other_id = await database.execute(user_table.insert().values(email="other@test.com", password="x", confirmed=True))
+    post_id = await database.execute(post_table.insert().values(body="Not yours", user_id=other_id))
+    response = await upload_media(async_client, post_id, logged_in_token, {"file": ("a.png", b"x", "image/png")})
+    assert response.status_code == 403
+
+def png_bytes(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "blue").save(buffer, "PNG")
+    return buffer.getvalue()
+
+@pytest.mark.anyio
+async def test_upload_post_media_creates_thumbnails(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str, media_storage, mocker
+):
+    mocker.patch.object(config, "THUMBNAIL_SIZES", [100, 400])
+    response = await upload_media(
+        async_client, created_post["id"], logged_in_token, {"file": ("photo.png", png_bytes(800, 600), "image/png")}
+    )
+    image_url = response.json()["image_url"]
+
+    # The thumbnails are made by a background task, which has finished once the test client has the response.
+    post = (await async_client.get(f"/post/{created_post['id']}")).json()["post"]
+    assert post["image_url"] == image_url
+    stem = image_url.removesuffix(".png")
+    assert post["thumbnails"] == [
+        {"size": 100, "width": 100, "height": 75, "url": f"{stem}_100.jpg"},
+        {"size": 400, "width": 400, "height": 300, "url": f"{stem}_400.jpg"},
+    ]
+    assert (media_storage.root / f"{stem}_400.jpg".removeprefix("/media/")).exists()
+    (feed_post,) = (await async_client.get("/posts")).json()
+    assert feed_post["thumbnails"] == post["thumbnails"]
+
+@pytest.mark.anyio
+async def test_upload_post_media_unreadable_image(
+    async_client: AsyncClient, created_post: dict, logged_in_token: str, media_storage
+):
+    response = await upload_media(
+        async_client, created_post["id"], logged_in_token, {"file": ("photo.png", b"not a png", "image/png")}
+    )
+    assert response.status_code == 201
+    post = (await async_client.get(f"/post/{created_post['id']}")).json()["post"]
+    assert post["image_url"] == response.json()["image_url"]
+    assert post["thumbnails"] is None
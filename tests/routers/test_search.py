@@ -0,0 +1,91 @@
+import pytest
+from httpx import AsyncClient
+
+from api.database import comment_table, database, post_table
+from api.pagination import NEXT_CURSOR_HEADER
+from tests.conftest import create_comment, create_post
+
+
+@pytest.fixture()
+async def content(async_client: AsyncClient, logged_in_token: str):
+    post = await create_post("Learning python the hard way", async_client, logged_in_token)
+    await create_comment("Python is great", async_client, post, logged_in_token)
+    await create_post("Rust for pythonistas", async_client, logged_in_token)
+    return post
+
+
+@pytest.mark.anyio
+async def test_search_posts_and_comments(async_client: AsyncClient, content: dict):
+    response = await async_client.get("/search", params={"q": "python"})
+    assert response.status_code == 200
+    hits = response.json()
+    assert {(hit["kind"], hit["body"]) for hit in hits} == {
+        ("post", "Learning python the hard way"),
+        ("comment", "Python is great"),
+    }
+    assert all(hit["post_id"] == content["id"] for hit in hits)
+
+
+@pytest.mark.anyio
+async def test_search_kind(async_client: AsyncClient, content: dict):
+    response = await async_client.get("/search", params={"q": "python", "kind": "comment"})
+    assert [hit["body"] for hit in response.json()] == ["Python is great"]
+
+
+@pytest.mark.anyio
+async def test_search_prefix(async_client: AsyncClient, content: dict):
+    response = await async_client.get("/search", params={"q": "pyth*"})
+    assert len(response.json()) == 3
+
+
+@pytest.mark.anyio
+async def test_search_ranked(async_client: AsyncClient, logged_in_token: str):
+    await create_post("cats and dogs", async_client, logged_in_token)
+    await create_post("cats cats cats", async_client, logged_in_token)
+    response = await async_client.get("/search", params={"q": "cats"})
+    assert [hit["body"] for hit in response.json()] == ["cats cats cats", "cats and dogs"]
+
+
+@pytest.mark.anyio
+async def test_search_operators_are_plain_text(async_client: AsyncClient, content: dict):
+    response = await async_client.get("/search", params={"q": 'python OR "NEAR(rust'})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.anyio
+async def test_search_no_terms(async_client: AsyncClient, content: dict):
+    response = await async_client.get("/search", params={"q": "!!!"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.anyio
+async def test_search_pagination(async_client: AsyncClient, logged_in_token: str):
+    for i in range(5):
+        await create_post(f"page {i}", async_client, logged_in_token)
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": "page", "limit": 2} | ({"cursor": cursor} if cursor else {})
+        response = await async_client.get("/search", params=params)
+        seen += [hit["id"] for hit in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(set(seen))
+    assert len(seen) == 5
+
+
+@pytest.mark.anyio
+async def test_search_invalid_cursor(async_client: AsyncClient, content: dict):
+    response = await async_client.get("/search", params={"q": "python", "cursor": "nope"})
+    assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_search_index_follows_updates_and_deletes(async_client: AsyncClient, content: dict):
+    await database.execute(post_table.update().where(post_table.c.id == content["id"]).values(body="renamed"))
+    await database.execute(comment_table.delete())
+    response = await async_client.get("/search", params={"q": "pyth*"})
+    assert [hit["body"] for hit in response.json()] == ["Rust for pythonistas"]
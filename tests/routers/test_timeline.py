@@ -0,0 +1,146 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from api.config import config
+from api.database import database, timeline_table, user_table
+from api.security import create_access_token
+from tests.conftest import create_post
+
+
+async def create_user(email: str) -> dict:
+    user_id = await database.execute(user_table.insert().values(email=email, password="x", confirmed=True))
+    return {"id": user_id, "email": email, "token": create_access_token(email)}
+
+
+def auth(user: dict) -> dict:
+    return {"Authorization": f"Bearer {user['token']}"}
+
+
+async def follow(async_client: AsyncClient, follower: dict, followee: dict):
+    return await async_client.post("/follow", headers=auth(follower), json={"user_id": followee["id"]})
+
+
+async def timeline(async_client: AsyncClient, user: dict, **params) -> list[str]:
+    response = await async_client.get("/timeline", headers=auth(user), params=params)
+    assert response.status_code == 200
+    return [post["body"] for post in response.json()]
+
+
+async def inbox(user: dict) -> list[int]:
+    rows = await database.fetch_all(select(timeline_table.c.post_id).where(timeline_table.c.user_id == user["id"]))
+    return sorted(row["post_id"] for row in rows)
+
+
+async def follower_count(user: dict) -> int:
+    return await database.fetch_val(select(user_table.c.follower_count).where(user_table.c.id == user["id"]))
+
+
+@pytest.fixture()
+async def alice():
+    return await create_user("alice@test.com")
+
+
+@pytest.fixture()
+async def bob():
+    return await create_user("bob@test.com")
+
+
+@pytest.mark.anyio
+async def test_follow_user(async_client: AsyncClient, alice: dict, bob: dict):
+    response = await follow(async_client, alice, bob)
+    assert response.status_code == 201
+    assert response.json() | {"id": 0} == {"id": 0, "follower_id": alice["id"], "followee_id": bob["id"]}
+    assert await follower_count(bob) == 1
+
+
+@pytest.mark.anyio
+async def test_follow_errors(async_client: AsyncClient, alice: dict, bob: dict):
+    assert (await follow(async_client, alice, alice)).status_code == 400
+    assert (await follow(async_client, alice, {"id": bob["id"] + 100})).status_code == 404
+    await follow(async_client, alice, bob)
+    response = await follow(async_client, alice, bob)
+    assert response.status_code == 409
+    assert await follower_count(bob) == 1
+
+
+@pytest.mark.anyio
+async def test_unfollow_user(async_client: AsyncClient, alice: dict, bob: dict):
+    await follow(async_client, alice, bob)
+    await create_post("Bob's post", async_client, bob["token"])
+
+    response = await async_client.delete(f"/follow/{bob['id']}", headers=auth(alice))
+    assert response.status_code == 204
+    assert await follower_count(bob) == 0
+    assert await timeline(async_client, alice) == []
+
+    response = await async_client.delete(f"/follow/{bob['id']}", headers=auth(alice))
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_posts_fan_out_to_followers(async_client: AsyncClient, alice: dict, bob: dict):
+    carol = await create_user("carol@test.com")
+    await follow(async_client, alice, bob)
+    first = await create_post("Bob 1", async_client, bob["token"])
+    await create_post("Carol 1", async_client, carol["token"])
+    await create_post("Alice 1", async_client, alice["token"])
+    second = await create_post("Bob 2", async_client, bob["token"])
+
+    assert await inbox(alice) == [first["id"], second["id"]]
+    assert await timeline(async_client, alice) == ["Bob 2", "Bob 1"]
+    assert await timeline(async_client, carol) == []
+
+
+@pytest.mark.anyio
+async def test_follow_backfills_recent_posts(async_client: AsyncClient, alice: dict, bob: dict, mocker):
+    mocker.patch.object(config, "TIMELINE_BACKFILL_POSTS", 2)
+    for i in range(3):
+        await create_post(f"Bob {i}", async_client, bob["token"])
+    await follow(async_client, alice, bob)
+    assert await timeline(async_client, alice) == ["Bob 2", "Bob 1"]
+
+
+@pytest.mark.anyio
+async def test_timeline_pagination(async_client: AsyncClient, alice: dict, bob: dict):
+    await follow(async_client, alice, bob)
+    for i in range(5):
+        await create_post(f"Bob {i}", async_client, bob["token"])
+
+    bodies, cursor = [], None
+    while True:
+        params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+        response = await async_client.get("/timeline", headers=auth(alice), params=params)
+        bodies += [post["body"] for post in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert bodies == ["Bob 4", "Bob 3", "Bob 2", "Bob 1", "Bob 0"]
+
+
+@pytest.mark.anyio
+async def test_high_follower_accounts_are_read_on_demand(async_client: AsyncClient, alice: dict, bob: dict, mocker):
+    mocker.patch.object(config, "TIMELINE_FANOUT_MAX_FOLLOWERS", 1)
+    carol = await create_user("carol@test.com")
+    await follow(async_client, alice, bob)
+    before = await create_post("Bob 1", async_client, bob["token"])
+    await follow(async_client, carol, bob)
+    await create_post("Bob 2", async_client, bob["token"])
+
+    # Bob now has more followers than the limit: his new post is only in `posts`.
+    assert await inbox(alice) == [before["id"]]
+    assert await inbox(carol) == []
+    assert await timeline(async_client, alice) == ["Bob 2", "Bob 1"]
+    assert await timeline(async_client, carol) == ["Bob 2", "Bob 1"]
+    assert await timeline(async_client, alice, limit=1) == ["Bob 2"]
+
+    # Back at the limit, Bob's recent posts are copied into the remaining inboxes.
+    await async_client.delete(f"/follow/{bob['id']}", headers=auth(carol))
+    assert len(await inbox(alice)) == 2
+    assert await timeline(async_client, alice) == ["Bob 2", "Bob 1"]
+
+
+@pytest.mark.anyio
+async def test_timeline_requires_login(async_client: AsyncClient):
+    response = await async_client.get("/timeline")
+    assert response.status_code == 401
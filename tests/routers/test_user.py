@@ -1,7 +1,10 @@
-from fastapi import BackgroundTasks
+import asyncio
+
 import pytest
 
-from api import tasks
+from api import security, tasks
+from api.database import database, outbound_email_table
+from api.rate_limit import Budget, rate_limiter
 from api.security import create_confirmation_token
 
 @pytest.mark.anyio
@@ -14,6 +17,14 @@ async def test_register_user(async_client):
     assert response.status_code == 201
     assert "Please check your email for a confirmation link" in response.json()["detail"]
 
+@pytest.mark.anyio
+async def test_register_user_queues_confirmation_email(async_client):
+    await register_user(async_client, "test@test.com", "test")
+    (email,) = await database.fetch_all(outbound_email_table.select())
+    assert email["recipient"] == "test@test.com"
+    assert email["status"] == "pending"
+    assert "/confirm/" in email["body"]
+
 @pytest.mark.anyio
 async def test_register_user_already_exists(async_client, registered_user):
     response = await register_user(async_client, registered_user["email"], "test")
@@ -33,16 +44,39 @@ async def test_login_user_invalid_credentials(async_client):
     response = await async_client.post("/token", data={"username": "test@test.com", "password": "test"})
     assert response.status_code == 401
     assert "Invalid credentials" in response.json()["detail"]
+
+@pytest.mark.anyio
+async def test_login_rate_limited_under_concurrent_burst(async_client, confirmed_user, mocker):
+    mocker.patch.dict(rate_limiter.budgets, {"login": Budget(3, 60)})
+    spy = mocker.spy(security, "verify_password_async")
+    responses = await asyncio.gather(*(
+        async_client.post("/token", data={"username": confirmed_user["email"], "password": "wrong"}) for _ in range(8)
+    ))
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [401] * 3 + [429] * 5
+    # Refused before the password check, so the burst cost three bcrypt runs.
+    assert spy.call_count == 3
+    limited = next(response for response in responses if response.status_code == 429)
+    assert limited.json()["detail"] == "Too many requests"
+    assert limited.headers["Retry-After"] == "20"
     
 @pytest.mark.anyio
 async def test_confirm_email(async_client, mocker):
-    spy = mocker.spy(BackgroundTasks, "add_task")
+    spy = mocker.spy(tasks, "send_confirmation_email")
     await register_user(async_client, "test@test.com", "test")
     confirmation_url = str(spy.call_args[1]["confirmation_url"])
     response = await async_client.get(confirmation_url)
     assert response.status_code == 200
     assert "User confirmed successfully" in response.json()["detail"]
     
+@pytest.mark.anyio
+async def test_confirm_email_invalidates_cached_user(async_client, registered_user):
+    token = security.create_access_token(registered_user["email"])
+    assert not (await security.get_current_user(token)).confirmed
+    response = await async_client.get(f"/confirm/{create_confirmation_token(registered_user['email'])}")
+    assert response.status_code == 200
+    assert (await security.get_current_user(token)).confirmed
+
 @pytest.mark.anyio
 async def test_confirm_email_invalid_token(async_client):
     response = await async_client.get("/confirm/invalid_token")
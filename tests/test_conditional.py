@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import create_engine, text
+from starlette.requests import Request
+
+from api.conditional import FEED_VERSION_KEY, etag, is_not_modified, validator_headers
+from api.migrations import upgrade
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'versions.db'}")
+    upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, email, password, confirmed) VALUES (1, 'a@b.c', 'x', 1)"))
+        conn.execute(text("INSERT INTO posts (id, body, user_id) VALUES (1, 'Post 1', 1), (2, 'Post 2', 1)"))
+    yield engine
+    engine.dispose()
+
+
+def versions(engine) -> dict[int, int]:
+    with engine.connect() as conn:
+        return dict(conn.execute(text("SELECT post_id, version FROM content_versions")).all())
+
+
+def request_with(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+@pytest.mark.parametrize(
+    "statement, post_changed, feed_changed",
+    [
+        ("UPDATE posts SET like_count = like_count + 1 WHERE id = 1", True, True),
+        ("UPDATE posts SET image_url = 'https://cdn/1.jpg' WHERE id = 1", True, True),
+        ("INSERT INTO comments (body, post_id, user_id) VALUES ('Comment', 1, 1)", True, False),
+        ("UPDATE posts SET user_id = 1 WHERE id = 1", False, False),
+    ],
+)
+def test_writes_bump_versions(engine, statement: str, post_changed: bool, feed_changed: bool):
+    before = versions(engine)
+    with engine.begin() as conn:
+        conn.execute(text(statement))
+    after = versions(engine)
+    assert (after[1] > before[1]) is post_changed
+    assert after[1] >= before[1]
+    assert (after[FEED_VERSION_KEY] > before[FEED_VERSION_KEY]) is feed_changed
+    assert after[2] == before[2]
+
+
+def test_versions_grow_within_one_statement(engine):
+    before = versions(engine)
+    with engine.begin() as conn:
+        # Both rows are updated at the same 'now', so the feed version is bumped twice past it.
+        conn.execute(text("UPDATE posts SET like_count = 5"))
+    after = versions(engine)
+    assert after[FEED_VERSION_KEY] >= before[FEED_VERSION_KEY] + 2
+
+
+def test_new_and_deleted_posts(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO posts (id, body, user_id) VALUES (3, 'Post 3', 1)"))
+    assert 3 in versions(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM posts WHERE id = 3"))
+    assert 3 not in versions(engine)
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({}, False),
+        ({"if_none_match": etag(0x1234)}, True),
+        ({"if_none_match": f'"abc", W/{etag(0x1234)}'}, True),
+        ({"if_none_match": "*"}, True),
+        ({"if_none_match": '"abc"'}, False),
+        # 0x1234 microseconds is within the first second of the epoch, so it was last modified at its end.
+        ({"if_modified_since": "Thu, 01 Jan 1970 00:00:01 GMT"}, True),
+        ({"if_modified_since": "Thu, 01 Jan 1970 00:00:00 GMT"}, False),
+        ({"if_modified_since": "not a date"}, False),
+        # If-None-Match takes precedence.
+        ({"if_none_match": '"abc"', "if_modified_since": "Thu, 01 Jan 1970 00:00:01 GMT"}, False),
+    ],
+)
+def test_is_not_modified(headers: dict, expected: bool):
+    assert is_not_modified(request_with(**headers), 0x1234) is expected
+
+
+def test_last_modified_only_once_its_second_has_passed(mocker):
+    version = 1_700_000_000_250_000
+    clock = mocker.patch("api.conditional.time")
+    clock.time.return_value = 1_700_000_000.5
+    assert "Last-Modified" not in validator_headers(request_with(), version)
+    clock.time.return_value = 1_700_000_001.0
+    assert validator_headers(request_with(), version)["Last-Modified"] == "Tue, 14 Nov 2023 22:13:21 GMT"
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from api.events import SLOW_CONSUMER, EventHub, SubscriptionClosed
+
+
+@pytest.mark.anyio
+async def test_publish_reaches_every_subscriber():
+    hub = EventHub(buffer_size=10)
+    first, second = hub.subscribe(), hub.subscribe()
+    hub.publish_post({"id": 1, "body": "Hello"})
+    first_event, second_event = await first.next(), await second.next()
+    # Encoded once for all subscribers.
+    assert first_event is second_event
+    assert json.loads(first_event.message) == {"type": "post", "data": {"id": 1, "body": "Hello"}}
+    assert first_event.sse == f"data: {first_event.message}\n\n".encode()
+
+
+@pytest.mark.anyio
+async def test_like_counts_are_coalesced():
+    hub = EventHub(buffer_size=10)
+    subscription = hub.subscribe()
+    hub.publish_likes(1, 1)
+    hub.publish_post({"id": 2})
+    hub.publish_likes(1, 2)
+    hub.publish_likes(3, 1)
+    hub.publish_likes(1, 3)
+    messages = [json.loads((await subscription.next()).message) for _ in range(3)]
+    assert messages == [
+        {"type": "likes", "data": {"post_id": 1, "likes": 3}},
+        {"type": "post", "data": {"id": 2}},
+        {"type": "likes", "data": {"post_id": 3, "likes": 1}},
+    ]
+    assert await subscription.next(timeout=0.01) is None
+    hub.publish_likes(1, 4)
+    assert json.loads((await subscription.next()).message)["data"] == {"post_id": 1, "likes": 4}
+    assert hub.stats() == {"subscribers": 1, "published": 6, "coalesced": 2, "slow_consumers": 0}
+
+
+@pytest.mark.anyio
+async def test_slow_consumer_is_disconnected():
+    hub = EventHub(buffer_size=3)
+    slow, fast = hub.subscribe(), hub.subscribe()
+    for i in range(3):
+        hub.publish_post({"id": i})
+        await fast.next()
+    hub.publish_post({"id": 3})
+    assert slow.closed_reason == SLOW_CONSUMER
+    assert hub.subscribers == {fast}
+    with pytest.raises(SubscriptionClosed):
+        await slow.next()
+    assert json.loads((await fast.next()).message)["data"] == {"id": 3}
+    assert hub.stats()["slow_consumers"] == 1
+
+
+@pytest.mark.anyio
+async def test_closing_unsubscribes():
+    hub = EventHub(buffer_size=3)
+    with hub.subscribe() as subscription:
+        assert hub.subscribers == {subscription}
+        assert await subscription.next(timeout=0.01) is None
+    assert hub.subscribers == set()
+    hub.publish_post({"id": 1})
+    with pytest.raises(SubscriptionClosed):
+        await subscription.next()
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from api.feed_cache import FeedCache, KeyValueFeedCacheBackend, MemoryFeedCacheBackend
+
+
+class FakeKeyValueClient:
+    """Stand-in for a shared key-value store with the redis.asyncio API."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+@pytest.fixture(params=["memory", "key_value"])
+def cache(request) -> FeedCache:
+    if request.param == "memory":
+        return FeedCache(MemoryFeedCacheBackend(maxsize=10, ttl=60), ttl=60)
+    return FeedCache(KeyValueFeedCacheBackend(FakeKeyValueClient()), ttl=60)
+
+
+def counting_loader(value):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return value
+
+    return load, calls
+
+
+@pytest.mark.anyio
+async def test_get_or_load_caches(cache: FeedCache):
+    load, calls = counting_loader({"posts": [1]})
+    assert await cache.get_or_load(("new", 20), load) == {"posts": [1]}
+    assert await cache.get_or_load(("new", 20), load) == {"posts": [1]}
+    assert len(calls) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "coalesced": 0, "invalidations": 0}
+
+
+@pytest.mark.anyio
+async def test_invalidate(cache: FeedCache):
+    load, calls = counting_loader({"posts": [1]})
+    await cache.get_or_load(("new", 20), load)
+    await cache.invalidate()
+    await cache.get_or_load(("new", 20), load)
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_are_coalesced(cache: FeedCache):
+    load, calls = counting_loader({"posts": [1]})
+    results = await asyncio.gather(*(cache.get_or_load(("new", 20), load) for _ in range(10)))
+    assert results == [{"posts": [1]}] * 10
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 9
+
+
+@pytest.mark.anyio
+async def test_loader_errors_are_not_cached(cache: FeedCache):
+    async def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_load(("new", 20), fail)
+    load, calls = counting_loader({"posts": []})
+    assert await cache.get_or_load(("new", 20), load) == {"posts": []}
+
+
+@pytest.mark.anyio
+async def test_disabled_cache_always_loads():
+    cache = FeedCache(MemoryFeedCacheBackend(maxsize=10, ttl=0), ttl=0)
+    load, calls = counting_loader({"posts": []})
+    await cache.get_or_load(("new", 20), load)
+    await cache.get_or_load(("new", 20), load)
+    assert len(calls) == 2
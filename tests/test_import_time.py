@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Cumulative `python -X importtime` time of `import api.main`, in microseconds.
+# Measured at about 0.6 s; the slack absorbs slow CI machines.
+IMPORT_TIME_BUDGET_US = 1_500_000
+
+
+def import_app(tmp_path: Path, code: str = "") -> subprocess.CompletedProcess:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "ENV_STATE": "test",
+        "TEST_DATABASE_URL": f"sqlite:///{tmp_path / 'app.db'}",
+    }
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import api.main\n{code}"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def test_import_time_budget(tmp_path):
+    result = import_app(tmp_path)
+    line = next(line for line in result.stderr.splitlines() if line.endswith("| api.main"))
+    cumulative = int(line.split("|")[1])
+    assert cumulative < IMPORT_TIME_BUDGET_US, f"importing api.main took {cumulative / 1000:.0f} ms"
+
+
+def test_import_has_no_side_effects(tmp_path):
+    result = import_app(tmp_path, "import sys, api.database\nprint(api.database.get_engine.cache_info().currsize, 'httpx' in sys.modules)")
+    assert result.stdout.split() == ["0", "False"]
+    assert not (tmp_path / "app.db").exists()
+
+
+def test_import_builds_no_settings(tmp_path):
+    code = (
+        "from api.config import current_config, get_config\n"
+        "from api.database import get_database\n"
+        "print(current_config.cache_info().misses, get_config.cache_info().misses, get_database.cache_info().misses)"
+    )
+    assert import_app(tmp_path, code).stdout.split() == ["0", "0", "0"]
@@ -0,0 +1,79 @@
+import gzip
+import json
+
+import pytest
+
+from api.database import comment_table, database, like_table, post_table, user_table
+from api.export import ExportTable, iterate_ndjson
+from api.importer import import_file
+
+RECORDS = [
+    {"table": "posts", "data": {"id": 1, "body": "Post 1", "user_id": 1, "like_count": 1}},
+    {"table": "posts", "data": {"body": "Post 2", "user_id": 1}},
+    {"table": "comments", "data": {"id": 1, "body": "Comment", "post_id": 1, "user_id": 1}},
+    {"table": "posts", "data": {"user_id": 1}},
+    {"table": "users", "data": {"email": "test@test.com"}},
+    {"table": "likes", "data": {"id": 1, "post_id": 1, "user_id": 1}},
+]
+
+
+def write_dump(path, records, compress=False):
+    data = "".join(json.dumps(record) + "\n" for record in records).encode()
+    path.write_bytes(gzip.compress(data) if compress else data)
+    return path
+
+
+async def count(table) -> int:
+    return len(await database.fetch_all(table.select()))
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("compress", [False, True])
+async def test_import_file(tmp_path, compress):
+    path = write_dump(tmp_path / "dump.ndjson", RECORDS, compress)
+    stats = await import_file(path, batch_size=2)
+    assert stats.imported == 4
+    assert stats.skipped == 2
+    assert stats.offset == len(gzip.decompress(path.read_bytes()) if compress else path.read_bytes())
+    assert await count(post_table) == 2
+    assert await count(comment_table) == 1
+    assert await count(like_table) == 1
+
+
+@pytest.mark.anyio
+async def test_import_file_resumes_from_checkpoint(tmp_path):
+    checkpoint = tmp_path / "dump.checkpoint"
+    path = write_dump(tmp_path / "dump.ndjson", RECORDS[:2])
+    stats = await import_file(path, batch_size=1, checkpoint=checkpoint)
+    assert stats.imported == 2
+
+    write_dump(path, RECORDS)
+    stats = await import_file(path, batch_size=1, checkpoint=checkpoint)
+    assert stats.imported == 4
+    assert await count(post_table) == 2
+    assert json.loads(checkpoint.read_text())["offset"] == len(path.read_bytes())
+
+
+@pytest.mark.anyio
+async def test_export_import_round_trip(tmp_path):
+    await database.execute(user_table.insert().values(id=1, email="test@test.com", password="x", confirmed=True))
+    thumbnails = json.dumps([{"size": 128, "width": 128, "height": 96, "url": "/media/p.128.jpg"}])
+    await database.execute(post_table.insert().values(
+        [
+            {"id": 1, "body": "Post 1", "user_id": 1, "like_count": 1, "image_url": None, "thumbnails": None},
+            {"id": 2, "body": "Post 2", "user_id": 1, "like_count": 0, "image_url": "/media/p.png", "thumbnails": thumbnails},
+        ]
+    ))
+    await database.execute(comment_table.insert().values(id=1, body="Comment", post_id=2, user_id=1))
+    await database.execute(like_table.insert().values(id=1, post_id=1, user_id=1))
+    tables = {table: await database.fetch_all(table.select().order_by(table.c.id)) for table in (post_table, comment_table, like_table)}
+
+    path = tmp_path / "dump.ndjson"
+    path.write_bytes(b"".join([chunk async for chunk in iterate_ndjson(list(ExportTable))]))
+    for table in (like_table, comment_table, post_table):
+        await database.execute(table.delete())
+    stats = await import_file(path)
+
+    assert stats.imported == 4 and stats.skipped == 0
+    for table, rows in tables.items():
+        assert [tuple(row) for row in await database.fetch_all(table.select().order_by(table.c.id))] == [tuple(row) for row in rows]
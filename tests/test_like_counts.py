@@ -0,0 +1,22 @@
+import pytest
+
+from api.database import database, like_table, post_table, user_table
+from api.like_counts import reconcile_like_counts
+
+
+@pytest.mark.anyio
+async def test_reconcile_like_counts():
+    await database.execute(user_table.insert().values(id=1, email="test@test.com", password="x", confirmed=True))
+    await database.execute_many(post_table.insert(), [{"id": i, "body": f"Post {i}", "user_id": 1, "like_count": 7} for i in range(1, 6)])
+    await database.execute_many(like_table.insert(), [{"post_id": 2, "user_id": 1}, {"post_id": 4, "user_id": 1}])
+
+    assert await reconcile_like_counts(batch_size=2) == 5
+
+    rows = await database.fetch_all(post_table.select().order_by(post_table.c.id))
+    assert [row["like_count"] for row in rows] == [0, 1, 0, 1, 0]
+    assert await reconcile_like_counts(batch_size=2) == 0
+
+
+@pytest.mark.anyio
+async def test_reconcile_like_counts_empty():
+    assert await reconcile_like_counts() == 0
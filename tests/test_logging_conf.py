@@ -0,0 +1,90 @@
+import logging
+import threading
+
+import pytest
+from asgi_correlation_id import CorrelationIdFilter
+from asgi_correlation_id.context import correlation_id
+
+from api.logging_conf import EmailObfuscationFilter, attach_queue, dropped_records, obfuscated, stop_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, gate: threading.Event | None = None):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+        self.started = threading.Event()
+        self.gate = gate
+
+    def emit(self, record):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.threads.add(threading.get_ident())
+        self.records.append(record)
+
+
+@pytest.fixture()
+def test_logger():
+    logger = logging.getLogger("tests.logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    yield logger
+    stop_logging()
+    logger.handlers = []
+
+
+def test_obfuscated():
+    assert obfuscated("test@test.com", 2) == "te***********"
+    assert obfuscated("secret", 2) == "se****"
+
+
+def test_handlers_run_on_listener_thread(test_logger):
+    handler = ListHandler()
+    test_logger.addHandler(handler)
+    attach_queue(["tests.logging"], maxsize=100, filters=[CorrelationIdFilter(default_value="-")])
+
+    token = correlation_id.set("request-1")
+    try:
+        test_logger.info("Hello %s", "world")
+    finally:
+        correlation_id.reset(token)
+    stop_logging()
+
+    (record,) = handler.records
+    assert record.getMessage() == "Hello world"
+    assert record.correlation_id == "request-1"
+    assert handler.threads and threading.get_ident() not in handler.threads
+
+
+def test_handler_filters_apply_to_their_handler_only(test_logger):
+    console, log_file = ListHandler(), ListHandler()
+    console.addFilter(EmailObfuscationFilter("email", obfuscated_length=2))
+    test_logger.addHandler(console)
+    test_logger.addHandler(log_file)
+    attach_queue(["tests.logging"], maxsize=100)
+
+    test_logger.info("Registered", extra={"email": "test@test.com"})
+    stop_logging()
+
+    assert [record.email for record in console.records] == ["te***********"]
+    assert [record.email for record in log_file.records] == ["test@test.com"]
+
+
+def test_full_queue_drops_and_counts(test_logger):
+    gate = threading.Event()
+    handler = ListHandler(gate)
+    test_logger.addHandler(handler)
+    attach_queue(["tests.logging"], maxsize=2)
+
+    # The listener takes the first record and blocks in the handler ...
+    test_logger.info("record 0")
+    assert handler.started.wait(5)
+    # ... so two more fill the queue and the rest are dropped, without blocking.
+    for i in range(1, 10):
+        test_logger.info("record %d", i)
+    assert dropped_records() == 7
+
+    gate.set()
+    stop_logging()
+    assert [record.getMessage() for record in handler.records] == ["record 0", "record 1", "record 2"]
@@ -0,0 +1,133 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from api.config import config
+from api.database import database, outbound_email_table
+from api.mail_queue import MailQueueWorker
+from api.tasks import enqueue_email
+
+
+async def email_rows():
+    return await database.fetch_all(select(outbound_email_table).order_by(outbound_email_table.c.id))
+
+
+@pytest.fixture()
+def worker(mocker) -> MailQueueWorker:
+    mocker.patch.object(config, "MAIL_QUEUE_MAX_ATTEMPTS", 2)
+    return MailQueueWorker()
+
+
+@pytest.mark.anyio
+async def test_process_once_batches_identical_emails(worker, mock_httpx_client):
+    await enqueue_email("a@test.com", "Subject", "Body")
+    await enqueue_email("b@test.com", "Subject", "Body")
+    await enqueue_email("c@test.com", "Other", "Body")
+
+    assert await worker.process_once() == 3
+    assert mock_httpx_client.post.call_count == 2
+    recipients = sorted(call.kwargs["data"]["to"] for call in mock_httpx_client.post.call_args_list)
+    assert recipients == [["a@test.com", "b@test.com"], ["c@test.com"]]
+    assert [row["status"] for row in await email_rows()] == ["sent"] * 3
+    assert await worker.process_once() == 0
+
+
+@pytest.mark.anyio
+async def test_failed_send_is_retried_with_backoff(worker, mock_httpx_client):
+    mock_httpx_client.post.side_effect = httpx.ConnectError("connection refused")
+    await enqueue_email("a@test.com", "Subject", "Body")
+
+    assert await worker.process_once() == 1
+    (row,) = await email_rows()
+    assert row["status"] == "pending"
+    assert row["attempts"] == 1
+    assert row["next_attempt_at"] > time.time()
+    assert "connection refused" in row["last_error"]
+    assert await worker.process_once() == 0
+
+    await database.execute(outbound_email_table.update().values(next_attempt_at=0))
+    assert await worker.process_once() == 1
+    (row,) = await email_rows()
+    assert row["status"] == "failed"
+    assert row["attempts"] == 2
+
+
+@pytest.mark.anyio
+async def test_claimed_emails_are_not_claimed_again(worker, mock_httpx_client):
+    await enqueue_email("a@test.com", "Subject", "Body")
+    (claimed,) = await worker.claim()
+    assert claimed["status"] == "sending"
+
+    other = MailQueueWorker()
+    assert await other.claim() == []
+    assert await other.process_once() == 0
+    assert mock_httpx_client.post.call_count == 0
+
+
+@pytest.mark.anyio
+async def test_expired_lease_is_recovered(worker, mock_httpx_client):
+    await enqueue_email("a@test.com", "Subject", "Body")
+    await enqueue_email("b@test.com", "Other", "Body")
+    await worker.claim()
+    # a@test.com was claimed by a worker that died, b@test.com by one still sending.
+    await database.execute(
+        outbound_email_table.update()
+        .where(outbound_email_table.c.recipient == "a@test.com")
+        .values(claimed_at=time.time() - worker.lease_seconds - 1)
+    )
+
+    await worker.recover_expired_leases()
+    assert [row["status"] for row in await email_rows()] == ["pending", "sending"]
+    assert await worker.process_once() == 1
+    assert [row["status"] for row in await email_rows()] == ["sent", "sending"]
+
+
+class FakeMailgunHandler(BaseHTTPRequestHandler):
+    requests: list[dict] = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        FakeMailgunHandler.requests.append({"path": self.path, "form": parse_qs(body)})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"message": "Queued. Thank you."}')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def fake_mailgun(mocker):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMailgunHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    FakeMailgunHandler.requests = []
+    mocker.patch.multiple(
+        config,
+        MAILGUN_BASE_URL=f"http://127.0.0.1:{server.server_port}",
+        MAILGUN_DOMAIN="example.com",
+        MAILGUN_API_KEY="test-key",
+    )
+    yield FakeMailgunHandler.requests
+    server.shutdown()
+
+
+@pytest.mark.anyio
+async def test_send_against_local_server(worker, fake_mailgun, mocker):
+    async with httpx.AsyncClient() as client:
+        mocker.patch("api.tasks.get_http_client", return_value=client)
+        await enqueue_email("a@test.com", "Subject", "Body")
+        await enqueue_email("b@test.com", "Subject", "Body")
+        assert await worker.process_once() == 2
+
+    (request,) = fake_mailgun
+    assert request["path"] == "/v3/example.com/messages"
+    assert request["form"]["to"] == ["a@test.com", "b@test.com"]
+    assert "recipient-variables" in request["form"]
+    assert [row["status"] for row in await email_rows()] == ["sent", "sent"]
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import select, text
+
+from api.database import comment_table, post_table
+from api.metrics import Counter, Histogram, Registry, query_name
+from api.statements import Statement
+
+
+def test_counter_render():
+    counter = Counter("requests_total", "Requests.", ("route",))
+    counter.inc("/a")
+    counter.inc("/a")
+    counter.inc('/b"')
+    assert counter.render() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a"} 2',
+        'requests_total{route="/b\\""} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "/a")
+    assert histogram.count("/a") == 4
+    assert histogram.samples() == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 6.05',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_registry_renders_collectors():
+    registry = Registry()
+    registry.register_collector(lambda: [("pool", "Pool.", [({"stat": "idle"}, 3)])])
+    assert registry.render() == '# HELP pool Pool.\n# TYPE pool gauge\npool{stat="idle"} 3\n'
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        (post_table.select().where(post_table.c.id == 1), "select posts"),
+        (select(post_table.c.id).select_from(post_table.outerjoin(comment_table)), "select posts"),
+        (post_table.insert().values(body="x"), "insert posts"),
+        (comment_table.update().values(body="x"), "update comments"),
+        (post_table.delete(), "delete posts"),
+        (select(select(post_table.c.id).subquery()), "select"),
+        (text("SELECT 1"), "textclause"),
+        ("DELETE FROM search_index", "delete"),
+        (Statement("find_post", post_table.select())(post_id=1), "find_post"),
+    ],
+)
+def test_query_name(query, expected):
+    assert query_name(query) == expected
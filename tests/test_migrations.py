@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from api.migrations import MIGRATIONS, upgrade
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL UNIQUE, password VARCHAR NOT NULL, confirmed BOOLEAN NOT NULL)",
+    "CREATE TABLE posts (id INTEGER PRIMARY KEY, body VARCHAR NOT NULL, user_id INTEGER NOT NULL REFERENCES users (id))",
+    "CREATE TABLE comments (id INTEGER PRIMARY KEY, body VARCHAR NOT NULL, post_id INTEGER NOT NULL REFERENCES posts (id), user_id INTEGER NOT NULL REFERENCES users (id))",
+    "CREATE TABLE likes (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL REFERENCES posts (id), user_id INTEGER NOT NULL REFERENCES users (id))",
+    "INSERT INTO users VALUES (1, 'test@test.com', 'x', 1)",
+    "INSERT INTO posts VALUES (1, 'Post 1', 1), (2, 'Post 2', 1)",
+    "INSERT INTO likes (post_id, user_id) VALUES (1, 1), (1, 1), (2, 1)",
+]
+
+
+@pytest.fixture()
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_legacy_database(legacy_engine):
+    assert upgrade(legacy_engine) == [version for version, _ in MIGRATIONS]
+
+    with legacy_engine.connect() as conn:
+        like_counts = conn.execute(text("SELECT id, like_count FROM posts ORDER BY id")).all()
+        assert like_counts == [(1, 1), (2, 1)]
+        assert conn.execute(text("SELECT count(*) FROM likes")).scalar() == 2
+        matches = conn.execute(text("SELECT post_id FROM search_index WHERE search_index MATCH 'post' ORDER BY rowid"))
+        assert matches.scalars().all() == [1, 2]
+        versioned = conn.execute(text("SELECT post_id FROM content_versions ORDER BY post_id"))
+        assert versioned.scalars().all() == [0, 1, 2]
+
+    inspector = inspect(legacy_engine)
+    like_indexes = {index["name"]: index for index in inspector.get_indexes("likes")}
+    assert like_indexes["uq_likes_post_id_user_id"]["unique"]
+    assert {index["name"] for index in inspector.get_indexes("comments")} >= {"ix_comments_post_id", "ix_comments_user_id"}
+    assert "ix_users_follower_count" in {index["name"] for index in inspector.get_indexes("users")}
+
+
+def test_upgrade_is_idempotent(legacy_engine):
+    upgrade(legacy_engine)
+    assert upgrade(legacy_engine) == []
+
+
+def test_upgrade_fresh_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    upgrade(engine)
+    assert "like_count" in {column["name"] for column in inspect(engine).get_columns("posts")}
+    assert upgrade(engine) == []
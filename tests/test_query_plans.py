@@ -0,0 +1,52 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from api.database import database, get_engine
+from api.statements import BoundStatement
+from tests.conftest import create_comment, create_post, like_post
+
+
+def explain(query) -> list[str]:
+    engine = get_engine()
+    sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))], sql
+
+
+def assert_uses_index(query):
+    plan, sql = explain(query)
+    sorts_derived_table = any(step.startswith("CO-ROUTINE") for step in plan)
+    for step in plan:
+        # Sorting is fine only for merging already LIMITed subqueries.
+        assert "TEMP B-TREE" not in step or sorts_derived_table, f"{sql}\n{plan}"
+        if step.startswith("SCAN ") and " USING " not in step and "subquery" not in step:
+            # A bare scan is only a rowid walk when the feed is ordered by id and stops at LIMIT.
+            assert "ORDER BY posts.id" in sql and "LIMIT" in sql, f"{sql}\n{plan}"
+
+
+@pytest.mark.anyio
+async def test_router_queries_use_indexes(async_client: AsyncClient, logged_in_token: str, mocker):
+    executed = []
+    for method in ("fetch_one", "fetch_all", "execute"):
+        spy = mocker.spy(database, method)
+        executed.append(spy)
+
+    headers = {"Authorization": f"Bearer {logged_in_token}"}
+    post = await create_post("Test Post", async_client, logged_in_token)
+    await create_post("Test Post 2", async_client, logged_in_token)
+    await create_comment("Test Comment", async_client, post, logged_in_token)
+    await like_post(async_client, post["id"], logged_in_token)
+    await async_client.get(f"/post/{post['id']}")
+    await async_client.get(f"/post/{post['id']}/comments")
+    for sorting in ("new", "old", "most_likes"):
+        response = await async_client.get(f"/posts?sorting={sorting}&limit=1")
+        await async_client.get(f"/posts?sorting={sorting}&limit=1&cursor={response.headers['X-Next-Cursor']}")
+    await async_client.delete(f"/like/{post['id']}", headers=headers)
+
+    queries = [call.args[0] for spy in executed for call in spy.call_args_list]
+    queries = [query.clause() if isinstance(query, BoundStatement) else query for query in queries]
+    checked = [query for query in queries if query.is_select or query.is_update or query.is_delete]
+    assert len(checked) > 10
+    for query in checked:
+        assert_uses_index(query)
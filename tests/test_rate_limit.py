@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.responses import PlainTextResponse
+
+from api.rate_limit import (
+    Budget,
+    ConcurrencyLimitMiddleware,
+    InFlightLimit,
+    KeyValueRateLimitBackend,
+    MemoryRateLimitBackend,
+    RateLimiter,
+    refill,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeScriptClient:
+    """Stand-in for a shared store with the redis.asyncio `eval` API, running the bucket script atomically."""
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.data = {}
+        self.calls = []
+
+    async def eval(self, script, numkeys, key, requests, rate):
+        self.calls.append((numkeys, key))
+        # A round trip to the store, so concurrent callers interleave.
+        await asyncio.sleep(0)
+        budget = Budget(requests, requests / float(rate))
+        now = self.clock()
+        tokens, updated = self.data.get(key, (requests, now))
+        tokens = refill(tokens, now - updated, budget)
+        if tokens < 1:
+            return str((1 - tokens) / budget.rate).encode()
+        self.data[key] = (tokens - 1, now)
+        return b"0"
+
+
+@pytest.fixture()
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture(params=["memory", "key_value"])
+def limiter(request, clock) -> RateLimiter:
+    if request.param == "memory":
+        backend = MemoryRateLimitBackend(maxsize=100, clock=clock)
+    else:
+        backend = KeyValueRateLimitBackend(FakeScriptClient(clock))
+    return RateLimiter(backend, {"login": "10/minute"})
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("10/minute", Budget(10, 60)), ("5 / hours", Budget(5, 3600)), ("1/second", Budget(1, 1))],
+)
+def test_budget_parse(value: str, expected: Budget):
+    assert Budget.parse(value) == expected
+
+
+def test_budget_parse_invalid():
+    with pytest.raises(ValueError):
+        Budget.parse("10 per minute")
+
+
+@pytest.mark.anyio
+async def test_bucket_empties_and_refills(limiter: RateLimiter, clock: FakeClock):
+    for _ in range(10):
+        assert await limiter.take("login", "ip:1.2.3.4") == 0
+    assert await limiter.take("login", "ip:1.2.3.4") == pytest.approx(6.0)
+    # Other callers have their own bucket.
+    assert await limiter.take("login", "ip:5.6.7.8") == 0
+    clock.now += 6.0
+    assert await limiter.take("login", "ip:1.2.3.4") == 0
+    assert await limiter.take("login", "ip:1.2.3.4") > 0
+    assert limiter.stats() == {"login": {"allowed": 12, "limited": 2}}
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_never_exceed_budget(limiter: RateLimiter):
+    results = await asyncio.gather(*(limiter.take("login", "ip:1.2.3.4") for _ in range(50)))
+    assert results.count(0) == 10
+
+
+@pytest.mark.anyio
+async def test_unconfigured_budget_is_unlimited(limiter: RateLimiter):
+    for _ in range(20):
+        assert await limiter.take("search", "ip:1.2.3.4") == 0
+
+
+@pytest.mark.anyio
+async def test_memory_backend_forgets_full_buckets(clock: FakeClock):
+    backend = MemoryRateLimitBackend(maxsize=100, clock=clock)
+    await backend.take("login:ip:1.2.3.4", Budget(10, 60))
+    assert len(backend._buckets) == 1
+    clock.now += 6.0
+    assert backend._buckets.get("login:ip:1.2.3.4") is None
+
+
+@pytest.mark.anyio
+async def test_key_value_backend_prefixes_keys(clock: FakeClock):
+    client = FakeScriptClient(clock)
+    await KeyValueRateLimitBackend(client, prefix="app:").take("login:ip:1.2.3.4", Budget(10, 60))
+    assert client.calls == [(1, "app:login:ip:1.2.3.4")]
+
+
+def slow_app(release: asyncio.Event):
+    async def app(scope, receive, send):
+        if scope["path"] != "/metrics":
+            await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+    return app
+
+
+@pytest.mark.anyio
+async def test_concurrency_limit_sheds_excess_requests():
+    release = asyncio.Event()
+    limit = InFlightLimit(max_in_flight=3, retry_after=2)
+    app = ConcurrencyLimitMiddleware(slow_app(release), limit=limit, exempt_paths=("/metrics",))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        held = [asyncio.create_task(client.get("/posts")) for _ in range(3)]
+        while limit.in_flight < 3:
+            await asyncio.sleep(0.001)
+
+        shed = await asyncio.gather(*(client.get("/posts") for _ in range(5)))
+        assert [response.status_code for response in shed] == [503] * 5
+        assert shed[0].headers["Retry-After"] == "2"
+        assert (await client.get("/metrics")).status_code == 200
+
+        release.set()
+        assert [response.status_code for response in await asyncio.gather(*held)] == [200] * 3
+    assert limit.stats() == {"in_flight": 0, "max_in_flight": 3, "shed": 5}
+
+
+@pytest.mark.anyio
+async def test_concurrency_limit_under_load_never_exceeds_cap():
+    limit = InFlightLimit(max_in_flight=4, retry_after=1)
+    peak = 0
+
+    async def app(scope, receive, send):
+        nonlocal peak
+        peak = max(peak, limit.in_flight)
+        await asyncio.sleep(0.01)
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    middleware = ConcurrencyLimitMiddleware(app, limit=limit)
+    async with AsyncClient(transport=ASGITransport(app=middleware), base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.get("/posts") for _ in range(40)))
+    statuses = [response.status_code for response in responses]
+    assert peak == 4
+    assert statuses.count(200) >= 4
+    assert statuses.count(200) + statuses.count(503) == 40
+    assert limit.shed == statuses.count(503)
@@ -0,0 +1,88 @@
+import shutil
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import create_engine
+
+from api.database import get_database, post_table, user_table
+from api.feed_cache import feed_cache
+from api.migrations import upgrade
+from api.replicas import DatabaseRouter
+from api.sqlite_pool import Database
+from tests.conftest import FakeClock, create_post
+
+
+def test_reader_without_replicas_is_primary():
+    router = DatabaseRouter("primary", [], read_your_writes_seconds=5)
+    router.record_write("test@test.com")
+    assert router.reader() == "primary"
+    assert router.reader("test@test.com") == "primary"
+
+
+def test_reader_round_robin_and_read_your_writes():
+    clock = FakeClock()
+    router = DatabaseRouter("primary", ["replica1", "replica2"], read_your_writes_seconds=5, clock=clock)
+    assert [router.reader(), router.reader("test@test.com"), router.reader()] == ["replica1", "replica2", "replica1"]
+
+    router.record_write("test@test.com")
+    assert router.reader("test@test.com") == "primary"
+    assert router.reader("other@test.com") == "replica2"
+
+    clock.now = 6
+    assert router.reader("test@test.com") == "replica1"
+    assert router.stats() == {"replicas": 2, "primary": 1, "replica": 5}
+
+
+@pytest.fixture()
+async def replica(tmp_path, mocker):
+    # A file copy taken before the test's writes, so it lags behind the primary.
+    # Request it before user fixtures, so registration counts as a recent write.
+    source = tmp_path / "source.db"
+    engine = create_engine(f"sqlite:///{source}")
+    upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(user_table.insert().values(id=1, email="replica@test.com", password="x", confirmed=True))
+        conn.execute(post_table.insert().values(body="Replica post", user_id=1))
+    engine.dispose()
+    shutil.copy(source, tmp_path / "replica.db")
+
+    replica = Database(f"sqlite:///{tmp_path / 'replica.db'}")
+    clock = FakeClock()
+    router = DatabaseRouter(get_database(), [replica], read_your_writes_seconds=5, clock=clock)
+    mocker.patch("api.security.db_router", router)
+    mocker.patch("api.routers.post.db_router", router)
+    mocker.patch("api.routers.user.db_router", router)
+    await replica.connect()
+    yield clock
+    await replica.disconnect()
+
+
+@pytest.mark.anyio
+async def test_reads_go_to_replica(async_client: AsyncClient, replica):
+    response = await async_client.get("/posts")
+    assert [post["body"] for post in response.json()] == ["Replica post"]
+
+
+@pytest.mark.anyio
+async def test_read_your_writes(replica, async_client: AsyncClient, logged_in_token: str, mocker):
+    await create_post("Primary post", async_client, logged_in_token)
+    auth = {"Authorization": f"Bearer {logged_in_token}"}
+    page_loads = mocker.spy(feed_cache, "get_or_load")
+
+    response = await async_client.get("/posts", headers=auth)
+    assert [post["body"] for post in response.json()] == ["Primary post"]
+    response = await async_client.get("/posts")
+    assert [post["body"] for post in response.json()] == ["Replica post"]
+    # Pages are cached by the database they were read from.
+    assert [call.args[0][-1] for call in page_loads.call_args_list] == ["primary", "replica"]
+
+    replica.now = 6
+    response = await async_client.get("/posts", headers=auth)
+    assert [post["body"] for post in response.json()] == ["Replica post"]
+
+
+@pytest.mark.anyio
+async def test_invalid_token_reads_replica(async_client: AsyncClient, replica):
+    response = await async_client.get("/posts", headers={"Authorization": "Bearer nope"})
+    assert response.status_code == 200
+    assert [post["body"] for post in response.json()] == ["Replica post"]
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+from pydantic import TypeAdapter, ValidationError
+
+from api.models.post import Comment, UserPostWithLikes
+from api.responses import RowsAdapter, RowsJSONResponse
+
+
+def test_same_json_as_response_model():
+    thumbnails = '[{"size": 160, "width": 160, "height": 90, "url": "/media/a_160.jpg"}]'
+    rows = [
+        {"id": i, "body": f"Post {i}", "user_id": 1, "likes": i % 3, "image_url": None, "thumbnails": None}
+        for i in range(4)
+    ]
+    rows.append({"id": 4, "body": "Post 4", "user_id": 1, "likes": 0, "image_url": "/media/a.png", "thumbnails": thumbnails})
+    # What FastAPI does for response_model=list[UserPostWithLikes].
+    adapter = TypeAdapter(list[UserPostWithLikes])
+    expected = adapter.dump_json(adapter.validate_python(rows))
+    assert RowsAdapter(UserPostWithLikes).dump_json(rows) == expected
+
+
+def test_extra_keys_left_out():
+    rows = [{"id": 1, "body": "Comment", "post_id": 2, "user_id": 3, "password": "secret"}]
+    assert json.loads(RowsAdapter(Comment).dump_json(rows)) == [{"body": "Comment", "post_id": 2, "id": 1, "user_id": 3}]
+
+
+def test_invalid_rows_raise():
+    with pytest.raises(ValidationError):
+        RowsAdapter(Comment).dump_json([{"id": 1, "body": None, "post_id": 2, "user_id": 3}])
+
+
+def test_response_headers():
+    response = RowsJSONResponse.from_rows(RowsAdapter(Comment), [], headers={"X-Next-Cursor": "abc"})
+    assert response.body == b"[]"
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["x-next-cursor"] == "abc"
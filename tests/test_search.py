@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from api.database import comment_table, post_table, user_table
+from api.migrations import upgrade
+from api.models.search import SearchKind
+from api.pagination import encode_cursor
+from api.search import LikeSearchBackend, SQLiteFTS5SearchBackend, search_backend_for, to_match_expression
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("python", '"python"'),
+        ("learn pyth*", '"learn" "pyth"*'),
+        ('NEAR("a" OR b)', '"NEAR" "a" "OR" "b"'),
+        ("  -- ", ""),
+    ],
+)
+def test_to_match_expression(query, expected):
+    assert to_match_expression(query) == expected
+
+
+def test_rebuild(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    upgrade(engine)
+    sql, values = SQLiteFTS5SearchBackend.build_query('"indexed"', 10)
+    with engine.begin() as conn:
+        conn.execute(user_table.insert().values(id=1, email="test@test.com", password="x", confirmed=True))
+        conn.execute(post_table.insert().values(id=1, body="indexed", user_id=1))
+        conn.execute(text("DELETE FROM search_index"))
+        assert conn.execute(text(sql), values).all() == []
+
+        SQLiteFTS5SearchBackend().rebuild(conn)
+        assert [row.post_id for row in conn.execute(text(sql), values)] == [1]
+    engine.dispose()
+
+
+def test_search_backend_for():
+    assert isinstance(search_backend_for("sqlite"), SQLiteFTS5SearchBackend)
+    assert isinstance(search_backend_for("postgresql"), LikeSearchBackend)
+
+
+def test_like_backend(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(user_table.insert().values(id=1, email="test@test.com", password="x", confirmed=True))
+        conn.execute(post_table.insert().values(
+            [{"id": 1, "body": "Learning Python", "user_id": 1}, {"id": 2, "body": "100% python_3", "user_id": 1}]
+        ))
+        conn.execute(comment_table.insert().values(id=1, body="PYTHON is great", post_id=1, user_id=1))
+
+        def search(terms, **kwargs):
+            return [(row.row_id, row.post_id) for row in conn.execute(LikeSearchBackend.build_query(terms, 10, **kwargs))]
+
+        assert search(["python"]) == [(4, 2), (3, 1), (2, 1)]
+        assert search(["python", "learn"]) == [(2, 1)]
+        assert search(["python"], kind=SearchKind.comment) == [(3, 1)]
+        assert search(["python"], cursor=encode_cursor("search", 4)) == [(3, 1), (2, 1)]
+        # LIKE wildcards in terms are matched literally.
+        assert search(["%"]) == [(4, 2)]
+        assert search(["n_3"]) == [(4, 2)]
+    engine.dispose()
@@ -2,8 +2,9 @@ from fastapi import HTTPException
 import pytest
 from jose import jwt
 
-from api.config import get_config
-from api.security import ALGORITHM, access_token_expires_minutes, authenticate_user, confirm_token_expires_minutes, create_access_token, create_confirmation_token, get_current_user, get_subject_for_token_type, get_user, hash_password, verify_password
+from api.config import config, get_config
+from api import security
+from api.security import ALGORITHM, access_token_expires_minutes, authenticate_user, confirm_token_expires_minutes, create_access_token, create_confirmation_token, get_current_user, get_subject_for_token_type, get_user, hash_password, hash_password_async, verify_password, verify_password_async
 
 @pytest.mark.anyio
 async def test_get_user(confirmed_user):
@@ -22,6 +23,12 @@ async def test_hash_password():
     assert hashed_password is not None
     assert verify_password(password, hashed_password)
     
+@pytest.mark.anyio
+async def test_hash_password_async():
+    hashed_password = await hash_password_async("test")
+    assert await verify_password_async("test", hashed_password)
+    assert not await verify_password_async("wrong", hashed_password)
+    
 @pytest.mark.anyio
 async def test_create_access_token():
     email = "test@test.com"
@@ -67,6 +74,45 @@ async def test_get_current_user(confirmed_user):
     user = await get_current_user(token)
     assert user.email == confirmed_user["email"]
     
+@pytest.mark.anyio
+async def test_get_current_user_cached(confirmed_user, mocker):
+    token = create_access_token(confirmed_user["email"])
+    await get_current_user(token)
+    spy = mocker.spy(security, "get_user")
+    user = await get_current_user(token)
+    assert user.email == confirmed_user["email"]
+    spy.assert_not_called()
+    assert security.cache_stats()["user"]["hits"] == 1
+    assert security.cache_stats()["token"]["hits"] == 1
+
+@pytest.mark.anyio
+async def test_invalidate_user(confirmed_user, mocker):
+    token = create_access_token(confirmed_user["email"])
+    await get_current_user(token)
+    security.invalidate_user(confirmed_user["email"])
+    spy = mocker.spy(security, "get_user")
+    await get_current_user(token)
+    spy.assert_called_once_with(confirmed_user["email"])
+
+def test_password_executor_from_environment_config(mocker):
+    mocker.patch.multiple(config, PASSWORD_HASH_EXECUTOR="process", PASSWORD_HASH_WORKERS=2)
+    security.get_password_executor.cache_clear()
+    try:
+        assert (security.password_executor.kind, security.password_executor.max_workers) == ("process", 2)
+    finally:
+        security.get_password_executor.cache_clear()
+
+def test_caches_sized_from_environment_config(mocker):
+    mocker.patch.multiple(config, USER_CACHE_SIZE=7, USER_CACHE_TTL_SECONDS=3.0)
+    security.get_user_cache.cache_clear()
+    security.get_token_cache.cache_clear()
+    try:
+        assert (security.user_cache.maxsize, security.user_cache.ttl) == (7, 3.0)
+        assert (security.token_cache.maxsize, security.token_cache.ttl) == (7, 3.0)
+    finally:
+        security.get_user_cache.cache_clear()
+        security.get_token_cache.cache_clear()
+
 @pytest.mark.anyio
 async def test_get_current_user_invalid_token():
     with pytest.raises(HTTPException) as e:
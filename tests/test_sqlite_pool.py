@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from api.database import post_table
+
+
+@pytest.mark.anyio
+async def test_pragmas_applied(pooled_database):
+    assert await pooled_database.fetch_val("PRAGMA journal_mode") == "wal"
+    assert await pooled_database.fetch_val("PRAGMA synchronous") == 1
+    assert await pooled_database.fetch_val("PRAGMA busy_timeout") == 5000
+
+
+@pytest.mark.anyio
+async def test_connections_reused_and_bounded(pooled_database):
+    pool = pooled_database._backend._pool
+
+    async def read():
+        await pooled_database.fetch_all(post_table.select())
+
+    await asyncio.gather(*(read() for _ in range(50)))
+    assert pool.stats()["open"] <= 3
+    assert pool.stats()["idle"] == pool.stats()["open"]
+
+
+@pytest.mark.anyio
+async def test_expired_connections_replaced(pooled_database):
+    pool = pooled_database._backend._pool
+    await pooled_database.fetch_all(post_table.select())
+    (connection,) = pool._idle
+    pool.max_lifetime = 0
+    await pooled_database.fetch_all(post_table.select())
+    assert connection not in pool._idle
+
+
+@pytest.mark.anyio
+async def test_concurrent_read_then_write_transactions(pooled_database):
+    async def add_post(i: int):
+        async with pooled_database.transaction():
+            await pooled_database.fetch_all(post_table.select().where(post_table.c.user_id == 1))
+            await pooled_database.execute(post_table.insert().values(body=f"post {i}", user_id=1))
+
+    await asyncio.gather(*(add_post(i) for i in range(20)))
+    assert await pooled_database.fetch_val("SELECT count(*) FROM posts") == 20
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import Select, bindparam, select
+from sqlalchemy.dialects import sqlite
+
+from api.database import post_table
+from api.sqlite_pool import PooledSQLiteConnection
+from api.statements import BoundStatement, Statement
+
+insert_post = Statement("insert_post", post_table.insert().values(body=bindparam("body"), user_id=bindparam("user_id")))
+select_post = Statement("select_post", select(post_table.c.id, post_table.c.body).where(post_table.c.id == bindparam("post_id")))
+select_posts_in = Statement(
+    "select_posts_in", select(post_table.c.id).where(post_table.c.id.in_(bindparam("post_ids", expanding=True)))
+)
+
+
+def test_compiled_once_per_dialect():
+    dialect = sqlite.dialect(paramstyle="qmark")
+    assert select_post.compiled(dialect) is select_post.compiled(dialect)
+    assert select_post.compiled(sqlite.dialect()) is not select_post.compiled(dialect)
+
+
+def test_expanding_parameters_are_not_cached():
+    assert select_posts_in.compiled(sqlite.dialect(paramstyle="qmark")) is None
+
+
+def test_str_is_the_sql_and_clause_binds_values():
+    bound = select_post(post_id=7)
+    assert str(bound) == str(select_post.query)
+    assert bound.clause().compile(compile_kwargs={"literal_binds": True}).string.endswith("WHERE posts.id = 7")
+
+
+@pytest.mark.anyio
+async def test_executes_on_pooled_backend(pooled_database):
+    first = await pooled_database.execute(insert_post(body="first", user_id=1))
+    second = await pooled_database.execute(insert_post(body="second", user_id=1))
+
+    row = await pooled_database.fetch_one(select_post(post_id=second))
+    assert dict(row._mapping) == {"id": second, "body": "second"}
+    assert await pooled_database.fetch_val(select_post(post_id=first), column="body") == "first"
+    assert await pooled_database.fetch_one(select_post(post_id=second + 1)) is None
+
+
+@pytest.mark.anyio
+async def test_other_backends_get_clauses(pooled_database, mocker):
+    # Any backend other than the pooled SQLite one is handed a plain expression.
+    spy = mocker.spy(PooledSQLiteConnection, "fetch_one")
+    await pooled_database.fetch_one(select_post(post_id=1))
+    assert isinstance(spy.call_args.args[1], BoundStatement)
+
+    mocker.patch("api.sqlite_pool.PooledSQLiteBackend", type("OtherBackend", (), {}))
+    await pooled_database.fetch_one(select_post(post_id=1))
+    assert isinstance(spy.call_args.args[1], Select)
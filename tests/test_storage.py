@@ -0,0 +1,69 @@
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from api.config import config
+from api.storage import B2Storage, LocalStorage, get_storage, mount_local_media
+
+
+@pytest.fixture()
+def fresh_storage():
+    get_storage.cache_clear()
+    yield
+    get_storage.cache_clear()
+
+
+def test_local_storage_upload(tmp_path):
+    source = tmp_path / "upload"
+    source.write_bytes(b"image")
+    storage = LocalStorage(tmp_path / "media", "http://cdn.test/media/")
+    assert storage.upload(source, "posts/1/a.png", "image/png") == "http://cdn.test/media/posts/1/a.png"
+    assert (tmp_path / "media" / "posts" / "1" / "a.png").read_bytes() == b"image"
+
+
+def test_b2_storage_upload(tmp_path, mocker):
+    storage = B2Storage("key-id", "key", "bucket")
+    bucket = mocker.MagicMock()
+    bucket.api.get_download_url_for_file_name.return_value = "https://f000.backblazeb2.com/file/bucket/posts/1/a.png"
+    storage._bucket = bucket
+    url = storage.upload(tmp_path / "upload", "posts/1/a.png", "image/png")
+    assert url == "https://f000.backblazeb2.com/file/bucket/posts/1/a.png"
+    bucket.upload_local_file.assert_called_once_with(
+        local_file=str(tmp_path / "upload"), file_name="posts/1/a.png", content_type="image/png"
+    )
+
+
+def test_get_storage(fresh_storage, mocker):
+    assert isinstance(get_storage(), LocalStorage)
+    get_storage.cache_clear()
+    mocker.patch.multiple(config, B2_KEY_ID="key-id", B2_APPLICATION_KEY="key", B2_BUCKET_NAME="bucket")
+    storage = get_storage()
+    assert isinstance(storage, B2Storage) and storage.bucket_name == "bucket"
+
+
+@pytest.mark.anyio
+async def test_mount_local_media(tmp_path):
+    source = tmp_path / "upload"
+    source.write_bytes(b"image")
+    storage = LocalStorage(tmp_path / "media", "/media")
+    url = storage.upload(source, "posts/1/a.png", "image/png")
+    app = FastAPI()
+    mount_local_media(app, storage)
+    mount_local_media(app, storage)
+    assert len(app.routes) == len(FastAPI().routes) + 1
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get(url)
+        assert response.status_code == 200
+        assert response.content == b"image"
+        assert response.headers["content-type"] == "image/png"
+        assert (await client.get("/media/posts/1/missing.png")).status_code == 404
+        assert (await client.get("/media/../upload")).status_code == 404
+
+
+def test_mount_local_media_elsewhere(tmp_path):
+    app = FastAPI()
+    mount_local_media(app, LocalStorage(tmp_path, "http://cdn.test/media"))
+    mount_local_media(app, B2Storage("key-id", "key", "bucket"))
+    assert len(app.routes) == len(FastAPI().routes)
+
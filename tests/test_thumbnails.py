@@ -0,0 +1,23 @@
+from PIL import Image
+
+from api.thumbnails import render_thumbnails
+
+
+def test_render_thumbnails(tmp_path):
+    source = tmp_path / "photo.png"
+    Image.new("RGBA", (800, 400), (255, 0, 0, 128)).save(source)
+    thumbnails = render_thumbnails(str(source), str(tmp_path), [300, 100, 1000])
+    assert [(t["size"], t["width"], t["height"]) for t in thumbnails] == [(100, 100, 50), (300, 300, 150), (1000, 800, 400)]
+    for thumbnail in thumbnails:
+        with Image.open(thumbnail["path"]) as image:
+            assert image.format == "JPEG"
+            assert image.size == (thumbnail["width"], thumbnail["height"])
+
+
+def test_render_thumbnails_applies_exif_orientation(tmp_path):
+    source = tmp_path / "photo.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90 degrees, as phone cameras write portrait photos.
+    Image.new("RGB", (400, 200)).save(source, exif=exif)
+    (thumbnail,) = render_thumbnails(str(source), str(tmp_path), [100])
+    assert (thumbnail["width"], thumbnail["height"]) == (50, 100)
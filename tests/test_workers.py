@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+import pytest
+
+from api.workers import BoundedExecutor
+
+
+@pytest.mark.anyio
+async def test_run_returns_result():
+    executor = BoundedExecutor("thread", 2, name="test")
+    assert await executor.run(sum, [1, 2, 3]) == 6
+    assert executor.stats() == {"max_workers": 2, "running": 0, "queued": 0, "completed": 1}
+    executor.shutdown()
+
+
+@pytest.mark.anyio
+async def test_run_limits_concurrency():
+    executor = BoundedExecutor("thread", 2, name="test")
+    release = threading.Event()
+    tasks = [asyncio.create_task(executor.run(release.wait, 5)) for _ in range(5)]
+    while executor.running < 2:
+        await asyncio.sleep(0.01)
+    assert executor.stats()["running"] == 2
+    assert executor.stats()["queued"] == 3
+    release.set()
+    await asyncio.gather(*tasks)
+    assert executor.stats()["completed"] == 5
+    executor.shutdown()
+
+
+@pytest.mark.anyio
+async def test_run_propagates_exceptions():
+    executor = BoundedExecutor("thread", 1, name="test")
+    with pytest.raises(ZeroDivisionError):
+        await executor.run(divmod, 1, 0)
+    assert executor.stats()["running"] == 0
+    executor.shutdown()